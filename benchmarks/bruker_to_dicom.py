@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+""" Time the Bruker to DICOM conversion on synthetic ParaVision data sets:
+    Directory.load, mr_image_storage, enhanced_mr_image_storage and
+    convert_reconstruction, the latter with 1, 2 and 4 writer threads. The
+    results may be saved as JSON and compared with the results of another
+    version.
+
+    Example:
+        bruker_to_dicom.py --output results/new.json --compare results/old.json
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+import odil
+
+import dicomifier
+
+import synthetic_bruker
+
+# Synthetic data sets, by name: arguments of synthetic_bruker.generate
+configurations = {
+    "anatomical": dict(
+        matrix=(256, 256), word_type="_16BIT_SGN_INT",
+        frame_groups=[("FG_SLICE", 32)]),
+    "multi_echo": dict(
+        matrix=(128, 128), word_type="_16BIT_SGN_INT",
+        frame_groups=[("FG_SLICE", 16), ("FG_ECHO", 8)],
+        slice_order="disk_reverse_slice_order"),
+    "diffusion": dict(
+        matrix=(96, 96), word_type="_32BIT_FLOAT",
+        frame_groups=[("FG_SLICE", 16), ("FG_DIFFUSION", 31)]),
+    "functional": dict(
+        matrix=(64, 64), word_type="_32BIT_SGN_INT",
+        frame_groups=[("FG_SLICE", 16), ("FG_CYCLE", 100)]),
+}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--configuration", "-c", action="append",
+        choices=sorted(configurations.keys()),
+        help="Synthetic data set to convert (default: all)")
+    parser.add_argument(
+        "--iterations", "-i", type=int, default=3,
+        help="Number of runs of each benchmark (default: 3)")
+    parser.add_argument(
+        "--output", "-o", help="Save the results in this JSON file")
+    parser.add_argument(
+        "--compare", help="Compare with the results stored in this JSON file")
+    arguments = parser.parse_args()
+
+    results = {
+        "version": get_version(),
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "iterations": arguments.iterations,
+        "benchmarks": {},
+    }
+
+    root = tempfile.mkdtemp()
+    try:
+        for name in (arguments.configuration or sorted(configurations)):
+            directory = os.path.join(root, name)
+            study = synthetic_bruker.generate(
+                directory, **configurations[name])
+            for benchmark, timings in run_benchmarks(
+                    study, os.path.join(root, "dicom"), arguments.iterations):
+                results["benchmarks"]["{}/{}".format(name, benchmark)] = {
+                    "min": min(timings), "median": numpy.median(timings)}
+            shutil.rmtree(directory)
+    finally:
+        shutil.rmtree(root)
+
+    previous = None
+    if arguments.compare:
+        with open(arguments.compare) as fd:
+            previous = json.load(fd)
+    print_results(results, previous)
+
+    if arguments.output:
+        with open(arguments.output, "w") as fd:
+            json.dump(results, fd, sort_keys=True, indent=4)
+
+def run_benchmarks(study, destination, iterations, writers=(1, 2, 4)):
+    """ Run the benchmarks on a synthetic study, yield the name and the run
+        times of each benchmark.
+
+        :param writers: numbers of writer threads of convert_reconstruction
+    """
+
+    def load():
+        index = dicomifier.bruker.DirectoryIndex(study)
+        directory = dicomifier.bruker.Directory()
+        directory.load(index, index.get_subjects()[0])
+        return directory
+
+    yield "Directory.load", [timed(load) for _ in range(iterations)]
+
+    directory = load()
+    reconstruction = "{}{:04d}".format(1, 1)
+
+    def get_data_set():
+        data_set = dicomifier.bruker_to_dicom.LazyDataSet(
+            directory.get_dataset(reconstruction))
+        data_set["reco_files"] = list(
+            directory.get_used_files(reconstruction))
+        return data_set
+
+    for converter in [
+            dicomifier.bruker_to_dicom.mr_image_storage,
+            dicomifier.bruker_to_dicom.enhanced_mr_image_storage]:
+        # The data sets are generated and discarded, as when written
+        def convert():
+            for _ in converter(
+                    get_data_set(), odil.registry.ExplicitVRLittleEndian):
+                pass
+        yield converter.__name__, [timed(convert) for _ in range(iterations)]
+
+    for count in writers:
+        def convert_reconstruction():
+            dicomifier.bruker_to_dicom.convert_reconstruction(
+                directory, "1", "1",
+                dicomifier.bruker_to_dicom.mr_image_storage,
+                odil.registry.ExplicitVRLittleEndian, destination, True,
+                count)
+            shutil.rmtree(destination)
+        # Keep the name of the single writer benchmark, to compare with
+        # previous results
+        name = "convert_reconstruction"
+        if count != 1:
+            name += " ({} writers)".format(count)
+        yield name, [timed(convert_reconstruction) for _ in range(iterations)]
+
+def timed(function):
+    """ Return the wall-clock time of a call to function.
+    """
+
+    start = time.time()
+    function()
+    return time.time()-start
+
+def get_version():
+    """ Return the git description of the source tree, or "unknown".
+    """
+
+    try:
+        with open(os.devnull, "w") as null:
+            return subprocess.check_output(
+                ["git", "describe", "--always", "--dirty"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=null).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_results(results, previous=None):
+    """ Print the results and, if given, the ratio to the previous results.
+    """
+
+    print("Version {}".format(results["version"]))
+    if previous:
+        print("Compared with version {}".format(previous["version"]))
+
+    header = ["Benchmark", "Min (s)", "Median (s)"]
+    if previous:
+        header.append("Ratio")
+    rows = [header]
+    for name, timings in sorted(results["benchmarks"].items()):
+        row = [
+            name, "{:.3f}".format(timings["min"]),
+            "{:.3f}".format(timings["median"])]
+        if previous:
+            old = previous["benchmarks"].get(name)
+            row.append(
+                "{:.2f}".format(timings["min"]/old["min"]) if old else "")
+        rows.append(row)
+
+    widths = [max(len(row[x]) for row in rows) for x in range(len(header))]
+    for row in rows:
+        print("  ".join(
+            x.ljust(width) if index == 0 else x.rjust(width)
+            for index, (x, width) in enumerate(zip(row, widths))))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+/*
+ * Compare the parse time of Bruker data files using the streaming parser
+ * (bruker::parse) and the former pipeline (regex join of lines, then
+ * bruker::grammar).
+ *
+ * Usage: parse [iterations] [file ...]
+ * When no file is given, a synthetic method-like file is used.
+ */
+
+#include <chrono>
+#include <cstdlib>
+#include <fstream>
+#include <iostream>
+#include <iterator>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include <boost/regex.hpp>
+
+#include "bruker/Field.h"
+#include "bruker/grammar.h"
+#include "bruker/parser.h"
+#include "core/DicomifierException.h"
+
+std::string synthetic_data()
+{
+    std::ostringstream stream;
+    stream << "##TITLE=Parameter List, ParaVision 6.0.1\n";
+    stream << "##JCAMPDX=4.24\n";
+    stream << "$$ Synthetic file\n";
+    for(int i=0; i<200; ++i)
+    {
+        stream << "##$Scalar" << i << "=" << i << "\n";
+        stream << "##$Name" << i << "=( 64 )\n<Some name " << i << ">\n";
+        stream << "##$Enum" << i << "=Yes\n";
+        stream << "##$Struct" << i << "=(3, <FG_SLICE>, <>, 0, 2)\n";
+    }
+    for(int i=0; i<20; ++i)
+    {
+        // Large numeric arrays, split on lines of 72 characters at most
+        stream << "##$Floats" << i << "=( 64, 64 )\n";
+        std::string line;
+        for(int j=0; j<64*64; ++j)
+        {
+            std::ostringstream item;
+            item << (j*0.123456f-100.f) << " ";
+            if(line.size()+item.str().size() > 72)
+            {
+                stream << line << "\n";
+                line.clear();
+            }
+            line += item.str();
+        }
+        stream << line << "\n";
+
+        stream << "##$Integers" << i << "=( 4096 )\n";
+        line.clear();
+        for(int j=0; j<4096; ++j)
+        {
+            std::ostringstream item;
+            item << (j*37-5000) << " ";
+            if(line.size()+item.str().size() > 72)
+            {
+                stream << line << "\n";
+                line.clear();
+            }
+            line += item.str();
+        }
+        stream << line << "\n";
+    }
+    stream << "##END=\n";
+
+    return stream.str();
+}
+
+std::vector<dicomifier::bruker::Field> parse_grammar(std::string data)
+{
+    data = boost::regex_replace(
+        data, boost::regex("\\\\?\\R(?!##|\\$\\$)"), "");
+
+    std::string::const_iterator begin = data.begin();
+    std::string::const_iterator const end = data.end();
+
+    std::vector<dicomifier::bruker::Field> fields;
+    dicomifier::bruker::grammar<std::string::const_iterator> g;
+    bool const parsed = boost::spirit::qi::parse(begin, end, g, fields);
+    if(!parsed || begin != end)
+    {
+        throw dicomifier::DicomifierException("Could not parse file");
+    }
+
+    return fields;
+}
+
+template<typename TFunction>
+double benchmark(
+    std::string const & data, int iterations, TFunction function,
+    std::size_t & fields_count)
+{
+    auto const begin = std::chrono::steady_clock::now();
+    for(int i=0; i<iterations; ++i)
+    {
+        fields_count = function(data).size();
+    }
+    auto const end = std::chrono::steady_clock::now();
+
+    return std::chrono::duration<double>(end-begin).count()/iterations;
+}
+
+int main(int argc, char ** argv)
+{
+    int const iterations = (argc>1)?std::atoi(argv[1]):10;
+
+    std::vector<std::pair<std::string, std::string>> inputs;
+    if(argc>2)
+    {
+        for(int i=2; i<argc; ++i)
+        {
+            std::ifstream stream(argv[i]);
+            std::string const data(
+                (std::istreambuf_iterator<char>(stream)),
+                (std::istreambuf_iterator<char>()));
+            inputs.emplace_back(argv[i], data);
+        }
+    }
+    else
+    {
+        inputs.emplace_back("synthetic", synthetic_data());
+    }
+
+    for(auto const & input: inputs)
+    {
+        std::size_t grammar_fields, parser_fields;
+        auto const grammar_time = benchmark(
+            input.second, iterations, parse_grammar, grammar_fields);
+        auto const parser_time = benchmark(
+            input.second, iterations,
+            [](std::string const & data) {
+                return dicomifier::bruker::parse(data); },
+            parser_fields);
+
+        std::cout
+            << input.first << " (" << input.second.size() << " bytes)\n"
+            << "  grammar: " << 1000*grammar_time << " ms, "
+                << grammar_fields << " fields\n"
+            << "  parser:  " << 1000*parser_time << " ms, "
+                << parser_fields << " fields\n"
+            << "  speedup: " << grammar_time/parser_time << "\n";
+    }
+
+    return EXIT_SUCCESS;
+}
@@ -0,0 +1,336 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+""" Generate synthetic ParaVision directories: subject, acqp, method,
+    visu_pars, reco and 2dseq files, with a configurable matrix size, word
+    type, frame groups and slice order. The images are a disc on an empty
+    background, as most MR images.
+"""
+
+import os
+
+import numpy
+
+class Enum(str):
+    """ Unquoted value of a JCAMP-DX field (e.g. an enumeration).
+    """
+    pass
+
+# Data type of each VisuCoreWordType
+word_types = {
+    "_8BIT_UNSGN_INT": numpy.uint8,
+    "_16BIT_SGN_INT": numpy.int16,
+    "_32BIT_SGN_INT": numpy.int32,
+    "_32BIT_FLOAT": numpy.float32,
+}
+
+def generate(
+        root, matrix=(64, 64), word_type="_16BIT_SGN_INT",
+        frame_groups=(("FG_SLICE", 8),),
+        slice_order="disk_normal_slice_order", series=1, seed=0):
+    """ Write a ParaVision study in root, with one reconstruction for each
+        series, and return the path to the study.
+
+        :param matrix: number of columns and rows of the images
+        :param word_type: VisuCoreWordType of the pixel data
+        :param frame_groups: pairs of frame group type (FG_SLICE, FG_ECHO,
+            FG_DIFFUSION or FG_CYCLE) and number of frames, the first one
+            being the innermost
+        :param slice_order: VisuCoreDiskSliceOrder
+        :param series: number of series
+        :param seed: seed of the random generator
+    """
+
+    random = numpy.random.RandomState(seed)
+
+    study = os.path.join(root, "20170102_101112_Synthetic_1_1")
+    _write_parameters(
+        os.path.join(study, "subject"), [
+            ("SUBJECT_id", "Synthetic"),
+            ("SUBJECT_study_name", "1"),
+            ("SUBJECT_name_string", "Synthetic"),
+            ("SUBJECT_type", Enum("Quadruped")),
+            ("SUBJECT_sex_animal", Enum("FEMALE")),
+            ("SUBJECT_weight", 0.025),
+        ])
+
+    for series_number in range(1, 1+series):
+        series_directory = os.path.join(study, str(series_number))
+        fields = _get_fields(
+            series_number, matrix, word_type, frame_groups, slice_order)
+        _write_parameters(
+            os.path.join(series_directory, "acqp"), [
+                ("ACQ_protocol_name", "Synthetic"),
+                ("ACQ_method", "<Bruker:Synthetic>"),
+                ("ACQ_size", list(matrix)),
+                ("NI", fields["frames"]),
+            ])
+        _write_parameters(
+            os.path.join(series_directory, "method"),
+            [
+                ("Method", "<Bruker:Synthetic>"),
+                ("PVM_SpatDimEnum", Enum("2D")),
+                ("PVM_Matrix", list(matrix)),
+            ] + fields["method"])
+
+        reconstruction = os.path.join(series_directory, "pdata", "1")
+        _write_parameters(
+            os.path.join(reconstruction, "reco"), [
+                ("RECO_mode", Enum("FT_MODE")),
+                ("RECO_image_type", Enum("MAGNITUDE_IMAGE")),
+                ("RECO_wordtype", Enum(word_type)),
+            ])
+        _write_parameters(
+            os.path.join(reconstruction, "visu_pars"), fields["visu_pars"])
+        # Reconstructions are the directories containing an id file
+        with open(os.path.join(reconstruction, "id"), "w") as fd:
+            fd.write("Synthetic reconstruction\n")
+        _get_pixel_data(
+            matrix, fields["frames"], word_type, random).tofile(
+                os.path.join(reconstruction, "2dseq"))
+
+    return study
+
+def _get_fields(series, matrix, word_type, frame_groups, slice_order):
+    """ Return the number of frames, and the fields of visu_pars and method.
+    """
+
+    counts = dict(frame_groups)
+    frames = int(numpy.prod([x[1] for x in frame_groups]))
+
+    visu_pars = [
+        ("VisuVersion", 3),
+        ("VisuUid", "2.25.{}".format(1000+series)),
+        ("VisuCreator", "ParaVision"),
+        ("VisuCreatorVersion", "6.0.1"),
+        ("VisuCreationDate", "<2017-01-02T10:11:12,000+0100>"),
+        ("VisuInstanceModality", "MR"),
+        ("VisuSeriesTypeId", "ACQ_BRUKER_PVM"),
+        ("VisuCoreFrameCount", frames),
+        ("VisuCoreDim", 2),
+        ("VisuCoreSize", list(matrix)),
+        ("VisuCoreDimDesc", [Enum("spatial"), Enum("spatial")]),
+        ("VisuCoreExtent", [0.1*x for x in matrix]),
+        ("VisuCoreFrameThickness", 0.5),
+        ("VisuCoreUnits", ["mm", "mm"]),
+        ("VisuCoreWordType", Enum(word_type)),
+        ("VisuCoreByteOrder", Enum("littleEndian")),
+        ("VisuCoreDiskSliceOrder", Enum(slice_order)),
+        ("VisuCoreDataMin", numpy.zeros(frames)),
+        ("VisuCoreDataMax", numpy.full(frames, 1000.)),
+        ("VisuCoreDataOffs", numpy.zeros(frames)),
+        ("VisuCoreDataSlope", numpy.linspace(1., 2., frames)),
+        ("VisuSubjectName", "Synthetic"),
+        ("VisuSubjectId", "Synthetic"),
+        ("VisuSubjectBirthDate", "20160101"),
+        ("VisuSubjectSex", Enum("FEMALE")),
+        ("VisuSubjectWeight", 0.025),
+        ("VisuSubjectType", Enum("Quadruped")),
+        ("VisuSubjectPosition", Enum("Head_Prone")),
+        ("VisuStudyUid", "2.25.1000"),
+        ("VisuStudyId", "Synthetic"),
+        ("VisuStudyNumber", 1),
+        ("VisuStudyDate", "<2017-01-02T10:11:12,000+0100>"),
+        ("VisuStudyReferringPhysician", "Doe^John"),
+        ("VisuExperimentNumber", series),
+        ("VisuProcessingNumber", 1),
+        ("VisuSeriesNumber", 65536*series+1),
+        ("VisuSeriesDate", "<2017-01-02T10:11:12,000+0100>"),
+        ("VisuInstitution", "Institution"),
+        ("VisuStation", "Station"),
+        ("VisuSystemOrderNumber", "0001"),
+        ("VisuAcquisitionProtocol", "Synthetic"),
+        ("VisuAcqSequenceName", "Synthetic"),
+        ("VisuAcqDate", "<2017-01-02T10:11:12,000+0100>"),
+        ("VisuAcqEchoSequenceType", Enum("SpinEcho")),
+        ("VisuAcqIsEpiSequence", Enum("No")),
+        ("VisuAcqImagedNucleus", "1H"),
+        ("VisuAcqImagingFrequency", 300.3),
+        ("VisuAcqRepetitionTime", 1000.),
+        ("VisuAcqEchoTrainLength", 1),
+        ("VisuAcqFlipAngle", 90.),
+        ("VisuAcqNumberOfAverages", 1),
+        ("VisuAcqPixelBandwidth", 250000.),
+        ("VisuAcqPhaseEncSteps", matrix[1]),
+    ]
+    method = []
+
+    # Frame groups and their dependent fields
+    order_description = []
+    dependent_values = []
+    for name, count in frame_groups:
+        dependent_fields = []
+        if name == "FG_SLICE":
+            orientation = numpy.tile([1., 0., 0., 0., 1., 0., 0., 0., 1.], count)
+            position = numpy.zeros((count, 3))
+            position[:, 2] = 0.5*numpy.arange(count)
+            visu_pars.append(
+                ("VisuCoreOrientation", orientation.reshape(count, 9)))
+            visu_pars.append(("VisuCorePosition", position))
+            dependent_fields = ["VisuCoreOrientation", "VisuCorePosition"]
+        elif name == "FG_ECHO":
+            visu_pars.append(
+                ("VisuAcqEchoTime", 10.*(1+numpy.arange(count))))
+            dependent_fields = ["VisuAcqEchoTime"]
+        elif name == "FG_DIFFUSION":
+            b_matrices = _get_b_matrices(count)
+            visu_pars.append(("VisuAcqDiffusionBMatrix", b_matrices))
+            method.extend([
+                ("PVM_DwBMat", b_matrices),
+                ("PVM_DwBvalEach", [1000.]),
+                ("PVM_DwDir", _get_directions(count-1).ravel()),
+                ("PVM_DwNDiffDir", count-1),
+                ("PVM_DwAoImages", 1),
+            ])
+            dependent_fields = ["VisuAcqDiffusionBMatrix"]
+        elif name == "FG_CYCLE":
+            dependent_fields = []
+        else:
+            raise Exception("Unknown frame group: {}".format(name))
+
+        order_description.append((
+            count, "<{}>".format(name), "<>",
+            len(dependent_values), len(dependent_fields)))
+        dependent_values.extend(
+            ("<{}>".format(x), 0) for x in dependent_fields)
+
+    if "FG_SLICE" not in counts:
+        visu_pars.append(
+            ("VisuCoreOrientation", [1., 0., 0., 0., 1., 0., 0., 0., 1.]))
+        visu_pars.append(("VisuCorePosition", [0., 0., 0.]))
+    if "FG_ECHO" not in counts:
+        visu_pars.append(("VisuAcqEchoTime", 10.))
+
+    visu_pars.extend([
+        ("VisuFGOrderDescDim", len(order_description)),
+        ("VisuFGOrderDesc", order_description),
+        ("VisuGroupDepVals", dependent_values),
+    ])
+
+    return {"frames": frames, "visu_pars": visu_pars, "method": method}
+
+def _get_directions(count):
+    """ Return count unit vectors, evenly spread on a half-sphere.
+    """
+
+    index = numpy.arange(count)+0.5
+    theta = numpy.arccos(1-index/max(count, 1))
+    phi = numpy.pi*(1+5**0.5)*index
+    return numpy.transpose([
+        numpy.cos(phi)*numpy.sin(theta), numpy.sin(phi)*numpy.sin(theta),
+        numpy.cos(theta)])
+
+def _get_b_matrices(count):
+    """ Return one b=0 b-matrix and count-1 b=1000 b-matrices, flattened.
+    """
+
+    directions = _get_directions(count-1)
+    b_matrices = numpy.zeros((count, 3, 3))
+    b_matrices[1:] = 1000.*directions[:, :, None]*directions[:, None, :]
+    # Small diffusion weighting of the imaging gradients
+    b_matrices[0] = numpy.diag([1., 1., 1.])
+    return b_matrices.reshape(count, 9)
+
+def _get_pixel_data(matrix, frames, word_type, random):
+    """ Return the pixel data: a noisy disc on an empty background in each
+        frame.
+    """
+
+    columns, rows = matrix
+    y, x = numpy.ogrid[:rows, :columns]
+    disc = (
+        ((x-columns/2.)/(0.35*columns))**2 + ((y-rows/2.)/(0.35*rows))**2
+        <= 1)
+
+    intensities = numpy.linspace(100, 1000, frames)
+    data = numpy.zeros((frames, rows, columns), numpy.float32)
+    data[:, disc] = (
+        intensities[:, None]
+        + 20*random.standard_normal((frames, disc.sum())))
+
+    dtype = numpy.dtype(word_types[word_type]).newbyteorder("<")
+    if dtype.kind != "f":
+        data = numpy.clip(
+            data, numpy.iinfo(dtype).min, numpy.iinfo(dtype).max)
+    return data.astype(dtype)
+
+def _write_parameters(path, fields):
+    """ Write a JCAMP-DX parameter file.
+    """
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(path, "w") as fd:
+        fd.write("##TITLE=Parameter List, ParaVision 6.0.1\n")
+        fd.write("##JCAMPDX=4.24\n")
+        fd.write("##DATATYPE=Parameter Values\n")
+        fd.write("##ORIGIN=Bruker BioSpin MRI GmbH\n")
+        fd.write("##OWNER=nmrsu\n")
+        fd.write("$$ Synthetic data set\n")
+        for name, value in fields:
+            fd.write("##${}={}\n".format(name, _format_value(value)))
+        fd.write("##END=\n")
+
+def _format_value(value):
+    """ Format a field value: scalar, string, array of numbers, strings or
+        structures.
+    """
+
+    if isinstance(value, Enum):
+        return value
+    elif isinstance(value, basestring):
+        if value.startswith("<"):
+            return value
+        return "( {} )\n<{}>".format(max(64, len(value)+1), value)
+    elif numpy.isscalar(value):
+        return _format_scalar(value)
+
+    if isinstance(value, list) and value and isinstance(value[0], tuple):
+        items = [
+            "({})".format(", ".join(
+                x if isinstance(x, basestring) else _format_scalar(x)
+                for x in item))
+            for item in value]
+        shape = [len(value)]
+    elif isinstance(value, list) and value and isinstance(value[0], basestring):
+        items = [
+            x if isinstance(x, Enum) else "<{}>".format(x) for x in value]
+        shape = [len(value)]
+        if not isinstance(value[0], Enum):
+            # The last dimension of string arrays is the maximum length
+            shape.append(65)
+    else:
+        value = numpy.asarray(value)
+        items = [_format_scalar(x) for x in value.ravel()]
+        shape = value.shape
+
+    # Lines of at most 72 characters. The line breaks are removed by the
+    # parser, each line but the last one must end with a separator.
+    lines = [[]]
+    length = 0
+    for item in items:
+        if lines[-1] and length+1+len(item) > 72:
+            lines.append([])
+            length = 0
+        lines[-1].append(item)
+        length += 1+len(item)
+
+    return "( {} )\n{}".format(
+        ", ".join(str(x) for x in shape),
+        " \n".join(" ".join(line) for line in lines))
+
+def _format_scalar(value):
+    """ Format a number, real numbers always have a decimal point.
+    """
+
+    if isinstance(value, (float, numpy.floating)):
+        return repr(float(value))
+    else:
+        return str(int(value))
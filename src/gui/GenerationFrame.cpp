@@ -217,7 +217,7 @@ GenerationFrame
             if(bruker_directories.find(source) == bruker_directories.end())
             {
                 object bruker_directory = Directory();
-                bruker_directory.attr("load")(source);
+                bruker_directory.attr("load")(source, true);
                 bruker_directories[source] = bruker_directory;
             }
             auto const & bruker_directory = bruker_directories.at(source);
@@ -20,6 +20,7 @@
 #include "components/TreeItem.h"
 
 #include "bruker/Directory.h"
+#include "bruker/DirectoryIndex.h"
 #include "ui_SubjectsFrame.h"
 
 namespace dicomifier
@@ -197,69 +198,41 @@ SubjectsFrame
 
     std::vector<TreeItem*> subjectsAndStudiesList;
 
-    for(boost::filesystem::directory_iterator it(directory);
-        it != boost::filesystem::directory_iterator(); ++it)
+    // Subjects are either in a directory of the root (PV5:
+    // <root>/<subject>/subject) or in a study directory (PV6:
+    // <root>/<study>/<subject>/subject), found in a single traversal.
+    dicomifier::bruker::DirectoryIndex const index(directory);
+    auto const & root = index.get_root();
+    for(auto const & subject_path: index.get_subjects())
     {
-        // If we find a directory ( = subject )
-        if(boost::filesystem::is_directory(*it))
+        auto const parent = subject_path.parent_path();
+        bool const is_pv5 = (parent == root);
+        bool const is_pv6 =
+            parent.parent_path() == root
+            && index.get_files(parent).count("subject") == 0;
+        if(!is_pv5 && !is_pv6)
         {
-            std::string subject_directory(it->path().filename().string());
-
-            std::string const dir =
-                directory + VALID_FILE_SEPARATOR + subject_directory;
-            std::string file =
-                dir + VALID_FILE_SEPARATOR + "subject";
-
-            std::string subject_path = dir;
-
-            if(!boost::filesystem::exists(file))
-            {
-                bool is_pv6 = false;
-                // Search if it's a PV6 directory ( = <file>.study )
-                for(boost::filesystem::directory_iterator itpv6(dir);
-                    itpv6 != boost::filesystem::directory_iterator(); ++itpv6)
-                {
-                    // If we find a directory ( = subject )
-                    if(boost::filesystem::is_directory(*itpv6))
-                    {
-                        std::string const dirpv6 =
-                            (dir/itpv6->path().filename()).string();
-                        file = dirpv6 + VALID_FILE_SEPARATOR + "subject";
-
-                        if(!boost::filesystem::exists(file))
-                        {
-                            continue;
-                        }
-
-                        is_pv6 = true;
-                        subject_directory = itpv6->path().filename().string();
-                        subject_path = dirpv6;
-                    }
-                }
-
-                if(!is_pv6)
-                {
-                    continue;
-                }
-            }
-
-            dicomifier::bruker::Dataset dataset;
-            dataset.load(file);
-
-            TreeItem* treeitem = new TreeItem();
-            connect(
-                treeitem, SIGNAL(SendDate(double)),
-                this, SLOT(_on_date_received(double)));
-            treeitem->set_directory(subject_path);
-            treeitem->fill_data(dataset);
-            treeitem->set_subjectDirectory(subject_directory);
-            disconnect(
-                treeitem, SIGNAL(SendDate(double)),
-                this, SLOT(_on_date_received(double)));
-
-            subjectsAndStudiesList.push_back(treeitem);
+            continue;
         }
-        // else ignore files
+
+        std::string const subject_directory =
+            subject_path.filename().string();
+
+        dicomifier::bruker::Dataset dataset;
+        dataset.load(index.get_files(subject_path).at("subject").string());
+
+        TreeItem* treeitem = new TreeItem();
+        connect(
+            treeitem, SIGNAL(SendDate(double)),
+            this, SLOT(_on_date_received(double)));
+        treeitem->set_directory(subject_path.string());
+        treeitem->fill_data(dataset);
+        treeitem->set_subjectDirectory(subject_directory);
+        disconnect(
+            treeitem, SIGNAL(SendDate(double)),
+            this, SLOT(_on_date_received(double)));
+
+        subjectsAndStudiesList.push_back(treeitem);
     }
     this->_ui->dateFilterBegin->setDateTime(this->_datetimemin);
     this->_tree_view->filter_date(
@@ -9,15 +9,13 @@
 #include "Dataset.h"
 
 #include <fstream>
-#include <iterator>
 #include <map>
 #include <string>
 #include <vector>
 
-#include <boost/regex.hpp>
-
 #include "bruker/Field.h"
-#include "bruker/grammar.h"
+#include "bruker/HeaderCache.h"
+#include "bruker/parser.h"
 #include "core/DicomifierException.h"
 
 namespace dicomifier
@@ -36,42 +34,19 @@ Dataset
     {
         throw DicomifierException("Could not open file: " + path);
     }
-    _used_files.push_back(path);
-    std::string data(
-        (std::istreambuf_iterator<typename std::string::value_type>(stream)),
-        (std::istreambuf_iterator<typename std::string::value_type>()));
-    stream.close();
-
-    // Join the lines
-    data = boost::regex_replace(data, boost::regex("\\\\?\\R(?!##|\\$\\$)"), "");
 
     // Parse the data
-    std::string::const_iterator begin = data.begin();
-    std::string::const_iterator const end = data.end();
-    
-    std::vector<Field> fields;
-    grammar<std::string::const_iterator> g;
-    bool const parsed = boost::spirit::qi::parse(begin, end, g, fields);
-    
-    if(!parsed)
-    {
-        throw DicomifierException("Could not parse file");
-    }
-    
-    if(begin != end)
-    {
-        throw DicomifierException("File was parsed incompletely");
-    }
+    auto fields = parse(stream);
+    stream.close();
 
-    // Fill the fields map
-    for(auto & field: fields)
-    {
-        if(field.name[0] == '$')
-        {
-            field.name = field.name.substr(1);
-        }
-        this->set_field(field);
-    }
+    this->_load(std::move(fields), path);
+}
+
+void
+Dataset
+::load(std::string const & path, HeaderCache & cache)
+{
+    this->_load(*cache.get_fields(path), path);
 }
 
 
@@ -111,6 +86,20 @@ Dataset
     this->_update_frame_groups();
 }
 
+void
+Dataset
+::update(Dataset const & other)
+{
+    for(auto const & it: other._fields)
+    {
+        this->_fields[it.first] = it.second;
+    }
+    this->_used_files.insert(
+        this->_used_files.end(),
+        other._used_files.begin(), other._used_files.end());
+    this->_update_frame_groups();
+}
+
 std::vector<FrameGroup> const &
 Dataset
 ::get_frame_groups() const
@@ -118,6 +107,25 @@ Dataset
     return this->_frame_groups;
 }
 
+void
+Dataset
+::_load(std::vector<Field> fields, std::string const & path)
+{
+    _used_files.push_back(path);
+
+    // Fill the fields map, update the frame groups only once.
+    for(auto & field: fields)
+    {
+        if(field.name[0] == '$')
+        {
+            field.name = field.name.substr(1);
+        }
+        auto const name = field.name;
+        this->_fields[name] = std::move(field);
+    }
+    this->_update_frame_groups();
+}
+
 void
 Dataset
 ::_update_frame_groups()
@@ -158,7 +166,7 @@ Dataset
         for(long parameter_index=start; 
             parameter_index < start+parameters_count; ++parameter_index)
         {
-            auto fieldvisu = this->get_field("VisuGroupDepVals");
+            auto const & fieldvisu = this->get_field("VisuGroupDepVals");
 
             bruker::Field::Value parameter_item;
             parameter_item = fieldvisu.get_struct(parameter_index);
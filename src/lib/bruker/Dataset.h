@@ -14,6 +14,7 @@
 #include <vector>
 
 #include "Field.h"
+#include "HeaderCache.h"
 
 namespace dicomifier
 {
@@ -35,11 +36,23 @@ struct FrameGroup
     std::vector<Parameter> parameters;
 };
 
+/**
+ * @brief Fields of a Bruker data set, merged from one or several files.
+ *
+ * Thread safety: const member functions may be called from several threads,
+ * the others require exclusive access.
+ */
 class Dataset
 {
 public:
     /// @brief Load dataset from file, update any existing field.
     void load(std::string const & path);
+
+    /**
+     * @brief Load dataset from file through a cache of parsed files, update 
+     * any existing field.
+     */
+    void load(std::string const & path, HeaderCache & cache);
     
     /// @brief Test if dataset contains a given field.
     bool has_field(std::string const & name) const;
@@ -49,6 +62,12 @@ public:
     
     /// @brief Add a field to the dataset or modify an existing field.
     void set_field(Field const & field);
+
+    /**
+     * @brief Add or modify the fields of another dataset, and append its 
+     * used files.
+     */
+    void update(Dataset const & other);
     
     /// @brief Return the frame groups, in outermost-to-innermost order.
     std::vector<FrameGroup> const & get_frame_groups() const;
@@ -65,6 +84,7 @@ private:
     std::vector<FrameGroup> _frame_groups;
 
     std::vector<std::string> _used_files;
+    void _load(std::vector<Field> fields, std::string const & path);
     void _update_frame_groups();
 };
 
@@ -8,8 +8,15 @@
 
 #include "Directory.h"
 
+#include <algorithm>
+#include <atomic>
+#include <exception>
+#include <map>
+#include <mutex>
 #include <set>
 #include <string>
+#include <thread>
+#include <utility>
 #include <vector>
 
 #include <boost/filesystem.hpp>
@@ -17,8 +24,61 @@
 #include <iostream>
 
 #include "Dataset.h"
+#include "DirectoryIndex.h"
 #include "core/DicomifierException.h"
 
+namespace
+{
+
+/**
+ * @brief Call function(0), ..., function(size-1) on a pool of workers.
+ *
+ * If calls throw an exception, the exception of the first failed call is 
+ * re-thrown once all workers are done.
+ */
+template<typename TFunction>
+void run_parallel(std::size_t size, unsigned int workers, TFunction function)
+{
+    std::vector<std::exception_ptr> exceptions(size);
+    std::atomic<std::size_t> next(0);
+    auto const worker = [&]() {
+        for(auto i = next++; i < size; i = next++)
+        {
+            try
+            {
+                function(i);
+            }
+            catch(...)
+            {
+                exceptions[i] = std::current_exception();
+            }
+        }
+    };
+
+    std::vector<std::thread> threads;
+    auto const threads_count = std::min<std::size_t>(workers, size);
+    for(std::size_t i=1; i<threads_count; ++i)
+    {
+        threads.emplace_back(worker);
+    }
+    // The calling thread is also a worker.
+    worker();
+    for(auto & thread: threads)
+    {
+        thread.join();
+    }
+
+    for(auto const & exception: exceptions)
+    {
+        if(exception)
+        {
+            std::rethrow_exception(exception);
+        }
+    }
+}
+
+}
+
 namespace dicomifier
 {
 
@@ -36,14 +96,9 @@ Directory
 ::list_subjects(std::string const & path)
 {
     std::vector<std::string> subjects;
-    typedef boost::filesystem::recursive_directory_iterator RecursiveIterator;
-
-    for (RecursiveIterator it(path); it != RecursiveIterator(); ++it)
+    for(auto const & subject: DirectoryIndex(path).get_subjects())
     {
-        if (it->path().filename() == "subject")
-        {
-            subjects.push_back(it->path().parent_path().string());
-        }
+        subjects.push_back(subject.string());
     }
     return subjects;
 }
@@ -51,65 +106,143 @@ Directory
 
 void
 Directory
-::load(std::string const & path)
+::load(std::string const & path, bool lazy)
+{
+    this->load(DirectoryIndex(path), path, lazy);
+}
+
+void
+Directory
+::load(DirectoryIndex const & index, std::string const & path, bool lazy)
 {
-    typedef boost::filesystem::recursive_directory_iterator RecursiveIterator;
-    typedef boost::filesystem::directory_iterator Iterator;
+    auto const root = boost::filesystem::canonical(path);
 
-    std::vector<Path> reconstructions;
-    for(RecursiveIterator it(boost::filesystem::canonical(path));
-        it != RecursiveIterator(); ++it)
+    std::vector<Reconstruction> reconstructions;
+    for(auto const & item: index.get_files())
     {
-        if(it->path().filename() == "id")
+        if(DirectoryIndex::is_below(item.first, root)
+            && item.second.find("id") != item.second.end())
         {
-            reconstructions.push_back(it->path().parent_path());
+            reconstructions.push_back(
+                Directory::_get_reconstruction(index, item.first, root));
         }
     }
 
-    for(auto const & reco: reconstructions)
+    if(lazy)
+    {
+        // Files may have been modified since the previous load.
+        this->_files.clear();
+        for(auto const & reconstruction: reconstructions)
+        {
+            auto const key = Directory::_get_key(reconstruction.path);
+            this->_datasets.erase(key);
+            this->_reconstructions[key] = reconstruction;
+        }
+    }
+    else
     {
-        Dataset dataset;
-        Path current_path = reco;
-        // upper path will be used to store the path above "path" arg
-        Path upper_path = boost::filesystem::canonical(path);
-        // We can begin here because the files under "reco" path will anyway be
-        // parsed with the line "_add_reconstruction..."
-        current_path.remove_leaf();
-        // We use upper_path in order to parse the "path" directory too in the
-        // following while loop
-        upper_path.remove_leaf();
-        while(!boost::filesystem::equivalent(current_path, upper_path))
+        // Files above the reconstructions (subject, acqp, method, etc.) are 
+        // shared by several reconstructions: parse them only once. All files
+        // are inserted in the cache before the parsing starts, so that the 
+        // workers only access the cache read-only.
+        FileCache cache;
+        std::vector<std::pair<Path, Dataset *>> files;
+        for(auto const & reconstruction: reconstructions)
         {
-            for(Iterator it(current_path); it!= Iterator(); ++it)
+            for(auto const & file: reconstruction.files)
             {
-                if(this->_known_files.find(it->path().filename()) != this->_known_files.end()
-                    && it->path().filename() != "visu_pars")
+                auto const canonical_path = boost::filesystem::canonical(file);
+                auto const inserted = cache.insert(
+                    std::make_pair(canonical_path, Dataset()));
+                if(inserted.second)
                 {
-                    dataset.load(it->path().string());
+                    files.emplace_back(
+                        canonical_path, &inserted.first->second);
                 }
             }
-            current_path.remove_leaf();
         }
-        this->_add_reconstruction(reco, dataset);
+        run_parallel(
+            files.size(), this->get_workers(),
+            [&](std::size_t i) { 
+                *files[i].second = this->_parse_file(files[i].first); });
+
+        // Merge the files of each reconstruction, then store the datasets
+        // in the order of the reconstructions.
+        std::vector<Dataset> datasets(reconstructions.size());
+        run_parallel(
+            reconstructions.size(), this->get_workers(),
+            [&](std::size_t i) { 
+                datasets[i] = this->_load_reconstruction(
+                    reconstructions[i], cache); });
+
+        for(std::size_t i=0; i<reconstructions.size(); ++i)
+        {
+            auto const key = Directory::_get_key(reconstructions[i].path);
+            this->_reconstructions.erase(key);
+            this->_datasets[key] = std::move(datasets[i]);
+        }
+    }
+}
+
+void
+Directory
+::set_workers(unsigned int workers)
+{
+    this->_workers = workers;
+}
+
+unsigned int
+Directory
+::get_workers() const
+{
+    if(this->_workers == 0)
+    {
+        return std::max(1u, std::thread::hardware_concurrency());
     }
+    return this->_workers;
+}
+
+void
+Directory
+::set_header_cache(HeaderCache * cache)
+{
+    this->_header_cache = cache;
 }
 
 bool
 Directory
 ::has_dataset(std::string const & reconstruction) const
 {
+    std::lock_guard<std::mutex> const lock(this->_mutex);
     auto const dataset_it = this->_datasets.find(reconstruction);
-    return (dataset_it != this->_datasets.end());
+    auto const reconstruction_it = this->_reconstructions.find(reconstruction);
+    return (
+        dataset_it != this->_datasets.end() 
+        || reconstruction_it != this->_reconstructions.end());
 }
 
 Dataset const &
 Directory
 ::get_dataset(std::string const & reconstruction) const
 {
-    auto const dataset_it = this->_datasets.find(reconstruction);
+    // Lazy loads modify the datasets and the file cache: they are 
+    // serialized.
+    std::lock_guard<std::mutex> const lock(this->_mutex);
+    auto dataset_it = this->_datasets.find(reconstruction);
     if(dataset_it == this->_datasets.end())
     {
-        throw DicomifierException("No such series");
+        auto const reconstruction_it = 
+            this->_reconstructions.find(reconstruction);
+        if(reconstruction_it == this->_reconstructions.end())
+        {
+            throw DicomifierException("No such series");
+        }
+
+        auto dataset = this->_load_reconstruction(
+            reconstruction_it->second, this->_files);
+        dataset_it = this->_datasets.insert(
+            std::make_pair(reconstruction, std::move(dataset))).first;
+        this->_reconstructions.erase(reconstruction_it);
     }
     
     return dataset_it->second;
@@ -119,80 +252,127 @@ std::vector<std::string> const &
 Directory
 ::get_used_files(std::string const& reconstruction) const
 {
-    auto const dataset_it = this->_datasets.find(reconstruction);
-    if(dataset_it == this->_datasets.end())
+    return this->get_dataset(reconstruction).get_used_files();
+}
+
+std::map<std::string, std::vector<std::string> >
+Directory
+::get_series_and_reco(const std::string &path)
+{
+    return DirectoryIndex(path).get_series_and_reco(path);
+}
+
+Dataset const &
+Directory
+::_load_file(Path const & path, FileCache & cache) const
+{
+    auto const canonical_path = boost::filesystem::canonical(path);
+    auto cache_it = cache.find(canonical_path);
+    if(cache_it == cache.end())
     {
-        throw DicomifierException("No such series");
+        cache_it = cache.insert(
+            std::make_pair(canonical_path, this->_parse_file(path))).first;
     }
+    return cache_it->second;
+}
 
-    return dataset_it->second.get_used_files();
+Dataset
+Directory
+::_parse_file(Path const & path) const
+{
+    Dataset dataset;
+    if(this->_header_cache != nullptr)
+    {
+        dataset.load(
+            boost::filesystem::canonical(path).string(), 
+            *this->_header_cache);
+    }
+    else
+    {
+        dataset.load(path.string());
+    }
+    return dataset;
 }
 
-std::map<std::string, std::vector<std::string> >
+std::string
 Directory
-::get_series_and_reco(const std::string &path)
+::_get_key(Path const & reconstruction)
 {
-    std::map<std::string, std::vector<std::string> > map;
+    int const reconstruction_number = boost::lexical_cast<int>(
+        reconstruction.filename().string());
+    int const series_number = boost::lexical_cast<int>(
+        reconstruction.parent_path().parent_path().filename().string());
+    
+    return boost::lexical_cast<std::string>(
+        10000*series_number+reconstruction_number);
+}
 
-    typedef boost::filesystem::directory_iterator Iterator;
-    typedef boost::filesystem::recursive_directory_iterator RecursiveIterator;
+Directory::Reconstruction
+Directory
+::_get_reconstruction(
+    DirectoryIndex const & index, Path const & path, Path const & root)
+{
+    auto const & files = index.get_files();
+
+    Reconstruction reconstruction;
+    reconstruction.path = path;
 
-    for(RecursiveIterator it(path); it != RecursiveIterator(); ++it)
+    // Files of the parent directories, up to the loaded directory. We can 
+    // begin at the parent directory because the files under the 
+    // reconstruction directory are added afterwards.
+    for(Path current_path = path.parent_path(); 
+        DirectoryIndex::is_below(current_path, root);
+        current_path = current_path.parent_path())
     {
-        if(it->path().filename() == "pdata")
+        auto const files_it = files.find(current_path);
+        if(files_it == files.end())
+        {
+            continue;
+        }
+        for(auto const & file: files_it->second)
         {
-            for(Iterator reco_it(it->path()); reco_it != Iterator(); ++reco_it)
+            if(Directory::_known_files.find(file.first) != Directory::_known_files.end()
+                && file.first != "visu_pars")
             {
-                if(boost::filesystem::is_directory(reco_it->path()))
-                {
-                    std::string const reconstruction = ((Path)*reco_it).filename().string();
-                    std::string const series = ((Path)*reco_it).parent_path().parent_path().filename().string();
-
-                    if (map.find(series) == map.end())
-                    {// create new entry
-                        map[series] = {};
-                    }
-                    map[series].push_back(reconstruction);
-                }
+                reconstruction.files.push_back(file.second);
             }
+        }
+    }
 
-            // Don't descend reconstructions have been processed.
-            it.no_push();
+    // Known files below this reconstruction directory
+    for(auto files_it = files.lower_bound(path); 
+        files_it != files.end() 
+            && DirectoryIndex::is_below(files_it->first, path);
+        ++files_it)
+    {
+        for(auto const & file: files_it->second)
+        {
+            if(Directory::_known_files.find(file.first) != Directory::_known_files.end())
+            {
+                reconstruction.files.push_back(file.second);
+            }
+            if(file.first == "2dseq")
+            {
+                reconstruction.pixel_data = file.second;
+            }
         }
     }
 
-    return map;
+    return reconstruction;
 }
 
-void
+Dataset
 Directory
-::_add_reconstruction(Path const & root, Dataset const & template_)
+::_load_reconstruction(
+    Reconstruction const & reconstruction, FileCache & cache) const
 {
-    // Known files below this reconstruction directory
-    std::vector<Path> files;
-    
-    typedef boost::filesystem::recursive_directory_iterator Iterator;
-    
-    Path pixel_data;
-    
-    for(Iterator it(root); it != Iterator(); ++it)
+    Dataset dataset;
+    for(auto const & file: reconstruction.files)
     {
-        if(this->_known_files.find(it->path().filename()) != this->_known_files.end())
-        {
-            files.push_back(it->path());
-        }
-        if(it->path().filename() == "2dseq")
-        {
-            pixel_data = it->path();
-        }
+        dataset.update(this->_load_file(file, cache));
     }
     
-    // Create the dataset
-    Dataset dataset(template_);
-    for(auto const & file: files)
-    {
-        dataset.load(file.string());
-    }
+    auto const & pixel_data = reconstruction.pixel_data;
     if(!pixel_data.empty())
     {
         Field field;
@@ -201,14 +381,7 @@ Directory
         dataset.set_field(field);
     }
     
-    int const reconstruction = boost::lexical_cast<int>(
-        root.filename().string());
-    int const series = boost::lexical_cast<int>(
-        root.parent_path().parent_path().filename().string());
-    
-    std::string const key = boost::lexical_cast<std::string>(
-        10000*series+reconstruction);
-    this->_datasets[key] = dataset;
+    return dataset;
 }
 
 } // namespace bruker
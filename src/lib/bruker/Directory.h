@@ -10,12 +10,15 @@
 #define _de7bece8_638f_4abc_bb07_1d9f9863f468
 
 #include <map>
+#include <mutex>
 #include <set>
 #include <string>
 
 #include <boost/filesystem.hpp>
 
 #include "Dataset.h"
+#include "DirectoryIndex.h"
+#include "HeaderCache.h"
 
 // file separator
 #if defined(_WIN32)
@@ -32,6 +35,14 @@ namespace dicomifier
 namespace bruker
 {
 
+/**
+ * @brief Datasets of the Bruker reconstructions found in a directory.
+ *
+ * Thread safety: load and the setters must not be called concurrently with 
+ * any other member function. Once loaded, the const member functions may be
+ * called from several threads; in lazy mode, the datasets loaded on first
+ * access are loaded one at a time.
+ */
 class Directory
 {
 public:
@@ -39,15 +50,45 @@ public:
     /// @brief Return a list of path for each subject found under @arg path
     static std::vector<std::string> list_subjects (std::string const & path);
 
-    /// @brief Load datasets for every reconstruction found under @arg path
-    void load(std::string const & path);
+    /**
+     * @brief Load datasets for every reconstruction found under @arg path
+     *
+     * If @arg lazy is true, only the paths of the reconstructions are 
+     * stored, and the dataset of a reconstruction is loaded on its first 
+     * access.
+     */
+    void load(std::string const & path, bool lazy=false);
+
+    /**
+     * @brief Load datasets for every reconstruction of @arg index found 
+     * under @arg path, without traversing the file system again.
+     */
+    void load(
+        DirectoryIndex const & index, std::string const & path, 
+        bool lazy=false);
+
+    /**
+     * @brief Parse files through a persistent cache, or parse them directly
+     * if @arg cache is NULL. The cache must outlive the loaded datasets.
+     */
+    void set_header_cache(HeaderCache * cache);
+
+    /**
+     * @brief Set the number of threads used to parse the files in a 
+     * non-lazy load, 0 means one thread per core.
+     */
+    void set_workers(unsigned int workers);
+
+    /// @brief Return the number of threads used to parse the files.
+    unsigned int get_workers() const;
 
     /// @brief Test if directory contains a given series.
     bool has_dataset(std::string const & series_number) const;
     
     /**
      * @brief Return the dataset associated to the series, throw an exception 
-     * if field is missing.
+     * if field is missing. In lazy mode, the dataset is loaded on first 
+     * access.
      */
     Dataset const & get_dataset(std::string const & reconstruction) const;
 
@@ -60,11 +101,55 @@ public:
 private:
     typedef boost::filesystem::path Path;
     
+    /// @brief Parsed files of a load, indexed by canonical path.
+    typedef std::map<Path, Dataset> FileCache;
+
+    /// @brief Location and files of a reconstruction.
+    struct Reconstruction
+    {
+        /// @brief Directory of the reconstruction.
+        Path path;
+        /// @brief Known files of the reconstruction, in loading order.
+        std::vector<Path> files;
+        /// @brief Pixel data file, may be empty.
+        Path pixel_data;
+    };
+
     /// @brief Known files in the Bruker hierarchy 
     static std::set<Path> const _known_files;
-    std::map<std::string, Dataset> _datasets;
+    mutable std::map<std::string, Dataset> _datasets;
+
+    /// @brief Reconstructions of a lazy load which have not been accessed.
+    mutable std::map<std::string, Reconstruction> _reconstructions;
+
+    /// @brief Parsed files of a lazy load.
+    mutable FileCache _files;
+
+    /// @brief Protect the lazy loading of datasets.
+    mutable std::mutex _mutex;
+
+    /// @brief Persistent cache of parsed files, may be NULL.
+    HeaderCache * _header_cache = nullptr;
+
+    /// @brief Number of parsing threads, 0 means one thread per core.
+    unsigned int _workers = 1;
     
-    void _add_reconstruction(Path const & root, Dataset const & template_);
+    /// @brief Return the parsed file, parse it only if it is not cached.
+    Dataset const & _load_file(Path const & path, FileCache & cache) const;
+
+    /// @brief Parse a file, through the persistent cache if it is set.
+    Dataset _parse_file(Path const & path) const;
+
+    /// @brief Return the key of the reconstruction (10000*series+reco).
+    static std::string _get_key(Path const & reconstruction);
+
+    /// @brief Return the files of a reconstruction, up to @arg root.
+    static Reconstruction _get_reconstruction(
+        DirectoryIndex const & index, Path const & path, Path const & root);
+
+    /// @brief Load the dataset of a reconstruction.
+    Dataset _load_reconstruction(
+        Reconstruction const & reconstruction, FileCache & cache) const;
 };
 
 } // namespace bruker
@@ -0,0 +1,146 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include "DirectoryIndex.h"
+
+#include <algorithm>
+#include <iterator>
+#include <map>
+#include <set>
+#include <string>
+#include <vector>
+
+#include <boost/filesystem.hpp>
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+std::set<std::string> const
+DirectoryIndex::indexed_files = {
+    "subject", "acqp", "method", "imnd", "isa", "d3proc", "reco", "visu_pars",
+    "2dseq", "id"};
+
+DirectoryIndex
+::DirectoryIndex(std::string const & path)
+: _root(boost::filesystem::canonical(path))
+{
+    typedef boost::filesystem::recursive_directory_iterator RecursiveIterator;
+
+    for(RecursiveIterator it(this->_root); it != RecursiveIterator(); ++it)
+    {
+        auto const & entry_path = it->path();
+        auto const status = it->status();
+        if(boost::filesystem::is_directory(status))
+        {
+            if(entry_path.parent_path().filename() == "pdata")
+            {
+                this->_reconstructions.push_back(entry_path);
+            }
+        }
+        else
+        {
+            auto const name = entry_path.filename().string();
+            if(DirectoryIndex::indexed_files.find(name) !=
+                DirectoryIndex::indexed_files.end())
+            {
+                this->_files[entry_path.parent_path()][name] = entry_path;
+            }
+        }
+    }
+
+    std::sort(this->_reconstructions.begin(), this->_reconstructions.end());
+}
+
+DirectoryIndex::Path const &
+DirectoryIndex
+::get_root() const
+{
+    return this->_root;
+}
+
+std::vector<DirectoryIndex::Path>
+DirectoryIndex
+::get_subjects() const
+{
+    std::vector<Path> subjects;
+    for(auto const & item: this->_files)
+    {
+        if(item.second.find("subject") != item.second.end())
+        {
+            subjects.push_back(item.first);
+        }
+    }
+    return subjects;
+}
+
+std::vector<DirectoryIndex::Path>
+DirectoryIndex
+::get_reconstructions(Path const & path) const
+{
+    auto const root = boost::filesystem::canonical(path);
+
+    std::vector<Path> reconstructions;
+    std::copy_if(
+        this->_reconstructions.begin(), this->_reconstructions.end(),
+        std::back_inserter(reconstructions),
+        [&root](Path const & x) { return DirectoryIndex::is_below(x, root); });
+    return reconstructions;
+}
+
+std::map<std::string, std::vector<std::string> >
+DirectoryIndex
+::get_series_and_reco(Path const & path) const
+{
+    std::map<std::string, std::vector<std::string> > map;
+    for(auto const & reconstruction: this->get_reconstructions(path))
+    {
+        auto const series =
+            reconstruction.parent_path().parent_path().filename().string();
+        map[series].push_back(reconstruction.filename().string());
+    }
+    return map;
+}
+
+std::map<DirectoryIndex::Path, DirectoryIndex::Files> const &
+DirectoryIndex
+::get_files() const
+{
+    return this->_files;
+}
+
+DirectoryIndex::Files const &
+DirectoryIndex
+::get_files(Path const & directory) const
+{
+    static Files const empty;
+
+    auto const it = this->_files.find(boost::filesystem::canonical(directory));
+    return (it != this->_files.end())?(it->second):empty;
+}
+
+bool
+DirectoryIndex
+::is_below(Path const & path, Path const & root)
+{
+    auto path_it = path.begin();
+    for(auto root_it = root.begin(); root_it != root.end(); ++root_it, ++path_it)
+    {
+        if(path_it == path.end() || *path_it != *root_it)
+        {
+            return false;
+        }
+    }
+    return true;
+}
+
+} // namespace bruker
+
+} // namespace dicomifier
@@ -0,0 +1,84 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#ifndef _0f6e2c8a_4a3b_4d0c_9b8e_7d1f2e5a6c34
+#define _0f6e2c8a_4a3b_4d0c_9b8e_7d1f2e5a6c34
+
+#include <map>
+#include <set>
+#include <string>
+#include <vector>
+
+#include <boost/filesystem.hpp>
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+/**
+ * @brief Index of a Bruker hierarchy, built in a single traversal of the
+ * file system: subjects, series, reconstructions and relevant files.
+ */
+class DirectoryIndex
+{
+public:
+    typedef boost::filesystem::path Path;
+
+    /// @brief Indexed files of a directory, by name.
+    typedef std::map<std::string, Path> Files;
+
+    /// @brief Names of the indexed files.
+    static std::set<std::string> const indexed_files;
+
+    /// @brief Index the Bruker hierarchy found under @arg path.
+    DirectoryIndex(std::string const & path);
+
+    /// @brief Return the canonical path of the indexed directory.
+    Path const & get_root() const;
+
+    /// @brief Return the directories containing a "subject" file.
+    std::vector<Path> get_subjects() const;
+
+    /**
+     * @brief Return the reconstruction directories (i.e. directories in a
+     * "pdata" directory) found under @arg path.
+     *
+     * The paths passed to this function and to the following ones may be
+     * relative or non-canonical.
+     */
+    std::vector<Path> get_reconstructions(Path const & path) const;
+
+    /**
+     * @brief Return the reconstructions numbers found under @arg path,
+     * indexed by series number.
+     */
+    std::map<std::string, std::vector<std::string> >
+    get_series_and_reco(Path const & path) const;
+
+    /// @brief Return the directories containing indexed files.
+    std::map<Path, Files> const & get_files() const;
+
+    /// @brief Return the indexed files of a directory.
+    Files const & get_files(Path const & directory) const;
+
+    /// @brief Test whether @arg path is @arg root or is below @arg root.
+    static bool is_below(Path const & path, Path const & root);
+
+private:
+    Path _root;
+    std::map<Path, Files> _files;
+    std::vector<Path> _reconstructions;
+};
+
+} // namespace bruker
+
+} // namespace dicomifier
+
+#endif // _0f6e2c8a_4a3b_4d0c_9b8e_7d1f2e5a6c34
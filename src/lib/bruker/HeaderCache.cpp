@@ -0,0 +1,461 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include "HeaderCache.h"
+
+#include <cstdint>
+#include <cstring>
+#include <ctime>
+#include <fstream>
+#include <istream>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <ostream>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include <boost/filesystem.hpp>
+
+#include "bruker/Field.h"
+#include "bruker/parser.h"
+#include "core/DicomifierException.h"
+
+namespace
+{
+
+using dicomifier::bruker::Field;
+
+// Header of the cache file: magic string, version, and a marker to detect 
+// files written on a platform with another byte order.
+char const magic[] = "DCMFHDR";
+std::uint32_t const version = 1;
+std::uint32_t const byte_order = 0x01020304;
+
+class Reader
+{
+public:
+    Reader(std::istream & stream, std::uintmax_t size)
+    : _stream(stream), _remaining(size)
+    {
+        // Nothing else.
+    }
+
+    template<typename T>
+    T read()
+    {
+        this->_check(sizeof(T));
+        T value;
+        this->_stream.read(reinterpret_cast<char*>(&value), sizeof(T));
+        return value;
+    }
+
+    std::size_t read_size(std::size_t item_size)
+    {
+        auto const size = this->read<std::uint64_t>();
+        // Guard against corrupted sizes before allocating
+        if(size > this->_remaining / item_size)
+        {
+            throw dicomifier::DicomifierException("Invalid size");
+        }
+        return size;
+    }
+
+    std::string read_string()
+    {
+        std::string value(this->read_size(1), '\0');
+        this->_check(value.size());
+        this->_stream.read(&value[0], value.size());
+        return value;
+    }
+
+    Field::Item read_item()
+    {
+        auto const type = this->read<std::uint8_t>();
+        if(type == 0)
+        {
+            return static_cast<long>(this->read<std::int64_t>());
+        }
+        else if(type == 1)
+        {
+            return this->read<float>();
+        }
+        else if(type == 2)
+        {
+            return this->read_string();
+        }
+        else if(type == 3)
+        {
+            std::vector<Field::Item> value(this->read_size(1));
+            for(auto & item: value)
+            {
+                item = this->read_item();
+            }
+            return value;
+        }
+        else
+        {
+            throw dicomifier::DicomifierException("Invalid item type");
+        }
+    }
+
+    Field read_field()
+    {
+        Field field;
+        field.name = this->read_string();
+        field.shape.resize(this->read_size(sizeof(std::int32_t)));
+        for(auto & item: field.shape)
+        {
+            item = this->read<std::int32_t>();
+        }
+        field.value.resize(this->read_size(1));
+        for(auto & item: field.value)
+        {
+            item = this->read_item();
+        }
+        return field;
+    }
+
+private:
+    std::istream & _stream;
+    std::uintmax_t _remaining;
+
+    void _check(std::size_t size)
+    {
+        if(size > this->_remaining)
+        {
+            throw dicomifier::DicomifierException("Truncated cache");
+        }
+        this->_remaining -= size;
+    }
+};
+
+class Writer: public boost::static_visitor<>
+{
+public:
+    Writer(std::ostream & stream)
+    : _stream(stream)
+    {
+        // Nothing else.
+    }
+
+    template<typename T>
+    void write(T const & value)
+    {
+        this->_stream.write(reinterpret_cast<char const *>(&value), sizeof(T));
+    }
+
+    void write_size(std::size_t size)
+    {
+        this->write<std::uint64_t>(size);
+    }
+
+    void write_string(std::string const & value)
+    {
+        this->write_size(value.size());
+        this->_stream.write(value.data(), value.size());
+    }
+
+    void operator()(long value)
+    {
+        this->write<std::uint8_t>(0);
+        this->write<std::int64_t>(value);
+    }
+
+    void operator()(float value)
+    {
+        this->write<std::uint8_t>(1);
+        this->write(value);
+    }
+
+    void operator()(std::string const & value)
+    {
+        this->write<std::uint8_t>(2);
+        this->write_string(value);
+    }
+
+    void operator()(std::vector<Field::Item> const & value)
+    {
+        this->write<std::uint8_t>(3);
+        this->write_size(value.size());
+        for(auto const & item: value)
+        {
+            boost::apply_visitor(*this, item);
+        }
+    }
+
+    void write_field(Field const & field)
+    {
+        this->write_string(field.name);
+        this->write_size(field.shape.size());
+        for(auto const & item: field.shape)
+        {
+            this->write<std::int32_t>(item);
+        }
+        this->write_size(field.value.size());
+        for(auto const & item: field.value)
+        {
+            boost::apply_visitor(*this, item);
+        }
+    }
+
+private:
+    std::ostream & _stream;
+};
+
+}
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+HeaderCache
+::HeaderCache()
+: _path(), _entries(), _hits(0), _misses(0), _modified(false)
+{
+    // Nothing else.
+}
+
+HeaderCache
+::HeaderCache(std::string const & path)
+: _path(path), _entries(), _hits(0), _misses(0), _modified(false)
+{
+    if(boost::filesystem::exists(path))
+    {
+        try
+        {
+            this->_read(path);
+        }
+        catch(DicomifierException const &)
+        {
+            // Corrupted or incompatible cache: start from scratch.
+            this->_entries.clear();
+        }
+    }
+}
+
+std::shared_ptr<std::vector<Field> const>
+HeaderCache
+::get_fields(std::string const & path)
+{
+    boost::system::error_code error;
+    auto const size = boost::filesystem::file_size(path, error);
+    auto const modification_time = boost::filesystem::last_write_time(
+        path, error);
+    if(error)
+    {
+        throw DicomifierException("Could not open file: " + path);
+    }
+
+    {
+        std::lock_guard<std::mutex> lock(this->_mutex);
+        auto const entry_it = this->_entries.find(path);
+        if(entry_it != this->_entries.end() 
+            && entry_it->second.size == size 
+            && entry_it->second.modification_time == modification_time)
+        {
+            ++this->_hits;
+            entry_it->second.used = true;
+            return entry_it->second.fields;
+        }
+    }
+
+    // Parse outside of the lock, so that files are parsed concurrently.
+    std::ifstream stream(path);
+    if(stream.fail())
+    {
+        throw DicomifierException("Could not open file: " + path);
+    }
+    Entry entry{
+        size, modification_time, 
+        std::make_shared<std::vector<Field> const>(parse(stream)), true};
+
+    std::lock_guard<std::mutex> lock(this->_mutex);
+    ++this->_misses;
+    auto entry_it = this->_entries.find(path);
+    if(entry_it == this->_entries.end())
+    {
+        entry_it = this->_entries.insert(
+            std::make_pair(path, std::move(entry))).first;
+        this->_modified = true;
+    }
+    else if(entry_it->second.size == size 
+        && entry_it->second.modification_time == modification_time)
+    {
+        // Parsed concurrently by another thread: keep the stored fields, 
+        // which may already have been returned.
+        entry_it->second.used = true;
+    }
+    else
+    {
+        // The previous fields remain valid for their current users.
+        entry_it->second = std::move(entry);
+        this->_modified = true;
+    }
+    return entry_it->second.fields;
+}
+
+unsigned long
+HeaderCache
+::get_hits() const
+{
+    std::lock_guard<std::mutex> lock(this->_mutex);
+    return this->_hits;
+}
+
+unsigned long
+HeaderCache
+::get_misses() const
+{
+    std::lock_guard<std::mutex> lock(this->_mutex);
+    return this->_misses;
+}
+
+void
+HeaderCache
+::save() const
+{
+    bool modified;
+    {
+        std::lock_guard<std::mutex> lock(this->_mutex);
+        modified = this->_modified;
+        for(auto entry_it = this->_entries.begin(); 
+            !modified && entry_it != this->_entries.end(); ++entry_it)
+        {
+            modified = HeaderCache::_is_stale(
+                entry_it->first, entry_it->second);
+        }
+    }
+    if(!this->_path.empty() && modified)
+    {
+        this->save(this->_path);
+    }
+}
+
+void
+HeaderCache
+::save(std::string const & path) const
+{
+    // Write to a temporary file first, so that an interrupted save does not
+    // leave a truncated cache.
+    auto const temporary_path = path + ".tmp";
+    {
+        std::lock_guard<std::mutex> lock(this->_mutex);
+
+        std::ofstream stream(temporary_path, std::ios::binary);
+        if(stream.fail())
+        {
+            throw DicomifierException("Could not write cache: " + path);
+        }
+
+        std::vector<std::pair<std::string const, Entry> const *> entries;
+        for(auto const & entry: this->_entries)
+        {
+            if(!HeaderCache::_is_stale(entry.first, entry.second))
+            {
+                entries.push_back(&entry);
+            }
+        }
+
+        Writer writer(stream);
+        stream.write(magic, sizeof(magic));
+        writer.write(version);
+        writer.write(byte_order);
+        writer.write_size(entries.size());
+        for(auto const & entry_pointer: entries)
+        {
+            auto const & entry = *entry_pointer;
+            writer.write_string(entry.first);
+            writer.write<std::uint64_t>(entry.second.size);
+            writer.write<std::int64_t>(entry.second.modification_time);
+            writer.write_size(entry.second.fields->size());
+            for(auto const & field: *entry.second.fields)
+            {
+                writer.write_field(field);
+            }
+        }
+
+        if(stream.fail())
+        {
+            throw DicomifierException("Could not write cache: " + path);
+        }
+    }
+    boost::filesystem::rename(temporary_path, path);
+}
+
+void
+HeaderCache
+::_read(std::string const & path)
+{
+    std::ifstream stream(path, std::ios::binary);
+    if(stream.fail())
+    {
+        throw DicomifierException("Could not open cache: " + path);
+    }
+    Reader reader(stream, boost::filesystem::file_size(path));
+
+    char file_magic[sizeof(magic)];
+    for(auto & c: file_magic)
+    {
+        c = reader.read<char>();
+    }
+    if(std::memcmp(file_magic, magic, sizeof(magic)) != 0 
+        || reader.read<std::uint32_t>() != version
+        || reader.read<std::uint32_t>() != byte_order)
+    {
+        throw DicomifierException("Invalid cache: " + path);
+    }
+
+    auto const entries_count = reader.read_size(1);
+    for(std::size_t i=0; i<entries_count; ++i)
+    {
+        auto const file = reader.read_string();
+        Entry entry;
+        entry.size = reader.read<std::uint64_t>();
+        entry.modification_time = reader.read<std::int64_t>();
+        entry.used = false;
+        auto fields = std::make_shared<std::vector<Field>>(
+            reader.read_size(1));
+        for(auto & field: *fields)
+        {
+            field = reader.read_field();
+        }
+        entry.fields = fields;
+        this->_entries[file] = std::move(entry);
+    }
+
+    if(stream.fail())
+    {
+        throw DicomifierException("Invalid cache: " + path);
+    }
+}
+
+bool
+HeaderCache
+::_is_stale(std::string const & path, Entry const & entry)
+{
+    if(entry.used)
+    {
+        return false;
+    }
+
+    boost::system::error_code error;
+    auto const size = boost::filesystem::file_size(path, error);
+    auto const modification_time = boost::filesystem::last_write_time(
+        path, error);
+    return (
+        error || size != entry.size 
+        || modification_time != entry.modification_time);
+}
+
+} // namespace bruker
+
+} // namespace dicomifier
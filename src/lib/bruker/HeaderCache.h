@@ -0,0 +1,99 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#ifndef _5b8d3f61_2c7e_4a19_8e0d_93f4a6b1c2d7
+#define _5b8d3f61_2c7e_4a19_8e0d_93f4a6b1c2d7
+
+#include <cstdint>
+#include <ctime>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include "Field.h"
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+/**
+ * @brief Persistent cache of the parsed fields of Bruker data files.
+ *
+ * Entries are keyed by path, and are valid as long as the size and the 
+ * modification time of the file do not change: modified files are parsed 
+ * again. The cache is stored in a binary file, which is read on construction
+ * and written by save. An unreadable or incompatible cache file is ignored.
+ * Entries of deleted or modified files which were not requested since the 
+ * cache was read are not saved, so that the cache file does not grow without
+ * bound.
+ *
+ * The cache may be used from several threads. The fields returned by
+ * get_fields are shared with the cache, and remain valid after the entry is
+ * replaced. When a file is parsed concurrently by several threads, the first
+ * stored fields are returned to all of them.
+ */
+class HeaderCache
+{
+public:
+    /// @brief Create an empty cache, not associated with a file.
+    HeaderCache();
+
+    /// @brief Create a cache, read it from @arg path if it exists.
+    HeaderCache(std::string const & path);
+
+    /**
+     * @brief Return the parsed fields of a file, parse it only if it is not 
+     * cached or if it has been modified.
+     */
+    std::shared_ptr<std::vector<Field> const> get_fields(
+        std::string const & path);
+
+    /// @brief Return the number of files found in the cache.
+    unsigned long get_hits() const;
+
+    /// @brief Return the number of files which were parsed.
+    unsigned long get_misses() const;
+
+    /// @brief Write the cache to its file if it was modified.
+    void save() const;
+
+    /// @brief Write the cache to @arg path.
+    void save(std::string const & path) const;
+
+private:
+    struct Entry
+    {
+        std::uintmax_t size;
+        std::time_t modification_time;
+        std::shared_ptr<std::vector<Field> const> fields;
+        /// @brief Whether the entry was requested or stored in this session.
+        bool used;
+    };
+
+    std::string _path;
+    std::map<std::string, Entry> _entries;
+    unsigned long _hits;
+    unsigned long _misses;
+    bool _modified;
+    mutable std::mutex _mutex;
+
+    void _read(std::string const & path);
+
+    /// @brief Test whether an entry must be dropped when saving the cache.
+    static bool _is_stale(std::string const & path, Entry const & entry);
+};
+
+} // namespace bruker
+
+} // namespace dicomifier
+
+#endif // _5b8d3f61_2c7e_4a19_8e0d_93f4a6b1c2d7
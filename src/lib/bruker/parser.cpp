@@ -0,0 +1,674 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include "parser.h"
+
+#include <algorithm>
+#include <cfloat>
+#include <cmath>
+#include <cstdint>
+#include <cstdlib>
+#include <istream>
+#include <iterator>
+#include <limits>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include "bruker/Field.h"
+#include "core/DicomifierException.h"
+
+namespace
+{
+
+using dicomifier::bruker::Field;
+
+// All the following parsers work on a joined record, and follow the rules of
+// grammar. They only advance the iterator on success.
+typedef char const * Iterator;
+
+bool is_space(char c)
+{
+    return c == ' ' || c == '\t' || c == '\n' || c == '\v' || c == '\f' ||
+        c == '\r';
+}
+
+bool is_digit(char c)
+{
+    return c >= '0' && c <= '9';
+}
+
+bool is_atom_char(char c)
+{
+    return is_digit(c) || (c >= 'a' && c <= 'z') || (c >= 'A' && c <= 'Z') ||
+        c == '_';
+}
+
+/// @brief Skip spaces, return whether at least one space was skipped.
+bool skip_spaces(Iterator & it, Iterator end)
+{
+    Iterator const begin = it;
+    while(it != end && is_space(*it))
+    {
+        ++it;
+    }
+    return it != begin;
+}
+
+/// @brief Match a case-insensitive keyword which is not followed by a word.
+bool match_keyword(Iterator & it, Iterator end, char const * keyword)
+{
+    Iterator p = it;
+    for(; *keyword != '\0'; ++keyword, ++p)
+    {
+        if(p == end || (*p | 0x20) != *keyword)
+        {
+            return false;
+        }
+    }
+    if(p != end && is_atom_char(*p))
+    {
+        return false;
+    }
+    it = p;
+    return true;
+}
+
+/// @brief Parse an integer, fail on overflow.
+template<typename T>
+bool parse_integer(Iterator & it, Iterator end, T & value)
+{
+    Iterator p = it;
+    bool negative = false;
+    if(p != end && (*p == '+' || *p == '-'))
+    {
+        negative = (*p == '-');
+        ++p;
+    }
+    if(p == end || !is_digit(*p))
+    {
+        return false;
+    }
+
+    // The magnitude of the minimum is one more than the maximum.
+    unsigned long long const limit =
+        (unsigned long long)(std::numeric_limits<T>::max()) + (negative?1:0);
+    unsigned long long magnitude = 0;
+    while(p != end && is_digit(*p))
+    {
+        magnitude = 10*magnitude + (*p-'0');
+        if(magnitude > limit)
+        {
+            return false;
+        }
+        ++p;
+    }
+
+    if(negative && magnitude != 0)
+    {
+        value = -T(magnitude-1)-1;
+    }
+    else
+    {
+        value = T(magnitude);
+    }
+    it = p;
+    return true;
+}
+
+/// @brief Result of the real parser.
+enum class RealStatus { NoMatch, Match, OutOfRange };
+
+/**
+ * @brief Parse a real number: it must contain a dot or an exponent, or be
+ * NaN or infinity.
+ *
+ * If the text is a real number which cannot be represented as a float, the
+ * iterator is not advanced and the number must not be parsed as an integer.
+ */
+RealStatus parse_real(Iterator & it, Iterator end, float & value)
+{
+    static double const powers_of_ten[] = {
+        1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11, 1e12,
+        1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22 };
+
+    Iterator p = it;
+    bool negative = false;
+    if(p != end && (*p == '+' || *p == '-'))
+    {
+        negative = (*p == '-');
+        ++p;
+    }
+
+    if(p != end && (*p == 'n' || *p == 'N' || *p == 'i' || *p == 'I'))
+    {
+        if(match_keyword(p, end, "nan"))
+        {
+            value = negative?-NAN:NAN;
+            it = p;
+            return RealStatus::Match;
+        }
+        else if(
+            match_keyword(p, end, "infinity") || match_keyword(p, end, "inf"))
+        {
+            value = negative?-INFINITY:INFINITY;
+            it = p;
+            return RealStatus::Match;
+        }
+        else
+        {
+            return RealStatus::NoMatch;
+        }
+    }
+
+    // Exact mantissa on up to 19 significant digits: enough for a float
+    uint64_t mantissa = 0;
+    int digits = 0;
+    int exponent = 0;
+    bool exact = true;
+
+    Iterator const mantissa_begin = p;
+    while(p != end && is_digit(*p))
+    {
+        if(mantissa < 1000000000000000000ULL)
+        {
+            mantissa = 10*mantissa + (*p-'0');
+        }
+        else
+        {
+            ++exponent;
+            exact = false;
+        }
+        ++digits;
+        ++p;
+    }
+    bool const has_dot = (p != end && *p == '.');
+    if(has_dot)
+    {
+        ++p;
+        while(p != end && is_digit(*p))
+        {
+            if(mantissa < 1000000000000000000ULL)
+            {
+                mantissa = 10*mantissa + (*p-'0');
+                --exponent;
+            }
+            else
+            {
+                exact = false;
+            }
+            ++digits;
+            ++p;
+        }
+    }
+    if(digits == 0)
+    {
+        return RealStatus::NoMatch;
+    }
+
+    bool has_exponent = false;
+    if(p != end && (*p == 'e' || *p == 'E'))
+    {
+        Iterator q = p+1;
+        bool const negative_exponent = (q != end && *q == '-');
+        if(q != end && (*q == '+' || *q == '-'))
+        {
+            ++q;
+        }
+        int explicit_exponent = 0;
+        while(q != end && is_digit(*q))
+        {
+            // Clamp the exponent, the C library will handle under- and
+            // overflows.
+            explicit_exponent = std::min(10*explicit_exponent + (*q-'0'), 9999);
+            has_exponent = true;
+            ++q;
+        }
+        if(has_exponent)
+        {
+            exponent += negative_exponent?-explicit_exponent:explicit_exponent;
+            p = q;
+        }
+    }
+
+    if(!has_dot && !has_exponent)
+    {
+        return RealStatus::NoMatch;
+    }
+
+    double result;
+    if(exact && mantissa < (1ULL << 53) && exponent >= -22 && exponent <= 22)
+    {
+        result = (exponent >= 0)?
+            (mantissa*powers_of_ten[exponent]):
+            (mantissa/powers_of_ten[-exponent]);
+    }
+    else
+    {
+        // Rare case: let the C library round correctly.
+        std::string const text(mantissa_begin, p);
+        result = std::strtod(text.c_str(), NULL);
+    }
+
+    if(result > FLT_MAX)
+    {
+        return RealStatus::OutOfRange;
+    }
+
+    value = negative?-float(result):float(result);
+    it = p;
+    return RealStatus::Match;
+}
+
+/// @brief Parse a real or an integer and append it to the value.
+bool parse_number(Iterator & it, Iterator end, Field::Value & value)
+{
+    float real;
+    auto const status = parse_real(it, end, real);
+    if(status == RealStatus::Match)
+    {
+        value.emplace_back(real);
+        return true;
+    }
+    else if(status == RealStatus::OutOfRange)
+    {
+        return false;
+    }
+
+    long integer;
+    if(parse_integer(it, end, integer))
+    {
+        value.emplace_back(integer);
+        return true;
+    }
+
+    return false;
+}
+
+bool parse_quoted_string(Iterator & it, Iterator end, std::string & value)
+{
+    if(it == end || *it != '<')
+    {
+        return false;
+    }
+
+    Iterator p = it+1;
+    std::string result;
+    while(p != end && *p != '>')
+    {
+        if(*p == '\\' && p+1 != end && (*(p+1) == '>' || *(p+1) == '\\'))
+        {
+            ++p;
+        }
+        result += *p;
+        ++p;
+    }
+    if(p == end)
+    {
+        return false;
+    }
+
+    value = std::move(result);
+    it = p+1;
+    return true;
+}
+
+/// @brief Parse a structure, i.e. a parenthesized list without inner spaces.
+bool parse_struct(Iterator & it, Iterator end, Field::Value & value)
+{
+    if(it == end || *it != '(')
+    {
+        return false;
+    }
+
+    Iterator p = it+1;
+    Field::Value result;
+    while(true)
+    {
+        std::string string;
+        Field::Value sub_struct;
+        if(parse_number(p, end, result))
+        {
+            // Nothing else to do.
+        }
+        else if(parse_quoted_string(p, end, string))
+        {
+            result.push_back(std::move(string));
+        }
+        else if(parse_struct(p, end, sub_struct))
+        {
+            // Like grammar, flatten the nested structures.
+            result.insert(
+                result.end(), std::make_move_iterator(sub_struct.begin()),
+                std::make_move_iterator(sub_struct.end()));
+        }
+        else
+        {
+            return false;
+        }
+
+        if(p != end && *p == ',')
+        {
+            ++p;
+            skip_spaces(p, end);
+        }
+        else
+        {
+            break;
+        }
+    }
+
+    if(p == end || *p != ')')
+    {
+        return false;
+    }
+
+    value = std::move(result);
+    it = p+1;
+    return true;
+}
+
+/// @brief Parse a list of items; the separator is mandatory when required.
+template<typename TParser>
+bool parse_list(
+    Iterator & it, Iterator end, bool separator_required,
+    Field::Value & value, TParser parser)
+{
+    Iterator p = it;
+    if(!parser(p, end, value))
+    {
+        return false;
+    }
+    while(true)
+    {
+        Iterator q = p;
+        bool const has_separator = skip_spaces(q, end);
+        if((separator_required && !has_separator) || !parser(q, end, value))
+        {
+            break;
+        }
+        p = q;
+    }
+
+    it = p;
+    return true;
+}
+
+bool parse_numbers(Iterator & it, Iterator end, Field::Value & value)
+{
+    return parse_list(it, end, true, value, parse_number);
+}
+
+bool parse_quoted_strings(Iterator & it, Iterator end, Field::Value & value)
+{
+    return parse_list(
+        it, end, false, value,
+        [](Iterator & it, Iterator end, Field::Value & value) {
+            std::string item;
+            if(!parse_quoted_string(it, end, item))
+            {
+                return false;
+            }
+            value.push_back(std::move(item));
+            return true;
+        });
+}
+
+bool parse_atoms(Iterator & it, Iterator end, Field::Value & value)
+{
+    return parse_list(
+        it, end, true, value,
+        [](Iterator & it, Iterator end, Field::Value & value) {
+            Iterator p = it;
+            while(p != end && is_atom_char(*p))
+            {
+                ++p;
+            }
+            if(p == it)
+            {
+                return false;
+            }
+            value.push_back(std::string(it, p));
+            it = p;
+            return true;
+        });
+}
+
+bool parse_structs(Iterator & it, Iterator end, Field::Value & value)
+{
+    return parse_list(
+        it, end, false, value,
+        [](Iterator & it, Iterator end, Field::Value & value) {
+            Field::Value item;
+            if(!parse_struct(it, end, item))
+            {
+                return false;
+            }
+            value.push_back(std::move(item));
+            return true;
+        });
+}
+
+/**
+ * @brief Parse a shape, i.e. a parenthesized list of integers with spaces
+ * after the opening parenthesis and before the closing parenthesis.
+ */
+bool parse_shape(Iterator & it, Iterator end, Field::Shape & shape)
+{
+    if(it == end || *it != '(')
+    {
+        return false;
+    }
+    Iterator p = it+1;
+    if(!skip_spaces(p, end))
+    {
+        return false;
+    }
+
+    Field::Shape result;
+    while(true)
+    {
+        int dimension;
+        if(!parse_integer(p, end, dimension))
+        {
+            return false;
+        }
+        result.push_back(dimension);
+        if(p != end && *p == ',')
+        {
+            ++p;
+            skip_spaces(p, end);
+        }
+        else
+        {
+            break;
+        }
+    }
+
+    if(!skip_spaces(p, end) || p == end || *p != ')')
+    {
+        return false;
+    }
+
+    shape = std::move(result);
+    it = p+1;
+    return true;
+}
+
+bool parse_value(Iterator & it, Iterator end, Field::Value & value)
+{
+    Iterator p = it;
+    if(
+        parse_numbers(p, end, value) || parse_quoted_strings(p, end, value) ||
+        parse_atoms(p, end, value) || parse_structs(p, end, value))
+    {
+        while(p != end && *p == ' ')
+        {
+            ++p;
+        }
+        it = p;
+        return true;
+    }
+    else
+    {
+        return false;
+    }
+}
+
+/// @brief Parse a joined record starting with "##".
+Field parse_field(std::string const & record)
+{
+    Iterator const begin = record.data();
+    Iterator const end = begin+record.size();
+
+    Iterator it = begin+2;
+    while(it != end && *it != '=')
+    {
+        ++it;
+    }
+    if(it == begin+2 || it == end)
+    {
+        throw dicomifier::DicomifierException(
+            "Could not parse record: "+record.substr(0, 80));
+    }
+
+    Field field;
+    field.name.assign(begin+2, it);
+    ++it;
+
+    // The alternatives are ordered: the first matching one is used, and the
+    // shape is kept even if it is not followed by a value.
+    Iterator const value_begin = it;
+    Iterator p = value_begin;
+    bool parsed = false;
+    if(parse_shape(p, end, field.shape))
+    {
+        std::size_t size = 1;
+        for(auto const & dimension: field.shape)
+        {
+            size *= std::max(dimension, 0);
+        }
+        field.value.reserve(size);
+
+        skip_spaces(p, end);
+        parsed = parse_value(p, end, field.value);
+    }
+    if(!parsed)
+    {
+        p = value_begin;
+        std::string string;
+        if(parse_structs(p, end, field.value))
+        {
+            // Nothing else to do.
+        }
+        else if(parse_quoted_string(p, end, string))
+        {
+            field.value.push_back(std::move(string));
+        }
+        else
+        {
+            field.value.push_back(std::string(value_begin, end));
+            p = end;
+        }
+    }
+
+    if(p != end)
+    {
+        throw dicomifier::DicomifierException(
+            "Could not parse field: "+field.name);
+    }
+
+    return field;
+}
+
+void parse_record(std::string const & record, std::vector<Field> & fields)
+{
+    // Comments are skipped
+    if(record[0] == '#')
+    {
+        fields.push_back(parse_field(record));
+    }
+}
+
+}
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+std::vector<Field> parse(std::istream & stream)
+{
+    std::vector<Field> fields;
+
+    std::string line;
+    std::string record;
+    bool has_record = false;
+    bool has_line_break = false;
+    while(std::getline(stream, line))
+    {
+        has_line_break = !stream.eof();
+        if(!line.empty() && line[line.size()-1] == '\r')
+        {
+            line.resize(line.size()-1);
+        }
+
+        if(
+            line.size() >= 2 &&
+            ((line[0] == '#' && line[1] == '#') ||
+                (line[0] == '$' && line[1] == '$')))
+        {
+            if(has_record)
+            {
+                parse_record(record, fields);
+            }
+            record.assign(line);
+            has_record = true;
+        }
+        else if(has_record)
+        {
+            // Continuation line: drop the line-continuation backslash.
+            if(!record.empty() && record[record.size()-1] == '\\')
+            {
+                record.resize(record.size()-1);
+            }
+            record.append(line);
+        }
+        else if(!line.empty())
+        {
+            throw DicomifierException("Could not parse file");
+        }
+    }
+    if(stream.bad())
+    {
+        throw DicomifierException("Could not read file");
+    }
+
+    if(!has_record)
+    {
+        throw DicomifierException("Could not parse file");
+    }
+    if(has_line_break && record[record.size()-1] == '\\')
+    {
+        record.resize(record.size()-1);
+    }
+    parse_record(record, fields);
+
+    return fields;
+}
+
+std::vector<Field> parse(std::string const & data)
+{
+    std::istringstream stream(data);
+    return parse(stream);
+}
+
+} // namespace bruker
+
+} // namespace dicomifier
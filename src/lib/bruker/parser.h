@@ -0,0 +1,44 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#ifndef _3c1d6a0e_8b0f_4f62_a0a4_5e0c3f3b7d19
+#define _3c1d6a0e_8b0f_4f62_a0a4_5e0c3f3b7d19
+
+#include <istream>
+#include <string>
+#include <vector>
+
+#include "Field.h"
+
+namespace dicomifier
+{
+
+namespace bruker
+{
+
+/**
+ * @brief Parse a Bruker data file (JCAMP-DX) in a single pass.
+ *
+ * The stream is read line by line: continuation lines are joined to their
+ * record as they are read, and each record is parsed as soon as it is
+ * complete. The accepted syntax is the same as the one of grammar. Comments
+ * are skipped, field names are returned as found in the file (i.e. with the
+ * leading "$" of parameter names).
+ *
+ * Throw an exception if the stream cannot be parsed.
+ */
+std::vector<Field> parse(std::istream & stream);
+
+/// @brief Parse a Bruker data file stored in a string.
+std::vector<Field> parse(std::string const & data);
+
+} // namespace bruker
+
+} // namespace dicomifier
+
+#endif // _3c1d6a0e_8b0f_4f62_a0a4_5e0c3f3b7d19
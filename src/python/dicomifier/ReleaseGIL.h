@@ -0,0 +1,42 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#ifndef _2f9a7c4e_6d1b_4e83_b5a0_c8e1d3f72b96
+#define _2f9a7c4e_6d1b_4e83_b5a0_c8e1d3f72b96
+
+#include <boost/python.hpp>
+
+/**
+ * @brief Release the GIL during the lifetime of the object.
+ *
+ * No Python object may be accessed while the GIL is released. The GIL is 
+ * re-acquired on destruction, including during stack unwinding, so that
+ * C++ exceptions are translated as usual.
+ */
+class ReleaseGIL
+{
+public:
+    ReleaseGIL()
+    : _state(PyEval_SaveThread())
+    {
+        // Nothing else.
+    }
+
+    ~ReleaseGIL()
+    {
+        PyEval_RestoreThread(this->_state);
+    }
+
+    ReleaseGIL(ReleaseGIL const &) = delete;
+    ReleaseGIL & operator=(ReleaseGIL const &) = delete;
+
+private:
+    PyThreadState * _state;
+};
+
+#endif // _2f9a7c4e_6d1b_4e83_b5a0_c8e1d3f72b96
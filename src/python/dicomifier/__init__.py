@@ -10,6 +10,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from _dicomifier import *
+import profiler
 import bruker
 from meta_data import MetaData
 import nifti
@@ -10,17 +10,57 @@
 #include <boost/python/suite/indexing/vector_indexing_suite.hpp>
 
 #include "bruker/Dataset.h"
+#include "bruker/HeaderCache.h"
+#include "../ReleaseGIL.h"
+
+namespace
+{
+
+boost::python::object
+get_field_names(dicomifier::bruker::Dataset const & data_set)
+{
+    boost::python::list result;
+    for(auto const & it: data_set)
+    {
+        result.append(it.first);
+    }
+    return result;
+}
+
+void
+load(dicomifier::bruker::Dataset & data_set, std::string const & path)
+{
+    ReleaseGIL const release;
+    data_set.load(path);
+}
+
+void
+load_cache(
+    dicomifier::bruker::Dataset & data_set, std::string const & path, 
+    dicomifier::bruker::HeaderCache & cache)
+{
+    ReleaseGIL const release;
+    data_set.load(path, cache);
+}
+
+}
 
 void wrap_Dataset()
 {
     using namespace boost::python;
     using namespace dicomifier::bruker;
     
-    class_<Dataset>("Dataset", init<>())
-        .def("load", &Dataset::load)
+    class_<Dataset>(
+            "Dataset", 
+            "Bruker data set. A Dataset may be read from several threads, "
+            "but must not be modified concurrently.",
+            init<>())
+        .def("load", load)
+        .def("load", load_cache)
         .def("has_field", &Dataset::has_field)
         .def(
             "get_field", &Dataset::get_field,
             return_value_policy<copy_const_reference>())
+        .def("get_field_names", &get_field_names)
     ;
 }
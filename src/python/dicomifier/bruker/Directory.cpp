@@ -10,6 +10,8 @@
 #include <boost/python/suite/indexing/vector_indexing_suite.hpp>
 
 #include "bruker/Directory.h"
+#include "bruker/DirectoryIndex.h"
+#include "../ReleaseGIL.h"
 
 namespace 
 {
@@ -45,6 +47,35 @@ list_sujects(std::string const & path)
     return result_python;
 }
 
+void
+load_path(
+    dicomifier::bruker::Directory & directory, std::string const & path, 
+    bool lazy)
+{
+    ReleaseGIL const release;
+    directory.load(path, lazy);
+}
+
+void
+load_index(
+    dicomifier::bruker::Directory & directory, 
+    dicomifier::bruker::DirectoryIndex const & index, 
+    std::string const & path, bool lazy)
+{
+    ReleaseGIL const release;
+    directory.load(index, path, lazy);
+}
+
+dicomifier::bruker::Dataset const &
+get_dataset(
+    dicomifier::bruker::Directory const & directory, 
+    std::string const & reconstruction)
+{
+    // The dataset is parsed on first access in lazy mode.
+    ReleaseGIL const release;
+    return directory.get_dataset(reconstruction);
+}
+
 }
 
 void wrap_Directory()
@@ -52,11 +83,32 @@ void wrap_Directory()
     using namespace boost::python;
     using namespace dicomifier::bruker;
     
-    scope directory_scope = class_<Directory>("Directory", init<>())
-        .def("load", &Directory::load)
+    scope directory_scope = class_<Directory, boost::noncopyable>(
+            "Directory", 
+            "Bruker reconstructions of a directory. Once loaded, a Directory "
+            "may be read from several threads, but must not be loaded "
+            "concurrently.",
+            init<>())
+        .def(
+            "load", load_path, (arg("path"), arg("lazy")=false),
+            "Load the reconstructions found under path. If lazy is True, "
+            "the data set of a reconstruction is loaded on its first access.")
+        .def(
+            "load", load_index, 
+            (arg("index"), arg("path"), arg("lazy")=false),
+            "Load the reconstructions of a DirectoryIndex found under path.")
+        .def(
+            "set_header_cache", &Directory::set_header_cache, 
+            with_custodian_and_ward<1, 2>(),
+            "Parse files through a persistent cache, or directly if None.")
+        .def(
+            "set_workers", &Directory::set_workers, 
+            "Set the number of threads used to parse the files in a non-lazy "
+            "load, 0 means one thread per core.")
+        .def("get_workers", &Directory::get_workers)
         .def("has_dataset", &Directory::has_dataset)
         .def(
-            "get_dataset", &Directory::get_dataset,
+            "get_dataset", &get_dataset,
             return_value_policy<copy_const_reference>())
         .def("get_used_files", &Directory::get_used_files,
             return_value_policy<copy_const_reference>())
@@ -0,0 +1,77 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include <boost/python.hpp>
+
+#include "bruker/DirectoryIndex.h"
+
+namespace 
+{
+
+std::string
+get_root(dicomifier::bruker::DirectoryIndex const & index)
+{
+    return index.get_root().string();
+}
+
+boost::python::object
+get_subjects(dicomifier::bruker::DirectoryIndex const & index)
+{
+    boost::python::list result_python;
+    for(auto const & subject: index.get_subjects())
+    {
+        result_python.append(subject.string());
+    }
+    return result_python;
+}
+
+boost::python::object
+get_series_and_reco(
+    dicomifier::bruker::DirectoryIndex const & index, std::string const & path)
+{
+    boost::python::dict result_python;
+    for(auto const & entry: index.get_series_and_reco(path))
+    {
+        boost::python::list value;
+        for(auto const & item: entry.second)
+        {
+            value.append(item);
+        }
+        result_python[entry.first] = value;
+    }
+    
+    return result_python;
+}
+
+boost::python::object
+get_files(
+    dicomifier::bruker::DirectoryIndex const & index, std::string const & path)
+{
+    boost::python::dict result_python;
+    for(auto const & entry: index.get_files(path))
+    {
+        result_python[entry.first] = entry.second.string();
+    }
+    
+    return result_python;
+}
+
+}
+
+void wrap_DirectoryIndex()
+{
+    using namespace boost::python;
+    using namespace dicomifier::bruker;
+    
+    class_<DirectoryIndex>("DirectoryIndex", init<std::string>())
+        .def("get_root", &get_root)
+        .def("get_subjects", &get_subjects)
+        .def("get_series_and_reco", &get_series_and_reco)
+        .def("get_files", &get_files)
+    ;
+}
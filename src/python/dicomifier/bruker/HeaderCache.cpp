@@ -0,0 +1,33 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include <boost/python.hpp>
+
+#include "bruker/HeaderCache.h"
+
+void wrap_HeaderCache()
+{
+    using namespace boost::python;
+    using namespace dicomifier::bruker;
+    
+    void (HeaderCache::*save)() const = &HeaderCache::save;
+    void (HeaderCache::*save_path)(std::string const &) const = 
+        &HeaderCache::save;
+
+    class_<HeaderCache, boost::noncopyable>(
+            "HeaderCache", 
+            "Persistent cache of parsed Bruker files, keyed by path, size "
+            "and modification time.",
+            init<>())
+        .def(init<std::string>())
+        .def("get_hits", &HeaderCache::get_hits)
+        .def("get_misses", &HeaderCache::get_misses)
+        .def("save", save)
+        .def("save", save_path)
+    ;
+}
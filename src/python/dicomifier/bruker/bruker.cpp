@@ -10,13 +10,19 @@
 
 void wrap_Dataset();
 void wrap_Directory();
+void wrap_DirectoryIndex();
 void wrap_Field();
+void wrap_HeaderCache();
 void wrap_json_converter();
+void wrap_python_converter();
 
 BOOST_PYTHON_MODULE(bruker)
 {
     wrap_Dataset();
     wrap_Directory();
+    wrap_DirectoryIndex();
     wrap_Field();
+    wrap_HeaderCache();
     wrap_json_converter();
+    wrap_python_converter();
 }
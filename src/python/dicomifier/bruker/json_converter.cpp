@@ -7,6 +7,8 @@
  ************************************************************************/
 
 #include <clocale>
+#include <mutex>
+#include <string>
 
 #include <boost/python.hpp>
 
@@ -14,12 +16,15 @@
 
 #include "bruker/Dataset.h"
 #include "bruker/json_converter.h"
+#include "../ReleaseGIL.h"
 
 namespace
 {
 
 std::string as_json(dicomifier::bruker::Dataset const & data_set, bool pretty_print)
 {
+    ReleaseGIL const release;
+
     auto const json = dicomifier::bruker::as_json(data_set);
 
     Json::Writer * writer = NULL;
@@ -32,9 +37,15 @@ std::string as_json(dicomifier::bruker::Dataset const & data_set, bool pretty_pr
         writer = new Json::FastWriter();
     }
 
-    auto const old_locale = std::setlocale(LC_ALL, "C");
+    // The locale is global: serialize the conversions which modify it.
+    static std::mutex mutex;
+    std::lock_guard<std::mutex> const lock(mutex);
+
+    std::string const old_locale = std::setlocale(LC_ALL, NULL);
+    std::setlocale(LC_ALL, "C");
     auto const string = writer->write(json);
-    std::setlocale(LC_ALL, old_locale);
+    std::setlocale(LC_ALL, old_locale.c_str());
+    delete writer;
     return string;
 }
 
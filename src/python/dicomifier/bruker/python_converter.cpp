@@ -0,0 +1,173 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include <string>
+#include <vector>
+
+#include <boost/python.hpp>
+#include <numpy/arrayobject.h>
+
+#include "bruker/Dataset.h"
+#include "bruker/Field.h"
+#include "core/DicomifierException.h"
+
+namespace
+{
+
+using dicomifier::bruker::Dataset;
+using dicomifier::bruker::Field;
+
+/// @brief Convert a field item to a Python int, float, str or list.
+boost::python::object as_python_item(Field::Item const & item)
+{
+    using namespace boost::python;
+
+    if(item.type() == typeid(long))
+    {
+        return object(boost::get<long>(item));
+    }
+    else if(item.type() == typeid(float))
+    {
+        return object(boost::get<float>(item));
+    }
+    else if(item.type() == typeid(std::string))
+    {
+        return object(boost::get<std::string>(item));
+    }
+    else if(item.type() == typeid(Field::Value))
+    {
+        list result;
+        for(auto const & sub_item: boost::get<Field::Value>(item))
+        {
+            result.append(as_python_item(sub_item));
+        }
+        return result;
+    }
+    else
+    {
+        throw dicomifier::DicomifierException("Unknown type");
+    }
+}
+
+/**
+ * @brief Convert a numeric field to a NumPy array shaped by the field shape,
+ * return None if the field is not numeric.
+ */
+boost::python::object as_array(Field const & field)
+{
+    using namespace boost::python;
+
+    bool is_float = false;
+    for(auto const & item: field.value)
+    {
+        if(item.type() == typeid(float))
+        {
+            is_float = true;
+        }
+        else if(item.type() != typeid(long))
+        {
+            return object();
+        }
+    }
+
+    // Use the field shape only if it matches the number of items, e.g. not
+    // for string fields where the shape is the maximum length.
+    std::vector<npy_intp> shape;
+    npy_intp size = 1;
+    for(auto const & dimension: field.shape)
+    {
+        shape.push_back(dimension);
+        size *= dimension;
+    }
+    if(shape.empty() || size != npy_intp(field.value.size()))
+    {
+        shape = { npy_intp(field.value.size()) };
+    }
+
+    PyObject * array = PyArray_SimpleNew(
+        shape.size(), &shape[0], is_float?NPY_DOUBLE:NPY_LONG);
+    if(array == NULL)
+    {
+        throw_error_already_set();
+    }
+    object result{handle<>(array)};
+
+    if(is_float)
+    {
+        auto data = reinterpret_cast<double*>(
+            PyArray_DATA(reinterpret_cast<PyArrayObject*>(array)));
+        for(std::size_t i=0; i<field.value.size(); ++i)
+        {
+            data[i] = field.get_float(i);
+        }
+    }
+    else
+    {
+        auto data = reinterpret_cast<long*>(
+            PyArray_DATA(reinterpret_cast<PyArrayObject*>(array)));
+        for(std::size_t i=0; i<field.value.size(); ++i)
+        {
+            data[i] = boost::get<long>(field.value[i]);
+        }
+    }
+
+    return result;
+}
+
+boost::python::object as_python(Field const & field, bool use_numpy)
+{
+    using namespace boost::python;
+
+    if(use_numpy && !field.value.empty())
+    {
+        auto const array = as_array(field);
+        if(!array.is_none())
+        {
+            return array;
+        }
+    }
+
+    list result;
+    for(auto const & item: field.value)
+    {
+        result.append(as_python_item(item));
+    }
+    return result;
+}
+
+boost::python::dict as_dict(Dataset const & data_set, bool use_numpy)
+{
+    boost::python::dict result;
+    for(auto const & it: data_set)
+    {
+        result[it.first] = as_python(it.second, use_numpy);
+    }
+    return result;
+}
+
+}
+
+void wrap_python_converter()
+{
+    using namespace boost::python;
+
+    if(_import_array() < 0)
+    {
+        throw_error_already_set();
+    }
+
+    def(
+        "as_python", &as_python, (arg("field"), arg("use_numpy")=false),
+        "Convert a Bruker field to a list of Python values, or to a NumPy "
+        "array shaped as the field if use_numpy is True and the field is "
+        "numeric.");
+    def(
+        "as_dict", &as_dict, (arg("data_set"), arg("use_numpy")=false),
+        "Convert a Bruker data set to a dictionary of fields, with the same "
+        "layout as the JSON representation.");
+}
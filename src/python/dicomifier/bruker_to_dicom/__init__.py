@@ -7,8 +7,12 @@
 #########################################################################
 
 from frame_index_generator import FrameIndexGenerator
+from lazy_data_set import LazyDataSet
 import patient, study, frame_of_reference, equipment, series, image
 import frame_groups
+import encoding
 from convert import convert_reconstruction
+from writer import Writer
 from mr_image_storage import mr_image_storage
 from enhanced_mr_image_storage import enhanced_mr_image_storage
+from raw_data_storage import raw_data_storage, read_file
@@ -6,15 +6,20 @@
 # for details.
 #########################################################################
 
-import json
+import dis
+import itertools
 import math
 import re
 import os
 
 import dateutil
+import numpy
 import odil
 
-from .. import bruker, logger
+from .. import logger, profiler
+from frame_index_generator import AllFramesGetter
+from lazy_data_set import LazyDataSet
+from writer import Writer
 
 #explicit conversions
 def _convert_date_time(value, format_):
@@ -35,52 +40,71 @@ vr_converters = {
 def convert_reconstruction(
         bruker_directory, series, reconstruction,
         iod_converter, transfer_syntax,
-        destination, iso_9660):
+        destination, iso_9660, writers=1, archive_converter=None,
+        file_cache=None):
     """ Convert and save a single reconstruction.
 
         :param bruker_directory: Bruker directory object
         :param series: series number in the Bruker directory
         :param reconstruction: reconstruction number in the series
-        :param iod_converter: conversion function
+        :param iod_converter: conversion function, returning or generating
+            the DICOM data sets
         :param transfer_syntax: target transfer syntax
         :param destination: destination directory
         :param iso_9660: whether to use ISO-9660 compatible file names
+        :param writers: number of threads writing the files, 0 to write
+            them in the calling thread
+        :param archive_converter: if not None, conversion function storing
+            the Bruker parameter files in a separate instance of the series,
+            referenced by the images
+        :param file_cache: if not None, dictionary of the content of the 
+            Bruker parameter files, shared by the reconstructions of a 
+            conversion run so that each file is read only once. Otherwise, 
+            the files are only cached for this reconstruction. The cache is
+            not shared between processes: it must be filled before forking.
     """
     
     logger.info("Converting {}:{}".format(series, reconstruction))
     
     bruker_binary = bruker_directory.get_dataset(
         "{}{:04d}".format(series, int(reconstruction)))
-    bruker_json = json.loads(bruker.as_json(bruker_binary))
+    bruker_data_set = LazyDataSet(bruker_binary)
     logger.info("Found {}:{} - {} ({})".format(
         series, reconstruction, 
-        bruker_json.get("VisuAcquisitionProtocol", ["(none)"])[0],
-        bruker_json.get("RECO_mode", ["none"])[0]
+        bruker_data_set.get("VisuAcquisitionProtocol", ["(none)"])[0],
+        bruker_data_set.get("RECO_mode", ["none"])[0]
     ))
-    bruker_json["reco_files"] = list(bruker_directory.get_used_files(
+    bruker_data_set["reco_files"] = list(bruker_directory.get_used_files(
         "{}{:04d}".format(series, int(reconstruction))))
 
-    dicom_binaries = iod_converter(bruker_json, transfer_syntax)
+    bruker_data_set["FILE_CACHE"] = (
+        file_cache if file_cache is not None else {})
+
+    if archive_converter is not None:
+        bruker_data_set["PARAMETER_ARCHIVE"] = [odil.generate_uid()]
+
+    # Each data set is written as soon as it is generated, and is not kept
+    # in memory afterwards.
+    dicom_binaries = iod_converter(bruker_data_set, transfer_syntax)
+    if archive_converter is not None:
+        dicom_binaries = itertools.chain(
+            dicom_binaries, archive_converter(bruker_data_set, transfer_syntax))
     
-    files = []
-    for index, dicom_binary in enumerate(dicom_binaries):
-        
-        if iso_9660:
-            filename = "IM{:06d}".format(1+index)
-        else:
-            filename = dicom_binary.as_string("SOPInstanceUID")[0]
-        
-        destination_file = os.path.join(
-            destination, get_series_directory(dicom_binary, iso_9660),
-            reconstruction, filename)
+    with Writer(transfer_syntax, writers) as writer:
+        for index, dicom_binary in enumerate(dicom_binaries):
+            
+            if iso_9660:
+                filename = "IM{:06d}".format(1+index)
+            else:
+                filename = dicom_binary.as_string("SOPInstanceUID")[0]
+            
+            destination_file = os.path.join(
+                destination, get_series_directory(dicom_binary, iso_9660),
+                reconstruction, filename)
+            
+            writer.write(dicom_binary, destination_file)
         
-        if not os.path.isdir(os.path.dirname(destination_file)):
-            os.makedirs(os.path.dirname(destination_file))
-
-        odil.write(
-            dicom_binary, destination_file, 
-            transfer_syntax=transfer_syntax)
-        files.append(destination_file)
+        files = writer.close()
     
     return files
 
@@ -107,46 +131,248 @@ def convert_element(
         :param vr_finder: function to find the VR knowing only the dicom_name
     """
     
-    value = None
-    index = -1
-    if getter is not None:
-        value = getter(bruker_data_set, generator, frame_index)
-    else:
-        value = bruker_data_set.get(bruker_name)
-
-    if bruker_name in generator.dependent_fields:
-    # index of the first FG containing the bruker_name element
-        group_index = [
-            index for index, x in enumerate(generator.frame_groups) 
-            if bruker_name in x[2]][0]
-        value = [ value[frame_index[group_index]] ]
-
-    tag = str(getattr(odil.registry, dicom_name))
-    vr = str(vr_finder(dicom_name))
-
-    if value is None:
-        if type_ == 1:
-            raise Exception("{} must be present".format(dicom_name))
-        elif type_ == 2:
-            dicom_data_set.add(tag)
-    elif vr == "SQ" and not value:
-        # Type of empty value must be explicit
-        dicom_data_set.add(tag, odil.Value.DataSets(), getattr(odil.VR, vr))
-    else:
-        if isinstance(setter, dict):
-            value = [setter[x] for x in value]
-        elif setter is not None:
-            value = setter(value)
-        if value and isinstance(value[0], unicode):
-            value = [x.encode("utf-8") for x in value]
+    plan = ConversionPlan(
+        [(bruker_name, dicom_name, type_, getter, setter)], 
+        generator, vr_finder)
+    return plan.convert_element(
+        plan.elements[0], bruker_data_set, dicom_data_set, frame_index)
+
+class ConversionPlan(object):
+    """ Conversion of a list of elements, compiled once per reconstruction:
+        the tag, VR, VR converter and frame group of each element are 
+        resolved when the plan is created, and not for each frame.
+        
+        The values of AllFramesGetter getters, and the values of 
+        frame-invariant getters of fields in frame groups, are computed once
+        for all frames.
+    """
 
-        vr_converter = vr_converters.get(vr)
-        if vr_converter is not None :
-            value = [vr_converter(x) for x in value]
+    class Element(object):
+        """ Compiled conversion of a single element.
+        """
 
-        dicom_data_set.add(tag, value, getattr(odil.VR, vr))
+        __slots__ = [
+            "bruker_name", "dicom_name", "type_", "getter", "setter",
+            "tag", "group_index", "vr", "odil_vr", "vr_converter",
+            "all_frames", "uses_frame_index"]
 
-    return value
+    # Elements used by the VR finder to resolve ambiguous VRs
+    helper_elements = ["BitsAllocated", "PixelRepresentation"]
+
+    def __init__(self, conversions, generator, vr_finder, helper=None):
+        """ Constructor.
+
+            :param conversions: elements to convert, as tuples of 
+                (bruker_name, dicom_name, type_, getter, setter)
+            :param generator: object that will manage the frame_index
+            :param vr_finder: function to find the VR knowing only the dicom_name
+            :param helper: if not None, data set receiving the converted
+                values of helper_elements, as used by vr_finder
+        """
+
+        self.generator = generator
+        self.helper = helper
+        self._vr_finder = vr_finder
+        # Values computed once for all frames, by element
+        self._values = {}
+
+        # Index of the first frame group containing each dependent field
+        group_indices = {}
+        for index, frame_group in enumerate(generator.frame_groups):
+            for name in frame_group[2]:
+                group_indices.setdefault(name, index)
+
+        self.elements = []
+        for bruker_name, dicom_name, type_, getter, setter in conversions:
+            element = ConversionPlan.Element()
+            element.bruker_name = bruker_name
+            element.dicom_name = dicom_name
+            element.type_ = type_
+            element.getter = getter
+            element.setter = setter
+            element.tag = getattr(odil.registry, dicom_name)
+            element.group_index = group_indices.get(bruker_name)
+            element.all_frames = isinstance(getter, AllFramesGetter)
+            element.uses_frame_index = (
+                getter is not None and _uses_argument(getter, 2))
+            # The VR may depend on the helper elements: it is resolved on
+            # first use.
+            element.vr = None
+            element.odil_vr = None
+            element.vr_converter = None
+            self.elements.append(element)
+
+    def split(self, per_frame_elements=()):
+        """ Split the plan in a frame-invariant plan and a per-frame plan,
+            sharing the generator, the VR finder and the helper. An element
+            is frame-invariant if its Bruker field does not depend on a 
+            frame group and if its getter does not use the frame index.
+
+            :param per_frame_elements: DICOM names of elements which must be
+                converted for each frame even if they are frame-invariant
+                (e.g. SOPInstanceUID)
+        """
+
+        invariant = self._copy()
+        per_frame = self._copy()
+        for element in self.elements:
+            if (element.group_index is not None
+                    or element.dicom_name in per_frame_elements
+                    or element.uses_frame_index):
+                per_frame.elements.append(element)
+            else:
+                invariant.elements.append(element)
+        return invariant, per_frame
+
+    def template(self, bruker_data_set, frame_index):
+        """ Convert all elements once, and return the arguments of
+            odil.DataSet.add for each converted element, so that the 
+            conversion can be replayed in any data set. This is only valid
+            for frame-invariant plans.
+
+            :param bruker_data_set: Bruker data set to convert
+            :param frame_index: index in frame group
+        """
+
+        template = []
+        for element in self.elements:
+            _, arguments = self._convert(element, bruker_data_set, frame_index)
+            if arguments is not None:
+                template.append(arguments)
+        return template
+
+    def __call__(self, bruker_data_set, dicom_data_set, frame_index):
+        """ Convert all elements of a frame, return dicom_data_set.
+
+            :param bruker_data_set: Bruker data set to convert
+            :param dicom_data_set: Dicom data set destination
+            :param frame_index: index in frame group
+        """
+
+        for element in self.elements:
+            self.convert_element(
+                element, bruker_data_set, dicom_data_set, frame_index)
+        return dicom_data_set
+
+    @profiler.timed("convert_element")
+    def convert_element(
+            self, element, bruker_data_set, dicom_data_set, frame_index):
+        """ Convert a single element of a frame, return the converted value.
+        """
+
+        value, arguments = self._convert(
+            element, bruker_data_set, frame_index)
+        if arguments is not None:
+            dicom_data_set.add(*arguments)
+        return value
+
+    def _copy(self):
+        """ Return an empty plan sharing the generator, the VR finder and the
+            helper of this plan.
+        """
+
+        return ConversionPlan([], self.generator, self._vr_finder, self.helper)
+
+    def _convert(self, element, bruker_data_set, frame_index):
+        """ Convert a single element of a frame, return the converted value
+            and the arguments of odil.DataSet.add (None if the element must
+            not be added).
+        """
+
+        value = None
+        if element.all_frames:
+            values = self._values.get(element)
+            if values is None:
+                values = element.getter.function(
+                    bruker_data_set, self.generator)
+                self._values[element] = values
+            value = values[self.generator.get_linear_index(frame_index)]
+            if isinstance(value, numpy.ndarray):
+                value = value.tolist()
+        elif element.getter is None:
+            value = bruker_data_set.get(element.bruker_name)
+        elif element.group_index is not None and not element.uses_frame_index:
+            # Whole field, indexed below by the frame group
+            if element not in self._values:
+                self._values[element] = element.getter(
+                    bruker_data_set, self.generator, frame_index)
+            value = self._values[element]
+        else:
+            value = element.getter(bruker_data_set, self.generator, frame_index)
+
+        if element.group_index is not None and not element.all_frames:
+            value = [ value[frame_index[element.group_index]] ]
+
+        if element.vr is None:
+            element.vr = str(self._vr_finder(element.dicom_name))
+            element.odil_vr = getattr(odil.VR, element.vr)
+            element.vr_converter = vr_converters.get(element.vr)
+
+        arguments = None
+        if value is None:
+            if element.type_ == 1:
+                raise Exception("{} must be present".format(element.dicom_name))
+            elif element.type_ == 2:
+                arguments = (element.tag,)
+        elif element.vr == "SQ" and not value:
+            # Type of empty value must be explicit
+            arguments = (element.tag, odil.Value.DataSets(), element.odil_vr)
+        else:
+            setter = element.setter
+            if isinstance(setter, dict):
+                value = [setter[x] for x in value]
+            elif setter is not None:
+                value = setter(value)
+            if value and isinstance(value[0], unicode):
+                value = [x.encode("utf-8") for x in value]
+
+            if element.vr_converter is not None :
+                value = [element.vr_converter(x) for x in value]
+
+            arguments = (element.tag, value, element.odil_vr)
+
+        if (self.helper is not None 
+                and element.dicom_name in ConversionPlan.helper_elements):
+            self.helper.add(element.tag, value)
+
+        return value, arguments
+
+def _uses_argument(function, index):
+    """ Test whether a function may use its positional argument at given
+        index. Functions which cannot be inspected are assumed to use it.
+    """
+
+    code = getattr(function, "__code__", None)
+    if code is None or index >= code.co_argcount:
+        return True
+
+    name = code.co_varnames[index]
+    if name in code.co_cellvars:
+        # Argument used by a nested function
+        return True
+
+    if hasattr(dis, "get_instructions"):
+        for instruction in dis.get_instructions(code):
+            if instruction.opname.startswith("LOAD_FAST"):
+                argument = instruction.argval
+                if argument == name or (
+                        isinstance(argument, tuple) and name in argument):
+                    return True
+        return False
+    else:
+        load_fast = dis.opmap["LOAD_FAST"]
+        bytecode = bytearray(code.co_code)
+        offset = 0
+        while offset < len(bytecode):
+            opcode = bytecode[offset]
+            if opcode >= dis.HAVE_ARGUMENT:
+                argument = bytecode[offset+1]+256*bytecode[offset+2]
+                if opcode == load_fast and argument == index:
+                    return True
+                offset += 3
+            else:
+                offset += 1
+        return False
 
 def get_series_directory(data_set, iso_9660):
     """ Return the directory associated with the patient, study and series of
@@ -0,0 +1,202 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+import os
+import struct
+import zlib
+
+import numpy
+import odil
+
+from .. import profiler
+
+# VRs with a 4-bytes length in Explicit VR
+_long_length_vrs = [
+    b"OB", b"OD", b"OF", b"OL", b"OW", b"SQ", b"UC", b"UN", b"UR", b"UT"]
+
+def encode_rle_pixel_data(data_set, map_=map):
+    """ Replace the native pixel data of a data set by its RLE Lossless
+        encapsulated version, with one fragment per frame.
+
+        :param data_set: data set containing little-endian, monochrome,
+            native PixelData
+        :param map_: map function used to encode the frames, e.g. the map
+            method of a pool
+    """
+
+    if "PixelData" not in data_set:
+        if "FloatPixelData" in data_set:
+            raise Exception("Float Pixel Data cannot be RLE-encoded")
+        return
+
+    rows = data_set.as_int("Rows")[0]
+    columns = data_set.as_int("Columns")[0]
+    bits_allocated = data_set.as_int("BitsAllocated")[0]
+
+    view = data_set.as_binary(odil.registry.PixelData)[0].get_memory_view()
+    pixel_data = numpy.frombuffer(
+        view.tobytes(), "<u{}".format(bits_allocated//8)).reshape(
+            -1, rows, columns)
+
+    fragments = map_(encode_rle_frame, pixel_data)
+    data_set.remove(odil.registry.PixelData)
+    # Empty Basic Offset Table, followed by the fragments
+    data_set.add(odil.registry.PixelData, [b""]+list(fragments), odil.VR.OB)
+
+@profiler.timed("encode_rle_frame", len)
+def encode_rle_frame(frame):
+    """ Return the RLE Lossless encoding of a frame (array of shape
+        rows x columns, one segment per byte of the pixel values).
+    """
+
+    frame = numpy.ascontiguousarray(frame)
+    bytes_ = frame.view(numpy.uint8).reshape(
+        frame.shape[0], frame.shape[1], frame.dtype.itemsize)
+
+    # Segments are ordered from the most significant byte to the least
+    # significant one; the frame is little-endian.
+    segments = [
+        _encode_rle_segment(bytes_[:, :, index])
+        for index in range(frame.dtype.itemsize-1, -1, -1)]
+
+    offsets = [0]*15
+    offset = 64
+    for index, segment in enumerate(segments):
+        offsets[index] = offset
+        offset += len(segment)
+
+    header = struct.pack("<16I", len(segments), *offsets)
+    return header+b"".join(segments)
+
+def _encode_rle_segment(segment):
+    """ Return the PackBits encoding of a segment (2D array of bytes), each
+        row being encoded separately. The result is padded to an even length.
+    """
+
+    rows, columns = segment.shape
+    data = segment.ravel()
+    size = data.size
+
+    # Runs of identical bytes, not crossing the row boundaries
+    run_start = numpy.empty(size, bool)
+    run_start[0] = True
+    run_start[1:] = data[1:] != data[:-1]
+    run_start[::columns] = True
+    starts = numpy.flatnonzero(run_start)
+    lengths = numpy.diff(numpy.append(starts, size))
+
+    # Split the runs in chunks of at most 128 bytes
+    chunks_count = (lengths+127)//128
+    chunk_run = numpy.repeat(numpy.arange(len(starts)), chunks_count)
+    chunk_rank = (
+        numpy.arange(len(chunk_run))
+        - numpy.repeat(numpy.cumsum(chunks_count)-chunks_count, chunks_count))
+    chunk_start = starts[chunk_run] + 128*chunk_rank
+    chunk_length = numpy.minimum(128, lengths[chunk_run] - 128*chunk_rank)
+
+    # Chunks of a single byte are grouped in literal runs of at most 128
+    # bytes, not crossing the row boundaries. Other chunks are replicate runs.
+    literal = (chunk_length == 1)
+    previous_literal = numpy.append(False, literal[:-1])
+    streak_start = literal & (~previous_literal | (chunk_start%columns == 0))
+    literal_indices = numpy.flatnonzero(literal)
+    streak_begin = numpy.maximum.accumulate(numpy.where(
+        streak_start[literal_indices], numpy.arange(len(literal_indices)), 0))
+    position = numpy.arange(len(literal_indices)) - streak_begin
+    group_start = numpy.zeros(len(chunk_run), bool)
+    group_start[literal_indices] = (
+        streak_start[literal_indices] | (position%128 == 0))
+
+    # Size of each chunk in the output: header and value for replicate runs,
+    # byte for literal runs, with a header for the first byte of the group.
+    output_size = numpy.where(literal, 1+group_start, 2)
+    output_offset = numpy.cumsum(output_size) - output_size
+    total_size = int(output_size.sum())
+    output = numpy.empty(total_size + total_size%2, numpy.uint8)
+    if total_size%2 == 1:
+        output[-1] = 0
+
+    replicate = ~literal
+    output[output_offset[replicate]] = (
+        257-chunk_length[replicate]).astype(numpy.uint8)
+    output[output_offset[replicate]+1] = data[chunk_start[replicate]]
+
+    group_indices = numpy.flatnonzero(group_start)
+    group_counts = numpy.diff(numpy.append(
+        numpy.searchsorted(literal_indices, group_indices),
+        len(literal_indices)))
+    output[output_offset[group_indices]] = group_counts-1
+    output[output_offset[literal_indices]+group_start[literal_indices]] = (
+        data[chunk_start[literal_indices]])
+
+    return output.tostring()
+
+@profiler.timed("deflate")
+def deflate(path, chunk_size=1<<20):
+    """ Convert a file written in Explicit VR Little Endian to Deflated
+        Explicit VR Little Endian: the transfer syntax of the meta-information
+        is updated and the data set is compressed.
+    """
+
+    with open(path, "rb") as fd:
+        preamble = fd.read(132)
+        if len(preamble) != 132 or preamble[128:] != b"DICM":
+            raise Exception("{} is not a DICOM file".format(path))
+
+        # Meta-information elements
+        elements = []
+        while True:
+            position = fd.tell()
+            header = fd.read(8)
+            if len(header) < 8 or struct.unpack("<H", header[:2])[0] != 0x0002:
+                fd.seek(position)
+                break
+            element, vr = struct.unpack("<H2s", header[2:6])
+            if vr in _long_length_vrs:
+                length = struct.unpack("<I", fd.read(4))[0]
+            else:
+                length = struct.unpack("<H", header[6:])[0]
+            elements.append([element, vr, fd.read(length)])
+
+        meta_information = b""
+        for element, vr, value in elements:
+            if element == 0x0000:
+                continue
+            if element == 0x0010:
+                value = str(odil.registry.DeflatedExplicitVRLittleEndian)
+                value += b"\0"*(len(value)%2)
+            meta_information += _encode_element(element, vr, value)
+        meta_information = (
+            _encode_element(0x0000, b"UL", struct.pack("<I", len(meta_information)))
+            + meta_information)
+
+        temporary_path = "{}.deflate".format(path)
+        with open(temporary_path, "wb") as output:
+            output.write(preamble)
+            output.write(meta_information)
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+            while True:
+                chunk = fd.read(chunk_size)
+                if not chunk:
+                    break
+                output.write(compressor.compress(chunk))
+            output.write(compressor.flush())
+
+    os.rename(temporary_path, path)
+
+def _encode_element(element, vr, value):
+    """ Encode an element of the meta-information (group 0002) in Explicit VR
+        Little Endian.
+    """
+
+    if vr in _long_length_vrs:
+        header = struct.pack("<HH2sHI", 0x0002, element, vr, 0, len(value))
+    else:
+        header = struct.pack("<HH2sH", 0x0002, element, vr, len(value))
+    return header+value
@@ -13,19 +13,33 @@ import os
 
 import odil
 
+from .. import logger
 import patient, study, series, frame_of_reference, equipment, image
 import frame_groups as fg
 from mr_image_storage import to_2d
 from frame_index_generator import FrameIndexGenerator
-from convert import convert_element
+from convert import ConversionPlan
+from raw_data_storage import read_file
 
 
-def enhanced_mr_image_storage(bruker_data_set, transfer_syntax):
+def enhanced_mr_image_storage(
+        bruker_data_set, transfer_syntax, float_pixel_data=False,
+        max_frames_per_instance=None):
     """ Convert bruker_data_set into dicom_data_set by using the correct transfer_syntax
-        This function will create one data_set per reconstruction (multiFrame format)
+        This function will generate one data_set per reconstruction (multiFrame format)
+        or, if the reconstruction has more than max_frames_per_instance frames,
+        one data_set per part of a concatenation. The parts are generated one
+        at a time.
 
-        :param bruker_data_set: Json dataSet containing bruker information
+        :param bruker_data_set: Bruker data set, as a dictionary of fields
         :param transfer_syntax: Wanted transfer syntax for the conversion
+        :param float_pixel_data: whether 32 bits float data is stored 
+            without quantization, in Float Pixel Data. The Enhanced MR Image
+            IOD only allows Pixel Data: the resulting instances are not
+            conformant. Float Pixel Data cannot be encapsulated: with RLE
+            Lossless, the data is quantized in Pixel Data.
+        :param max_frames_per_instance: maximum number of frames in each
+            data set, no limit if None
     """
 
     if int(bruker_data_set.get("VisuCoreDim", [0])[0]) == 3:
@@ -36,15 +50,25 @@ def enhanced_mr_image_storage(bruker_data_set, transfer_syntax):
 
     helper = odil.DataSet()
     generator = FrameIndexGenerator(bruker_data_set)
-    dicom_data_set = odil.DataSet()
 
-    number_of_frames = generator._get_frames_count()
-    dicom_data_set.add("SpecificCharacterSet", ["ISO_IR 192"])
-
-    shared = [odil.DataSet()]
-    dicom_data_set.add(odil.registry.SharedFunctionalGroupsSequence, shared)
-    
-    per_frame = [odil.DataSet() for x in range(number_of_frames) ]
+    # Float Pixel Data cannot be encapsulated: it is only used with native
+    # transfer syntaxes.
+    float_pixel_data = (
+        float_pixel_data 
+        and bruker_data_set["VisuCoreWordType"][0] == "_32BIT_FLOAT")
+    if float_pixel_data and transfer_syntax == odil.registry.RLELossless:
+        logger.warning(
+            "Float Pixel Data cannot be encapsulated in RLE Lossless, "
+            "the float data is quantized in Pixel Data")
+        float_pixel_data = False
+    # The pixel data of all frames of a part is added below
+    image_pixel = [x for x in image.ImagePixel if x[1] != "PixelData"]
+    if float_pixel_data:
+        # Floating Point Image Pixel module: the integer-specific elements
+        # are not used.
+        image_pixel = [
+            x for x in image_pixel 
+            if x[1] not in ["BitsStored", "HighBit", "PixelRepresentation"]]
 
     # Modules factory
     modules = [
@@ -58,8 +82,9 @@ def enhanced_mr_image_storage(bruker_data_set, transfer_syntax):
         image.AcquisitionContext,
         image.EnhancedMRImage,
         image.MRPulseSequence,
+        image.GeneralReference,
         image.SOPCommon + [(None, "SOPClassUID", 1, lambda d,g,i: [odil.registry.EnhancedMRImageStorage], None)],
-        image.ImagePixel,
+        image_pixel,
     ]
 
     framegroups = [
@@ -81,84 +106,139 @@ def enhanced_mr_image_storage(bruker_data_set, transfer_syntax):
     if "FG_DIFFUSION" in [x[1] for x in generator.frame_groups]:
         framegroups.append(fg.MRDiffusion)
 
-    # parse here classical modules
-    for i, frame_index in enumerate(generator):
-        for bruker_name, dicom_name, type_, getter, setter in itertools.chain(*modules):
-            value = convert_element(
-                bruker_data_set, dicom_data_set,
-                bruker_name, dicom_name, type_, getter, setter,
-                frame_index, generator, vr_finder_function
-            )
-            if dicom_name in ["BitsAllocated", "PixelRepresentation"]:
-                helper.add(getattr(odil.registry, dicom_name), value)
-
-        # parse here frame groups
-        for frame_g in framegroups :
-            fg_modules = frame_g.values()
-            d = odil.DataSet()
-            for bruker_name, dicom_name, type_, getter, setter in itertools.chain(*fg_modules):
-                value = convert_element(
-                    bruker_data_set, d,
-                    bruker_name, dicom_name, type_, getter, setter,
-                    frame_index, generator, vr_finder_function
-                )
-            per_frame[i].add(frame_g.keys()[0][0], [d])
-
-
-    dicom_data_set.add(odil.registry.PerFrameFunctionalGroupsSequence, per_frame)
-    regroup_shared_data(dicom_data_set, framegroups)
-
-
-    pixel_data_list = []
-    for i, frame_index in enumerate(generator):
-        pixel_data_list.append(
-            image._get_pixel_data(bruker_data_set, generator, frame_index)[0]
-        )
-
-    dicom_data_set.add(odil.registry.PixelData, ["".join(pixel_data_list)] , vr_finder_function("PixelData"))
-
-    # Add the raw Bruker meta-data
-    bruker_files = { 
-        os.path.basename(x): open(x).read() 
-        for x in bruker_data_set["reco_files"] }
-    dicom_data_set.add("EncapsulatedDocument", [json.dumps(bruker_files)])
-    dicom_data_set.add("MIMETypeOfEncapsulatedDocument", ["application/json"])
-
-    return [dicom_data_set]
-
-def regroup_shared_data(dicom_data_set, framegroups):
-    """ Regroup data from the perFrame functional groups into SharedFunctionalGroups
-        using framegroups arg in order to know if the framegroup can be move or no
+    frame_indices = list(generator)
+    number_of_frames = len(frame_indices)
+    if max_frames_per_instance is None:
+        max_frames_per_instance = number_of_frames
+    elif max_frames_per_instance < 1:
+        raise Exception(
+            "Invalid maximum number of frames per instance: {}".format(
+                max_frames_per_instance))
+    parts = range(0, number_of_frames, max_frames_per_instance)
+    if len(parts) > 1:
+        concatenation_uid = odil.generate_uid()
+        concatenation_source = odil.generate_uid()
+
+    # Modules: frame-invariant elements are converted once, in a template 
+    # which is replayed in each part. SOP Instance UID must be unique for 
+    # each part. The other elements keep the value of the last frame of the
+    # part.
+    modules_plan = ConversionPlan(
+        itertools.chain(*modules), generator, vr_finder_function, helper)
+    invariant_modules_plan, per_frame_modules_plan = modules_plan.split(
+        ["SOPInstanceUID"])
+    template = invariant_modules_plan.template(
+        bruker_data_set, frame_indices[0])
+
+    framegroups_plans = get_framegroups_plans(
+        framegroups, generator, vr_finder_function)
+
+    pixel_data_tag = (
+        odil.registry.FloatPixelData if float_pixel_data 
+        else odil.registry.PixelData)
+
+    for part, begin in enumerate(parts):
+        part_indices = frame_indices[begin:begin+max_frames_per_instance]
+
+        dicom_data_set = odil.DataSet()
+        dicom_data_set.add("SpecificCharacterSet", ["ISO_IR 192"])
+        for arguments in template:
+            dicom_data_set.add(*arguments)
+        per_frame_modules_plan(bruker_data_set, dicom_data_set, part_indices[-1])
+
+        if len(parts) > 1:
+            # Concatenation attributes of the Multi-frame Functional Groups
+            # module
+            dicom_data_set.remove(odil.registry.NumberOfFrames)
+            dicom_data_set.add("NumberOfFrames", [len(part_indices)])
+            dicom_data_set.add(
+                "SOPInstanceUIDOfConcatenationSource", [concatenation_source])
+            dicom_data_set.add("ConcatenationUID", [concatenation_uid])
+            dicom_data_set.add("ConcatenationFrameOffsetNumber", [begin])
+            dicom_data_set.add("InConcatenationNumber", [1+part])
+            dicom_data_set.add("InConcatenationTotalNumber", [len(parts)])
+
+        shared, per_frame = get_functional_groups(
+            bruker_data_set, framegroups_plans, part_indices)
+
+        dicom_data_set.add(
+            odil.registry.SharedFunctionalGroupsSequence, [shared])
+        dicom_data_set.add(
+            odil.registry.PerFrameFunctionalGroupsSequence, per_frame)
+
+        # All frames of the part are assembled in a single buffer
+        dicom_data_set.add(
+            pixel_data_tag, 
+            [
+                image._get_frames_pixel_data(
+                    bruker_data_set, generator, not float_pixel_data,
+                    slice(begin, begin+len(part_indices)))
+            ], 
+            vr_finder_function(pixel_data_tag))
+
+        # Add the raw Bruker meta-data in the first part, unless it is stored
+        # in a separate instance of the series
+        if part == 0 and "PARAMETER_ARCHIVE" not in bruker_data_set:
+            bruker_files = { 
+                os.path.basename(x): 
+                    read_file(x, bruker_data_set.get("FILE_CACHE"))
+                for x in bruker_data_set["reco_files"] }
+            dicom_data_set.add(
+                "EncapsulatedDocument", [json.dumps(bruker_files)])
+            dicom_data_set.add(
+                "MIMETypeOfEncapsulatedDocument", ["application/json"])
+
+        yield dicom_data_set
+
+def get_framegroups_plans(framegroups, generator, vr_finder):
+    """ Compile the conversion of the functional group macros, return the
+        sequence name, whether it is only allowed in the per-frame functional
+        groups, whether it depends on the frame, and the conversion plan of
+        each macro.
+
+        :param framegroups: functional group macros (cf. frame_groups)
+        :param generator: frame index generator of the Bruker data set
+        :param vr_finder: function to find the VR knowing only the dicom_name
+    """
+
+    plans = []
+    for frame_g in framegroups:
+        (sequence, per_frame_only), conversions = frame_g.items()[0]
+        plan = ConversionPlan(conversions, generator, vr_finder)
+        frame_dependent = bool(plan.split()[1].elements)
+        plans.append((sequence, per_frame_only, frame_dependent, plan))
+    return plans
+
+def get_functional_groups(bruker_data_set, framegroups_plans, frame_indices):
+    """ Return the shared functional groups and the per-frame functional 
+        groups of a set of frames.
+
+        The shared or per-frame location of a macro is decided when it is 
+        built. Macros which do not depend on the frame are converted once in
+        the shared functional groups. The other ones are converted for each
+        frame, and shared only if they are equal for all frames.
+
+        :param bruker_data_set: Bruker data set, as a dictionary of fields
+        :param framegroups_plans: compiled macros (cf. get_framegroups_plans)
+        :param frame_indices: frame indices of the frames
     """
 
-    per_frame = dicom_data_set.as_data_set(odil.registry.PerFrameFunctionalGroupsSequence)
-    shared = dicom_data_set.as_data_set(odil.registry.SharedFunctionalGroupsSequence)[0]
-    number_of_frames = dicom_data_set.as_int(odil.registry.NumberOfFrames)[0]
-
-    top_sequences = [x[0] for x in [y.keys()[0] for y in framegroups] if x[1] is False]
-
-    seq_data_sets = {}
-    for i in range(number_of_frames):
-        current_data_set = per_frame[i]
-        for tag, elem in current_data_set.items():
-            if tag.get_name() in top_sequences:
-                seq_data_sets.setdefault(tag.get_name(), {})[i] = current_data_set.as_data_set(tag)[0]
-
-    for name, data_sets in seq_data_sets.items():
-        # Check whether all values are the same
-        all_equal = True
-        sample = data_sets[0]
-        for i in range(number_of_frames):
-            value = data_sets.get(i)
-            if value != sample:
-                all_equal = False
-                break
-
-        if all_equal :
-            shared.add(name,[sample])
-            # delete tag in the corresponding PerFrame elements
-            for data_set in per_frame:
-                data_set.remove(name)
-        else :
-            #Nothing to do
+    shared = odil.DataSet()
+    per_frame = [odil.DataSet() for x in frame_indices]
+
+    for sequence, per_frame_only, frame_dependent, plan in framegroups_plans:
+        if not per_frame_only and not frame_dependent:
+            item = plan(bruker_data_set, odil.DataSet(), frame_indices[0])
+            shared.add(sequence, [item])
             continue
+
+        items = [
+            plan(bruker_data_set, odil.DataSet(), frame_index)
+            for frame_index in frame_indices]
+        if not per_frame_only and not any(x != items[0] for x in items[1:]):
+            shared.add(sequence, [items[0]])
+        else:
+            for data_set, item in zip(per_frame, items):
+                data_set.add(sequence, [item])
+
+    return shared, per_frame
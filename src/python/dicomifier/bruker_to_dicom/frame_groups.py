@@ -15,7 +15,7 @@ import odil
 from image import (
     _get_acquisition_number, _get_direction, _get_b_value, 
     _set_diffusion_gradient, _set_diffusion_b_matrix, _get_repetition_time,
-    _get_echo_time)
+    _get_echo_time, _get_frames_values, _get_b_matrix)
 
 """
 Model for frame groups
@@ -92,11 +92,11 @@ PixelValueTransformation = {# http://dicom.nema.org/medical/dicom/current/output
     [
         (
             "VisuCoreDataOffs", "RescaleIntercept", 1,
-            lambda d,g,i: [d["VisuCoreDataOffs"][g.get_linear_index(i)]], None
+            _get_frames_values("VisuCoreDataOffs"), None
         ),
         (
             "VisuCoreDataSlope", "RescaleSlope", 1,
-            lambda d,g,i: [d["VisuCoreDataSlope"][g.get_linear_index(i)]], None
+            _get_frames_values("VisuCoreDataSlope"), None
         ),
         (None, "RescaleType", 1, lambda d,g,i: ["US"], None),
     ]
@@ -168,7 +168,7 @@ MRDiffusion = { # http://dicom.nema.org/medical/dicom/current/output/chtml/part0
         ),
         (
             "VisuAcqDiffusionBMatrix", "DiffusionBMatrixSequence", 1,
-            lambda d,g,i: numpy.reshape(d["PVM_DwBMat"], (-1, 3, 3)),
+            lambda d,g,i: _get_b_matrix(d),
             lambda x: [_set_diffusion_b_matrix(x)]
         )
     ]
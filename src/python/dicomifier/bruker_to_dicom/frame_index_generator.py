@@ -8,6 +8,8 @@
 
 import itertools
 
+import numpy
+
 class FrameIndexGenerator(object):
     """ Generate the indices to iterate through the frame groups of a Bruker
         data set.
@@ -18,6 +20,8 @@ class FrameIndexGenerator(object):
         """
         
         self.frame_groups = FrameIndexGenerator._get_frame_groups(data_set)
+        self._indices = None
+        self._linear_indices = None
     
     def __iter__(self):
         """ Iterate through the frame groups.
@@ -40,6 +44,32 @@ class FrameIndexGenerator(object):
         
         return linear_index
     
+    def _get_indices(self):
+        """ Return the indices of all frames, in iteration order, as an array
+            of shape (frames_count, number of frame groups).
+        """
+        
+        if self._indices is None:
+            shape = [x[0] for x in self.frame_groups]
+            self._indices = numpy.indices(shape, dtype=int).reshape(
+                len(shape), self.frames_count).T
+        return self._indices
+    indices = property(_get_indices)
+    
+    def _get_linear_indices(self):
+        """ Return the linear indices of all frames, in iteration order.
+        """
+        
+        if self._linear_indices is None:
+            shape = [x[0] for x in self.frame_groups]
+            if shape:
+                self._linear_indices = numpy.ravel_multi_index(
+                    tuple(self.indices.T), shape)
+            else:
+                self._linear_indices = numpy.zeros(1, dtype=int)
+        return self._linear_indices
+    linear_indices = property(_get_linear_indices)
+    
     def _get_frames_count(self):
         """ Return the total number of frames.
         """
@@ -68,3 +98,28 @@ class FrameIndexGenerator(object):
         # order, while FrameIndexGenerator uses outermost-to-innermost order.
         # Invert now, to match the order of FrameIndexGenerator.
         return frame_groups[::-1]
+
+class AllFramesGetter(object):
+    """ Getter computing the values of all frames in a single call.
+        
+        The wrapped function is called as function(data_set, generator), 
+        and returns a sequence indexed by the linear index of the frames,
+        each item being the value of a frame. A conversion plan calls it 
+        only once; it may also be called as a frame getter.
+    """
+    
+    def __init__(self, function):
+        """ Constructor.
+        """
+        
+        self.function = function
+    
+    def __call__(self, data_set, generator, frame_index):
+        """ Return the value of a single frame.
+        """
+        
+        value = self.function(data_set, generator)[
+            generator.get_linear_index(frame_index)]
+        if isinstance(value, numpy.ndarray):
+            value = value.tolist()
+        return value
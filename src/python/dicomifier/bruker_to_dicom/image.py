@@ -12,54 +12,120 @@ import re
 import numpy
 import odil
 
-def _get_acquisition_number(data_set, generator, frame_index):
-    index = [
-        x for g, x in zip(generator.frame_groups, frame_index)
-        if g[1] != "FG_SLICE"]
-    shape = [g[0] for g in generator.frame_groups if g[1] != "FG_SLICE"]
+from .. import profiler
+from frame_index_generator import AllFramesGetter
 
-    acquisition_number = (
-        numpy.ravel_multi_index(index, shape) if (len(index) != 0) else 0)
+def _get_acquisition_numbers(data_set, generator):
+    """ Return the acquisition number of all frames, i.e. the linear index of
+        the frame in the non-slice frame groups.
+    """
+    
+    groups = [
+        index for index, group in enumerate(generator.frame_groups) 
+        if group[1] != "FG_SLICE"]
+    if groups:
+        shape = [generator.frame_groups[x][0] for x in groups]
+        acquisition_numbers = numpy.ravel_multi_index(
+            tuple(generator.indices[:, groups].T), shape)
+    else:
+        acquisition_numbers = numpy.zeros(generator.frames_count, dtype=int)
+    
+    return acquisition_numbers[:, None]
+_get_acquisition_number = AllFramesGetter(_get_acquisition_numbers)
 
-    return [acquisition_number]
+def _get_frames_values(name):
+    """ Return a getter of the values of a field with one item per frame, 
+        e.g. VisuCoreDataOffs.
+    """
+    
+    return AllFramesGetter(
+        lambda d,g: numpy.asarray(d[name])[g.linear_indices, None])
 
-def _get_pixel_data(data_set, generator, frame_index):
-    """ Read the pixel data and return the given frame.
-        This function MUST be called before converting VisuCoreDataOffs and 
-        VisuCoreDataSlope.
+# Number of pixels processed at once when computing the range of float data
+# and when mapping it to uint32
+_chunk_size = 1<<20
+
+def _get_pixel_array(data_set, quantize=True):
+    """ Return the pixel data as a read-only memory map of the 2dseq file,
+        with one row per frame. The frames are only read from disk when they
+        are accessed.
+        
+        For 32 bits float data, if quantize is True, the range of the pixel 
+        values is computed and VisuCoreDataOffs and VisuCoreDataSlope are 
+        updated to match the mapping to uint32 performed by _get_frame_data.
     """
     
     if isinstance(data_set["PIXELDATA"], list):
-        dtype = {
+        dtype = numpy.dtype({
             "_8BIT_UNSGN_INT": numpy.uint8,
             "_16BIT_SGN_INT": numpy.int16,
             "_32BIT_SGN_INT": numpy.int32,
             "_32BIT_FLOAT": numpy.single,
-        }[data_set["VisuCoreWordType"][0]]
+        }[data_set["VisuCoreWordType"][0]])
+        byte_order = data_set.get("VisuCoreByteOrder", ["littleEndian"])[0]
+        dtype = dtype.newbyteorder("<" if byte_order == "littleEndian" else ">")
         
-        # Read the file
-        with open(data_set["PIXELDATA"][0], "rb") as fd:
-            pixel_data = numpy.fromfile(fd, dtype)
-            data_set["PIXELDATA"] = pixel_data.reshape(
-                -1, data_set["VisuCoreSize"][0]*data_set["VisuCoreSize"][1])
-        if data_set["PIXELDATA"].dtype == numpy.single:
-            # Map to uint32
-            min = data_set["PIXELDATA"].min()
-            max = data_set["PIXELDATA"].max()
-            
-            data_set["PIXELDATA"] -= min
-            data_set["PIXELDATA"] *= (1<<32)/(max-min)
-            data_set["PIXELDATA"] = data_set["PIXELDATA"].astype(numpy.uint32)
-            
-            data_set["VisuCoreDataOffs"] = [0]*len(data_set["VisuCoreDataOffs"])
-            data_set["VisuCoreDataSlope"] = [1]*len(data_set["VisuCoreDataOffs"])
-            
-            if "VisuCoreDataOffs" in data_set:
-                data_set["VisuCoreDataOffs"] = [
-                    x+min for x in data_set["VisuCoreDataOffs"]]
-            if "VisuCoreDataSlope" in data_set:
-                data_set["VisuCoreDataSlope"] = [
-                    x/((1<<32)/(max-min)) for x in data_set["VisuCoreDataSlope"]]
+        pixel_data = numpy.memmap(data_set["PIXELDATA"][0], dtype, "r")
+        data_set["PIXELDATA"] = pixel_data.reshape(
+            -1, data_set["VisuCoreSize"][0]*data_set["VisuCoreSize"][1])
+    
+    pixel_array = data_set["PIXELDATA"]
+    if (quantize and pixel_array.dtype.kind == "f" 
+            and "PIXELDATA_SCALING" not in data_set):
+        # Map to uint32: the mapping is applied frame by frame when the
+        # data is read. The range is computed in a single pass.
+        rows = (_chunk_size//pixel_array.shape[1]) or 1
+        min, max = None, None
+        for begin in range(0, len(pixel_array), rows):
+            chunk = pixel_array[begin:begin+rows]
+            chunk_min, chunk_max = chunk.min(), chunk.max()
+            min = chunk_min if min is None else numpy.minimum(min, chunk_min)
+            max = chunk_max if max is None else numpy.maximum(max, chunk_max)
+        scale = (1<<32)/(max-min)
+        data_set["PIXELDATA_SCALING"] = [min, scale]
+        
+        data_set["VisuCoreDataOffs"] = [0]*len(data_set["VisuCoreDataOffs"])
+        data_set["VisuCoreDataSlope"] = [1]*len(data_set["VisuCoreDataOffs"])
+        
+        if "VisuCoreDataOffs" in data_set:
+            data_set["VisuCoreDataOffs"] = [
+                x+min for x in data_set["VisuCoreDataOffs"]]
+        if "VisuCoreDataSlope" in data_set:
+            data_set["VisuCoreDataSlope"] = [
+                x/scale for x in data_set["VisuCoreDataSlope"]]
+    
+    return pixel_array
+
+def _get_frame_data(data_set, index):
+    """ Return the frame(s) at given index of the pixel data, as a 
+        little-endian array, float data being mapped to uint32 if 
+        _get_pixel_array was called with quantize set to True.
+    """
+    
+    frame_data = _get_pixel_array(data_set, False)[index]
+    if "PIXELDATA_SCALING" in data_set:
+        # Chunked mapping, in place if frame_data is a copy
+        min, scale = data_set["PIXELDATA_SCALING"]
+        if frame_data.flags.writeable and frame_data.flags.c_contiguous:
+            quantized = frame_data.view(numpy.uint32)
+        else:
+            quantized = numpy.empty(frame_data.shape, numpy.uint32)
+        source = frame_data.reshape(-1)
+        destination = quantized.reshape(-1)
+        for begin in range(0, len(source), _chunk_size):
+            chunk = source[begin:begin+_chunk_size] - min
+            chunk *= scale
+            destination[begin:begin+_chunk_size] = chunk
+        frame_data = quantized
+    elif frame_data.dtype.byteorder == ">":
+        frame_data = frame_data.astype(frame_data.dtype.newbyteorder("<"))
+    
+    return frame_data
+
+def _get_data_index(data_set, generator, linear_index):
+    """ Return the index in the pixel data of the frame(s) at given linear
+        index (a scalar or an array).
+    """
     
     if data_set.get("VisuCoreDiskSliceOrder", [None])[0] == "disk_reverse_slice_order":
         # Volumes are always in order, but slice order depends on
@@ -72,48 +138,95 @@ def _get_pixel_data(data_set, generator, frame_index):
             slices_per_frame = (
                 data_set["VisuCoreFrameCount"][0]
                 / numpy.cumprod([x[0] for x in non_slice])[-1])
-        frame_index = generator.get_linear_index(frame_index)
-        volume = int(frame_index / slices_per_frame)
-        slice_index = frame_index % slices_per_frame
-        frame_index = volume*slices_per_frame+(slices_per_frame-slice_index-1)
+        volume = linear_index // slices_per_frame
+        slice_index = linear_index % slices_per_frame
+        return volume*slices_per_frame+(slices_per_frame-slice_index-1)
     else:
-        frame_index = generator.get_linear_index(frame_index)
-    frame_data = data_set["PIXELDATA"][frame_index]
+        return linear_index
+
+@profiler.timed("_get_pixel_data", lambda x: len(x[0]))
+def _get_pixel_data(data_set, generator, frame_index):
+    """ Read the pixel data and return the given frame.
+        This function MUST be called before converting VisuCoreDataOffs and 
+        VisuCoreDataSlope.
+    """
+    
+    _get_pixel_array(data_set)
+    
+    frame_index = _get_data_index(
+        data_set, generator, generator.get_linear_index(frame_index))
+    frame_data = _get_frame_data(data_set, frame_index)
     
     return [frame_data.tostring()]
 
+@profiler.timed("_get_frames_pixel_data", len)
+def _get_frames_pixel_data(data_set, generator, quantize=True, frames=None):
+    """ Read the pixel data and return all frames, in the order of the 
+        generator, as a single buffer. The frames are reordered by a single
+        fancy-indexing of the pixel data; when they are already in order,
+        the pixel data is copied only once. If quantize is False, float data
+        is returned as little-endian float32. If frames is not None, only
+        the frames at these positions in the generator are returned.
+        This function MUST be called before converting VisuCoreDataOffs and 
+        VisuCoreDataSlope.
+    """
+    
+    _get_pixel_array(data_set, quantize)
+    
+    index = _get_data_index(data_set, generator, generator.linear_indices)
+    if frames is not None:
+        index = index[frames]
+    if len(index) > 0 and numpy.array_equal(
+            index, numpy.arange(index[0], index[0]+len(index))):
+        index = slice(index[0], index[0]+len(index))
+    frames_data = _get_frame_data(data_set, index)
+    
+    return frames_data.tostring()
+
 def _get_direction(data_set):
-    return [
-        _get_direction_and_b_value(data_set, x)[0] 
-        for x in numpy.reshape(data_set["PVM_DwBMat"], (-1, 3, 3))]
+    return list(_get_diffusion_table(data_set)["direction"])
 
 def _get_b_value(data_set):
-    return [
-        _get_direction_and_b_value(data_set, x)[1] 
-        for x in numpy.reshape(data_set["PVM_DwBMat"], (-1, 3, 3))]
+    return _get_diffusion_table(data_set)["b_value"].tolist()
 
-def _get_direction_and_b_value(data_set, b_matrix):
+def _get_b_matrix(data_set):
+    return _get_diffusion_table(data_set)["b_matrix"]
+
+def _get_diffusion_table(data_set):
+    """ Return the ideal b-value, ideal direction and b-matrix of each 
+        diffusion frame, as a dictionary of arrays. The table is computed
+        for all frames at once, and cached in the data set.
+    """
+    
     # Adapted from https://github.com/BRAINSia/BRAINSTools/blob/92cbbec97a8100a38bc019b30591f7c0f9a26951/DWIConvert/SiemensDWIConverter.h
     # FIXME: find a reference to support this
     
+    if "DIFFUSION_TABLE" in data_set:
+        return data_set["DIFFUSION_TABLE"]
+    
+    b_matrices = numpy.reshape(data_set["PVM_DwBMat"], (-1, 3, 3))
+    
     ideal_b_values = set(data_set["PVM_DwBvalEach"])
     ideal_b_values.add(0)
-    ideal_b_values = list(ideal_b_values)
+    ideal_b_values = numpy.asarray(list(ideal_b_values), float)
     
-    b_value = numpy.trace(b_matrix)
-    b_value_distances = [abs(b_value - x) for x in ideal_b_values]
-    ideal_b_value = ideal_b_values[numpy.argmin(b_value_distances)]
+    b_values = numpy.trace(b_matrices, axis1=1, axis2=2)
+    b_value_distances = numpy.abs(b_values[:, None] - ideal_b_values[None, :])
+    b_values = ideal_b_values[numpy.argmin(b_value_distances, axis=1)]
     
-    direction = numpy.linalg.eigh(b_matrix)[1][:,-1]
-    if ideal_b_value == 0:
-        ideal_direction = direction
-    else:
+    # Eigenvector of the largest eigenvalue of each b-matrix
+    directions = numpy.linalg.eigh(b_matrices)[1][:, :, -1]
+    if numpy.any(b_values != 0):
         ideal_directions = numpy.reshape(data_set["PVM_DwDir"], [-1, 3])
-        direction_dot = [
-            numpy.abs(numpy.dot(direction, x)) for x in ideal_directions]
-        ideal_direction = ideal_directions[numpy.argmax(direction_dot)]
+        direction_dot = numpy.abs(numpy.dot(directions, ideal_directions.T))
+        directions = numpy.where(
+            (b_values == 0)[:, None], directions, 
+            ideal_directions[numpy.argmax(direction_dot, axis=1)])
     
-    return ideal_direction.astype(float), float(ideal_b_value)
+    data_set["DIFFUSION_TABLE"] = {
+        "b_value": b_values, "direction": directions.astype(float),
+        "b_matrix": b_matrices}
+    return data_set["DIFFUSION_TABLE"]
 
 def _set_diffusion_gradient(value):
     """ Return an odil DataSet containing the DiffusionGradientDiffusion element
@@ -192,9 +305,33 @@ def _get_geometry_of_kSpace_traversal(data_set, generator, frame_index):
     else:
         return None
 
+def _get_parameter_archive_reference(data_set, generator, frame_index):
+    """ Return the reference to the instance storing the Bruker parameter 
+        files, if they are stored in a separate instance.
+    """
+
+    if "PARAMETER_ARCHIVE" not in data_set:
+        return None
+
+    # Purpose of Reference Code Sequence is required in each item. There is
+    # no standard code for the parameters of the acquisition: use a local 
+    # coding scheme.
+    purpose = odil.DataSet()
+    purpose.add("CodeValue", ["PARAMETER_FILES"])
+    purpose.add("CodingSchemeDesignator", ["99DICOMIFIER"])
+    purpose.add("CodeMeaning", ["Bruker parameter files"])
+
+    item = odil.DataSet()
+    item.add("ReferencedSOPClassUID", [odil.registry.RawDataStorage])
+    item.add("ReferencedSOPInstanceUID", data_set["PARAMETER_ARCHIVE"])
+    item.add("PurposeOfReferenceCodeSequence", [purpose])
+    return [item]
+
 
 GeneralImage = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/sect_C.7.6.html#sect_C.7.6.1
-    (None, "InstanceNumber", 2, lambda d,g,i: [1+g.get_linear_index(i)], None),
+    (
+        None, "InstanceNumber", 2, 
+        AllFramesGetter(lambda d,g: 1+g.linear_indices[:, None]), None),
     (
         None, "ImageType", 3, 
         lambda d,g,i: [
@@ -277,19 +414,18 @@ ImagePixel = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03
     # WindowWidth instead.
     (
         None, "WindowCenter", 3, 
-        lambda d,g,i: [
-            0.5*(
-                d["VisuCoreDataMin"][g.get_linear_index(i)]
-                +d["VisuCoreDataMax"][g.get_linear_index(i)])
-        ], 
+        AllFramesGetter(lambda d,g: 0.5*(
+            numpy.asarray(d["VisuCoreDataMin"])
+            +numpy.asarray(d["VisuCoreDataMax"]))[g.linear_indices, None]
+        ), 
         None
     ),
     (
         None, "WindowWidth", 3, 
-        lambda d,g,i: [
-            d["VisuCoreDataMax"][g.get_linear_index(i)]
-            -d["VisuCoreDataMax"][g.get_linear_index(i)]
-        ],
+        AllFramesGetter(lambda d,g: (
+            numpy.asarray(d["VisuCoreDataMax"])
+            -numpy.asarray(d["VisuCoreDataMax"]))[g.linear_indices, None]
+        ),
         None
     ),
 ]
@@ -326,11 +462,11 @@ MRImage = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/se
 PixelValueTransformation = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/sect_C.7.6.16.2.html#sect_C.7.6.16.2.9
     (
         "VisuCoreDataOffs", "RescaleIntercept", 1,
-        lambda d,g,i: [d["VisuCoreDataOffs"][g.get_linear_index(i)]], None
+        _get_frames_values("VisuCoreDataOffs"), None
     ),
     (
         "VisuCoreDataSlope", "RescaleSlope", 1,
-        lambda d,g,i: [d["VisuCoreDataSlope"][g.get_linear_index(i)]], None
+        _get_frames_values("VisuCoreDataSlope"), None
     ),
     (None, "RescaleType", 1, lambda d,g,i: ["US"], None),
 ]
@@ -349,7 +485,7 @@ MRDiffusion = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part0
     ),
     (
         "VisuAcqDiffusionBMatrix", "DiffusionBMatrixSequence", 1,
-        lambda d,g,i: numpy.reshape(d["PVM_DwBMat"], (-1, 3, 3)),
+        lambda d,g,i: _get_b_matrix(d),
         lambda x: [_set_diffusion_b_matrix(x)]
     )
 ]
@@ -363,6 +499,20 @@ SOPCommon = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/
     (None, "InstanceCreationTime", 3, lambda d,g,i: [str(datetime.datetime.now())], None),
 ]
 
+GeneralReference = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/sect_C.12.4.html
+    (
+        None, "ReferencedInstanceSequence", 3, 
+        _get_parameter_archive_reference, None
+    ),
+]
+
+RawData = [ # http://dicom.nema.org/medical/dicom/current/output/chtml/part03/sect_C.19.html
+    (None, "InstanceNumber", 2, lambda d,g,i: None, None),
+    (None, "ContentDate", 1, lambda d,g,i: [str(datetime.datetime.now())], None),
+    (None, "ContentTime", 1, lambda d,g,i: [str(datetime.datetime.now())], None),
+    ("VisuAcqDate", "AcquisitionDateTime", 3, None, None),
+]
+
 
 # Below -> new image modules for enhanced image storage
 
@@ -0,0 +1,64 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+import collections
+
+from .. import bruker
+
+class LazyDataSet(collections.MutableMapping):
+    """ Dictionary view of a Bruker data set, with the same layout as
+        bruker.as_dict. A field is converted to Python only the first time
+        it is accessed, and then cached.
+
+        The Bruker data set itself is never modified: items which are set
+        or deleted (e.g. by to_2d) only affect the view.
+    """
+
+    def __init__(self, data_set):
+        """ Constructor.
+
+            :param data_set: bruker.Dataset object
+        """
+
+        self._data_set = data_set
+        self._values = {}
+        self._deleted = set()
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        elif name in self._deleted or not self._data_set.has_field(name):
+            raise KeyError(name)
+        else:
+            value = bruker.as_python(self._data_set.get_field(name))
+            self._values[name] = value
+            return value
+
+    def __setitem__(self, name, value):
+        self._values[name] = value
+        self._deleted.discard(name)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._values.pop(name, None)
+        self._deleted.add(name)
+
+    def __contains__(self, name):
+        return (
+            name in self._values
+            or (name not in self._deleted and self._data_set.has_field(name)))
+
+    def __iter__(self):
+        names = set(self._data_set.get_field_names())
+        names.difference_update(self._deleted)
+        names.update(self._values)
+        return iter(sorted(names))
+
+    def __len__(self):
+        return len(list(iter(self)))
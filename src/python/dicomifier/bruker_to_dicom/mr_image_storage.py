@@ -7,8 +7,6 @@
 #########################################################################
 
 import itertools
-import json
-import os
 
 import dateutil.parser
 import numpy
@@ -16,7 +14,7 @@ import odil
 
 import patient, study, series, frame_of_reference, equipment, image
 from frame_index_generator import FrameIndexGenerator
-from convert import convert_element
+from convert import ConversionPlan
 
 def convert_elements(
         bruker_data_set, dicom_data_set, conversions,
@@ -31,15 +29,13 @@ def convert_elements(
         :param vr_finder: function to find the VR knowing only the dicom_name
     """
 
-    for bruker_name, dicom_name, type_, getter, setter in conversions:
-        convert_element(
-            bruker_data_set, dicom_data_set, 
-            bruker_name, dicom_name, type_, getter, setter,
-            frame_index, generator, vr_finder)
-    return dicom_data_set
+    plan = ConversionPlan(conversions, generator, vr_finder)
+    return plan(bruker_data_set, dicom_data_set, frame_index)
 
 def mr_image_storage(bruker_data_set, transfer_syntax):
-    """ Function to convert specific burker images into dicom
+    """ Function to convert specific burker images into dicom. The data sets
+        are generated one frame at a time, so that they do not have to be 
+        all stored in memory.
 
         :param bruker_data_set: bruker data set to convert
         :param transfer_syntax: target transfer syntax
@@ -48,7 +44,18 @@ def mr_image_storage(bruker_data_set, transfer_syntax):
     if int(bruker_data_set.get("VisuCoreDim", [0])[0]) == 3:
         to_2d(bruker_data_set)
 
-    dicom_data_sets = []
+    vr_finder_object = odil.VRFinder()
+    vr_finder_function = lambda tag: vr_finder_object(tag, helper, transfer_syntax)
+
+    helper = odil.DataSet()
+
+    generator = FrameIndexGenerator(bruker_data_set)
+
+    # Nested sequences are also compiled once
+    pixel_value_transformation = ConversionPlan(
+        image.PixelValueTransformation, generator, vr_finder_function)
+    mr_diffusion = ConversionPlan(
+        image.MRDiffusion, generator, vr_finder_function)
 
     modules = [
         patient.Patient,
@@ -56,15 +63,14 @@ def mr_image_storage(bruker_data_set, transfer_syntax):
         series.GeneralSeries + [(None, "Modality", 1, lambda d,g,i: ["MR"], None)],
         frame_of_reference.FrameOfReference,
         equipment.GeneralEquipment, 
-        image.GeneralImage, image.ImagePlane, image.ImagePixel, image.MRImage,
+        image.GeneralImage, image.GeneralReference, image.ImagePlane, 
+        image.ImagePixel, image.MRImage,
         [
             (
                 None, "PixelValueTransformationSequence", 1,
                 lambda bruker_data_set, generator, frame_index: [
-                    convert_elements(
-                        bruker_data_set,odil.DataSet(), image.PixelValueTransformation,
-                        frame_index, generator, vr_finder_function
-                    )
+                    pixel_value_transformation(
+                        bruker_data_set, odil.DataSet(), frame_index)
                 ],
                 None
             )
@@ -73,10 +79,8 @@ def mr_image_storage(bruker_data_set, transfer_syntax):
             (
                 None, "MRDiffusionSequence", 3,
                 lambda bruker_data_set, generator, frame_index: [
-                    convert_elements(
-                        bruker_data_set,odil.DataSet(), image.MRDiffusion,
-                        frame_index, generator, vr_finder_function
-                    ) ] 
+                    mr_diffusion(
+                        bruker_data_set, odil.DataSet(), frame_index) ] 
                     if "FG_DIFFUSION" in [x[1] for x in generator.frame_groups]
                     else None,
                 None
@@ -85,39 +89,29 @@ def mr_image_storage(bruker_data_set, transfer_syntax):
         image.SOPCommon + [(None, "SOPClassUID", 1, lambda d,g,i: [odil.registry.MRImageStorage], None)]
     ]
 
-    vr_finder_object = odil.VRFinder()
-    vr_finder_function = lambda tag: vr_finder_object(tag, helper, transfer_syntax)
-
-    helper = odil.DataSet()
+    plan = ConversionPlan(
+        itertools.chain(*modules), generator, vr_finder_function, helper)
+    # Frame-invariant elements are converted once, in a template which is
+    # replayed in each frame. SOP Instance UID must be unique for each frame.
+    invariant_plan, per_frame_plan = plan.split(["SOPInstanceUID"])
+    template = None
 
-    generator = FrameIndexGenerator(bruker_data_set)
     for frame_index in generator:
+        if template is None:
+            template = invariant_plan.template(bruker_data_set, frame_index)
+
         dicom_data_set = odil.DataSet()
         dicom_data_set.add("SpecificCharacterSet", ["ISO_IR 192"])
+        for arguments in template:
+            dicom_data_set.add(*arguments)
 
-        for bruker_name, dicom_name, type_, getter, setter in itertools.chain(*modules):
-            value = convert_element(
-                bruker_data_set, dicom_data_set,
-                bruker_name, dicom_name, type_, getter, setter,
-                frame_index, generator, vr_finder_function)
-
-            for name in ["BitsAllocated", "PixelRepresentation"]:
-                if dicom_name == name:
-                    helper.add(getattr(odil.registry, name), value)
+        per_frame_plan(bruker_data_set, dicom_data_set, frame_index)
         
-        # FIXME: storing the Bruker meta-data in all instances is rather 
-        # inefficient. It can amount to over 50 % of the total size of the
-        # DICOM file
-        # dict_files = {}
-        # path_list = bruker_data_set["reco_files"]
-        # for path in path_list:
-        #     dict_files[os.path.basename(path)] = open(path).read()
-        # reco_files_tag = odil.Tag("67890010")
-        # dicom_data_set.add(reco_files_tag, [json.dumps(dict_files)], odil.VR.OB)
-
-        dicom_data_sets.append(dicom_data_set)
-
-    return dicom_data_sets
+        # The Bruker meta-data is not stored in each instance: it can amount
+        # to over 50 % of the total size of the DICOM file. It may be stored
+        # once per series (cf. raw_data_storage).
+
+        yield dicom_data_set
 
 def to_2d(data_set):
     """ Convert the Bruker data set from 3D to 2D.
@@ -0,0 +1,107 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+import cStringIO
+import itertools
+import os
+import zipfile
+
+import odil
+
+import patient, study, series, equipment, image
+from frame_index_generator import FrameIndexGenerator
+from convert import ConversionPlan
+
+def read_file(path, cache=None):
+    """ Return the content of a file.
+
+        :param path: path to the file
+        :param cache: if not None, dictionary of the file contents by path,
+            shared by the conversions of a run: the files shared by several
+            reconstructions (e.g. acqp, method, subject) are read only once.
+    """
+
+    content = cache.get(path) if cache is not None else None
+    if content is None:
+        with open(path, "rb") as fd:
+            content = fd.read()
+        if cache is not None:
+            cache[path] = content
+    return content
+
+def get_parameter_archive(paths, cache=None):
+    """ Return a compressed ZIP archive of the Bruker parameter files. The
+        files are stored relative to their common directory.
+
+        :param paths: paths to the Bruker parameter files
+        :param cache: cache of the file contents (cf. read_file)
+    """
+
+    root = os.path.commonprefix([os.path.dirname(x)+os.sep for x in paths])
+
+    buffer_ = cStringIO.StringIO()
+    archive = zipfile.ZipFile(buffer_, "w", zipfile.ZIP_DEFLATED)
+    for path in sorted(paths):
+        archive.writestr(
+            os.path.relpath(path, root), read_file(path, cache))
+    archive.close()
+
+    return buffer_.getvalue()
+
+def raw_data_storage(bruker_data_set, transfer_syntax):
+    """ Store the Bruker parameter files of a reconstruction in a single Raw
+        Data instance, in the same series as the images. The archive is
+        stored in an Encapsulated Document.
+
+        :param bruker_data_set: Bruker data set, as a dictionary of fields.
+            If present, PARAMETER_ARCHIVE contains the SOP Instance UID of
+            the generated instance, and FILE_CACHE the cache of the file
+            contents (cf. read_file).
+        :param transfer_syntax: target transfer syntax
+    """
+
+    vr_finder_object = odil.VRFinder()
+    vr_finder_function = lambda tag: vr_finder_object(tag, helper, transfer_syntax)
+
+    helper = odil.DataSet()
+    generator = FrameIndexGenerator(bruker_data_set)
+
+    dicom_data_set = odil.DataSet()
+    dicom_data_set.add("SpecificCharacterSet", ["ISO_IR 192"])
+
+    sop_instance_uid = bruker_data_set.get(
+        "PARAMETER_ARCHIVE", [odil.generate_uid()])
+
+    modules = [
+        patient.Patient,
+        study.GeneralStudy, study.PatientStudy,
+        series.GeneralSeries + [(None, "Modality", 1, lambda d,g,i: ["MR"], None)],
+        equipment.GeneralEquipment,
+        image.AcquisitionContext,
+        image.RawData,
+        [
+            (None, "SOPClassUID", 1, lambda d,g,i: [odil.registry.RawDataStorage], None),
+            (None, "SOPInstanceUID", 1, lambda d,g,i: sop_instance_uid, None),
+        ]
+        + [x for x in image.SOPCommon if x[1] != "SOPInstanceUID"],
+    ]
+
+    plan = ConversionPlan(
+        itertools.chain(*modules), generator, vr_finder_function, helper)
+    plan(bruker_data_set, dicom_data_set, next(iter(generator)))
+
+    dicom_data_set.add(
+        "EncapsulatedDocument",
+        [
+            get_parameter_archive(
+                bruker_data_set["reco_files"], 
+                bruker_data_set.get("FILE_CACHE"))
+        ])
+    dicom_data_set.add("MIMETypeOfEncapsulatedDocument", ["application/zip"])
+
+    yield dicom_data_set
@@ -0,0 +1,163 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+import multiprocessing
+import multiprocessing.pool
+import os
+import Queue
+import threading
+
+import odil
+
+from .. import profiler
+import encoding
+
+class Writer(object):
+    """ Write DICOM data sets to files in background threads.
+
+        odil.write does not release the GIL: the serialization and the
+        writing of the files does not overlap with the conversion nor with
+        the other writer threads. Only the steps which release the GIL do,
+        i.e. the directory creation, the compression and the file accesses
+        of the Deflated transfer syntax, and the parts of the RLE encoding
+        done in numpy. Additional writer threads are then mostly useful with
+        these transfer syntaxes.
+
+        The data sets are queued in a bounded queue: write blocks when the
+        writer threads lag behind. The first error raised in a writer thread
+        is raised again by the next call to write or by close.
+
+        The native pixel data is encoded when writing in RLE Lossless, the
+        frames of each data set being encoded by a pool of threads. Files
+        written in Deflated Explicit VR Little Endian are compressed after
+        having been written in Explicit VR Little Endian.
+    """
+
+    def __init__(
+            self, transfer_syntax, workers=1, queue_size=None, encoders=None):
+        """ Constructor.
+
+            :param transfer_syntax: transfer syntax of the written files
+            :param workers: number of writer threads. If 0, the data sets
+                are written in the calling thread.
+            :param queue_size: maximum number of queued data sets, defaults
+                to twice the number of workers
+            :param encoders: number of threads encoding the frames, defaults
+                to the number of CPUs
+        """
+
+        self.transfer_syntax = transfer_syntax
+        self.files = []
+
+        self._encoding_pool = None
+        if transfer_syntax == odil.registry.RLELossless:
+            self._encoding_pool = multiprocessing.pool.ThreadPool(
+                encoders or multiprocessing.cpu_count())
+
+        self._directories = set()
+        self._error = None
+        self._lock = threading.Lock()
+
+        self._queue = Queue.Queue(
+            queue_size if queue_size is not None else 2*workers)
+        self._threads = [
+            threading.Thread(target=self._run) for _ in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        if type_ is None:
+            self.close()
+        else:
+            # Do not hide the original exception
+            self._stop()
+
+    def write(self, data_set, path):
+        """ Queue a data set to be written in path, creating its directory if
+            needed. The path is appended to the list of files.
+        """
+
+        self._raise_error()
+
+        directory = os.path.dirname(path)
+        if directory not in self._directories:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._directories.add(directory)
+
+        if self._threads:
+            self._queue.put((data_set, path))
+        else:
+            self._write(data_set, path)
+        self.files.append(path)
+
+    def close(self):
+        """ Wait until all queued data sets are written, stop the writer
+            threads and return the list of files, in the order they were
+            queued.
+        """
+
+        self._stop()
+        self._raise_error()
+        return self.files
+
+    def _stop(self):
+        """ Wait for the queued data sets and stop the writer threads.
+        """
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if self._encoding_pool is not None:
+            self._encoding_pool.close()
+            self._encoding_pool.join()
+            self._encoding_pool = None
+
+    def _run(self):
+        """ Write the queued data sets until None is dequeued.
+        """
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # Drain the queue without writing
+                continue
+            try:
+                self._write(*item)
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _write(self, data_set, path):
+        transfer_syntax = self.transfer_syntax
+        if transfer_syntax == odil.registry.RLELossless:
+            encoding.encode_rle_pixel_data(data_set, self._encoding_pool.map)
+        elif transfer_syntax == odil.registry.DeflatedExplicitVRLittleEndian:
+            transfer_syntax = odil.registry.ExplicitVRLittleEndian
+
+        with profiler.Stage("odil.write") as stage:
+            odil.write(data_set, path, transfer_syntax=transfer_syntax)
+            if stage.active:
+                stage.size = os.path.getsize(path)
+
+        if self.transfer_syntax == odil.registry.DeflatedExplicitVRLittleEndian:
+            encoding.deflate(path)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
@@ -17,7 +17,7 @@ import image
 import odil_getter
 
 import nifti_image
-from .. import logger, MetaData
+from .. import logger, MetaData, profiler
 
 
 def convert(dicom_data_sets, dtype):
@@ -128,6 +128,7 @@ def convert(dicom_data_sets, dtype):
     return merged_stacks
 
 
+@profiler.timed("get_stacks")
 def get_stacks(data_sets):
     """ Return a dict containing, a tuple of key = ((tag,...),value) 
         associated with the corresponding datasets
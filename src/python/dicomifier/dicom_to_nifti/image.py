@@ -16,10 +16,11 @@ import odil
 import odil_getter
 import nifti_image
 import meta_data
-from .. import logger, nifti
+from .. import logger, nifti, profiler
 import siemens
 
 
+@profiler.timed("get_image")
 def get_image(data_sets_frame_idx, dtype, cache):
     """ Get the nifti image of the current stack
         :param data_sets_frame_idx: List containing the data sets of the frame 
@@ -12,9 +12,10 @@ import json
 import odil
 import odil_getter
 
-from .. import MetaData
+from .. import MetaData, profiler
 
 
+@profiler.timed("get_meta_data")
 def get_meta_data(data_sets_frame_idx, cache):
     """ Get the meta data of the current stack 
 
@@ -186,7 +187,10 @@ def convert_element(element, specific_character_set):
                     odil.registry.SpecificCharacterSet, specific_character_set)
             data_set.add(
                 odil.Tag(0xffff, 0xffff), element.as_string(), element.vr)
-            result = json.loads(odil.as_json(data_set))["ffffffff"]["Value"]
+            with profiler.Stage("as_json") as stage:
+                json_data_set = odil.as_json(data_set)
+                stage.size = len(json_data_set)
+                result = json.loads(json_data_set)["ffffffff"]["Value"]
         else:
             result = list(element.as_string())
     elif element.is_data_set():
@@ -16,6 +16,7 @@
 #include <numpy/arrayobject.h>
 
 #include "core/DicomifierException.h"
+#include "../ReleaseGIL.h"
 
 /// @brief Convert numpy type to C++ type
 template<typename CppType, NPY_TYPES NumpyType>
@@ -55,7 +56,15 @@ struct NumpyConverter
 /// @brief Read a NIfTI image.
 boost::python::object read(std::string const & filename)
 {
-    auto * image_c = nifti_image_read(filename.c_str(), true);
+    nifti_image * image_c = NULL;
+    {
+        ReleaseGIL const release;
+        image_c = nifti_image_read(filename.c_str(), true);
+    }
+    if(image_c == NULL)
+    {
+        throw dicomifier::DicomifierException("Could not read "+filename);
+    }
     
     using namespace boost::python;
     
@@ -132,10 +141,17 @@ boost::python::object read(std::string const & filename)
     
     kwargs["data"] = numpy.attr("ndarray")(shape, dtype.str());
     object dummy_array = kwargs["data"];
-    std::copy(
-        reinterpret_cast<char*>(image_c->data), 
-        reinterpret_cast<char*>(image_c->data)+image_c->nbyper*image_c->nvox, 
-        reinterpret_cast<PyArrayObject*>(dummy_array.ptr())->data);
+    {
+        // The array has just been created: no other thread can access it.
+        auto * destination = 
+            reinterpret_cast<PyArrayObject*>(dummy_array.ptr())->data;
+        ReleaseGIL const release;
+        std::copy(
+            reinterpret_cast<char*>(image_c->data), 
+            reinterpret_cast<char*>(image_c->data)+image_c->nbyper*image_c->nvox,
+            destination);
+        nifti_image_free(image_c);
+    }
     
     return dicomifier.attr(
         "dicom_to_nifti").attr("NIfTIImage")(*tuple(), **kwargs);
@@ -227,10 +243,14 @@ void write(boost::python::object const & image, std::string const & filename)
     object data = image.attr("data");
     image_c->data = reinterpret_cast<PyArrayObject*>(data.ptr())->data;
     
-    nifti_image_write(image_c);
+    {
+        // The data array is kept alive by "data".
+        ReleaseGIL const release;
+        nifti_image_write(image_c);
     
-    image_c->data = NULL;
-    nifti_image_free(image_c);
+        image_c->data = NULL;
+        nifti_image_free(image_c);
+    }
 }
 
 BOOST_PYTHON_MODULE(nifti)
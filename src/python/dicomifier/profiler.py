@@ -0,0 +1,142 @@
+#########################################################################
+# Dicomifier - Copyright (C) Universite de Strasbourg
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#########################################################################
+
+import functools
+import json
+import threading
+import time
+
+class Profiler(object):
+    """ Wall-clock time, number of calls and number of bytes processed by
+        each stage of a conversion pipeline.
+
+        The times of the stages run in several threads or processes are
+        summed, and nested stages are also counted in their parent stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration, size=0, count=1):
+        """ Record the execution of a stage.
+        """
+
+        with self._lock:
+            stage = self.stages.setdefault(
+                name, {"time": 0., "count": 0, "bytes": 0})
+            stage["time"] += duration
+            stage["count"] += count
+            stage["bytes"] += size
+
+    def merge(self, stages):
+        """ Add the stages recorded by another profiler, e.g. in another
+            process.
+        """
+
+        for name, stage in stages.items():
+            self.add(name, stage["time"], stage["bytes"], stage["count"])
+
+    def report(self):
+        """ Return a table of the stages, sorted by decreasing time.
+        """
+
+        rows = [("Stage", "Time (s)", "Calls", "Bytes", "MB/s")]
+        for name, stage in sorted(
+                self.stages.items(), key=lambda x: -x[1]["time"]):
+            rows.append((
+                name, "{:.3f}".format(stage["time"]), str(stage["count"]),
+                str(stage["bytes"]) if stage["bytes"] else "",
+                "{:.1f}".format(stage["bytes"]/2.**20/stage["time"])
+                    if stage["bytes"] and stage["time"] else ""))
+
+        widths = [max(len(row[x]) for row in rows) for x in range(len(rows[0]))]
+        lines = [
+            "  ".join(
+                x.ljust(width) if index == 0 else x.rjust(width)
+                for index, (x, width) in enumerate(zip(row, widths)))
+            for row in rows]
+        lines.insert(1, "-"*len(lines[0]))
+
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """ Save the stages in a JSON file.
+        """
+
+        with open(path, "w") as fd:
+            json.dump(self.stages, fd, sort_keys=True, indent=4)
+
+# Profiler of the current process, None if profiling is disabled
+_profiler = None
+
+def enable():
+    """ Enable profiling, return the profiler.
+    """
+
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def disable():
+    """ Disable profiling, return the profiler.
+    """
+
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+def get_profiler():
+    """ Return the current profiler, None if profiling is disabled.
+    """
+
+    return _profiler
+
+class Stage(object):
+    """ Context manager timing a block of code. The number of processed bytes
+        may be set in the size attribute. When profiling is disabled, the
+        active attribute is False and nothing is recorded.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 0
+        self.active = False
+        self._start = None
+
+    def __enter__(self):
+        self.active = (_profiler is not None)
+        if self.active:
+            self._start = time.time()
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        if self.active and _profiler is not None:
+            _profiler.add(self.name, time.time()-self._start, self.size)
+
+def timed(name, size=None):
+    """ Decorator timing each call of a function.
+
+        :param name: name of the stage
+        :param size: if not None, function returning the number of bytes
+            processed, given the result of the call
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+
+            start = time.time()
+            result = function(*args, **kwargs)
+            _profiler.add(
+                name, time.time()-start, size(result) if size else 0)
+            return result
+        return wrapper
+    return decorator
@@ -147,3 +147,25 @@ BOOST_FIXTURE_TEST_CASE(FrameGroups, FGFixture)
     BOOST_REQUIRE_EQUAL(frame_groups[0].parameters[1].name, "Bar");
     BOOST_REQUIRE_EQUAL(frame_groups[0].parameters[1].start_index, 1);
 }
+
+BOOST_AUTO_TEST_CASE(Update)
+{
+    dicomifier::bruker::Dataset data_set;
+    data_set.set_field({"Foo", {1}, {"foo"}});
+    data_set.set_field({"Bar", {1}, {"bar"}});
+
+    dicomifier::bruker::Dataset other;
+    other.set_field({"Bar", {1}, {"other bar"}});
+    other.set_field({"Baz", {1}, {"baz"}});
+
+    data_set.update(other);
+    BOOST_REQUIRE(
+        data_set.get_field("Foo").value ==
+            dicomifier::bruker::Field::Value({"foo"}));
+    BOOST_REQUIRE(
+        data_set.get_field("Bar").value ==
+            dicomifier::bruker::Field::Value({"other bar"}));
+    BOOST_REQUIRE(
+        data_set.get_field("Baz").value ==
+            dicomifier::bruker::Field::Value({"baz"}));
+}
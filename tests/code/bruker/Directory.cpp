@@ -131,6 +131,82 @@ BOOST_FIXTURE_TEST_CASE(GetDataset, TestDataOK01)
     BOOST_CHECK_EQUAL(dataset.has_field("VISU_param"), true);
 }
 
+/******************************* TEST Nominal **********************************/
+/**
+ * Nominal test case: files are shared by reconstructions
+ */
+BOOST_FIXTURE_TEST_CASE(SharedFiles, TestDataOK01)
+{
+    std::string const recopath = directorypath + "/1/pdata/2";
+    boost::filesystem::create_directory(
+                boost::filesystem::path(recopath.c_str()));
+    std::ofstream myfile;
+    myfile.open(recopath + "/id");
+    myfile << "##$DATASET_KEY=( 65 )\n";
+    myfile << "<2.16.756.5.5.100.1333920868.10495.1568850965.988>\n";
+    myfile << "##END=\n";
+    myfile.close();
+    myfile.open(recopath + "/visu_pars");
+    myfile << "##$VISU_param=( 60 )\n";
+    myfile << "<other_value>\n";
+    myfile << "##END=\n";
+    myfile.close();
+
+    dicomifier::bruker::Directory directory;
+    directory.load(directorypath);
+
+    for(std::string const reconstruction: {"10001", "10002"})
+    {
+        auto const & dataset = directory.get_dataset(reconstruction);
+        BOOST_CHECK(
+            dataset.get_field("SUBJECT_id").value ==
+                dicomifier::bruker::Field::Value({"Rat"}));
+        BOOST_CHECK(
+            dataset.get_field("ACQP_param").value ==
+                dicomifier::bruker::Field::Value({"param_value"}));
+        BOOST_CHECK_EQUAL(dataset.get_used_files().size(), 3);
+    }
+    BOOST_CHECK(
+        directory.get_dataset("10002").get_field("VISU_param").value ==
+            dicomifier::bruker::Field::Value({"other_value"}));
+}
+
+/******************************* TEST Nominal **********************************/
+/**
+ * Nominal test case: lazy load
+ */
+BOOST_FIXTURE_TEST_CASE(LazyLoad, TestDataOK01)
+{
+    dicomifier::bruker::Directory directory;
+    directory.load(directorypath, true);
+
+    BOOST_CHECK_EQUAL(directory.has_dataset("10001"), true);
+    BOOST_CHECK_EQUAL(directory.has_dataset("90009"), false);
+
+    // Modifications after the load are visible on first access
+    std::ofstream myfile;
+    myfile.open(directorypath + "/1/pdata/1/visu_pars");
+    myfile << "##$VISU_param=( 60 )\n";
+    myfile << "<modified_value>\n";
+    myfile << "##END=\n";
+    myfile.close();
+
+    auto const & dataset = directory.get_dataset("10001");
+    BOOST_CHECK(
+        dataset.get_field("VISU_param").value ==
+            dicomifier::bruker::Field::Value({"modified_value"}));
+    BOOST_CHECK(
+        dataset.get_field("SUBJECT_id").value ==
+            dicomifier::bruker::Field::Value({"Rat"}));
+    BOOST_CHECK_EQUAL(directory.get_used_files("10001").size(), 3);
+
+    // The dataset is loaded only once
+    BOOST_CHECK_EQUAL(&directory.get_dataset("10001"), &dataset);
+
+    BOOST_REQUIRE_THROW(directory.get_dataset("90009"),
+                        dicomifier::DicomifierException);
+}
+
 /******************************* TEST Nominal **********************************/
 /**
  * Nominal test case: get_series_and_reco
@@ -161,3 +237,70 @@ BOOST_FIXTURE_TEST_CASE(GetBadDataset, TestDataOK01)
     BOOST_REQUIRE_THROW(directory.get_dataset("90009"),
                         dicomifier::DicomifierException);
 }
+
+/******************************* TEST Nominal **********************************/
+/**
+ * Nominal test case: parallel load
+ */
+BOOST_FIXTURE_TEST_CASE(ParallelLoad, TestDataOK01)
+{
+    for(std::string const reconstruction: {"2", "3", "4"})
+    {
+        std::string const recopath = directorypath + "/1/pdata/" + reconstruction;
+        boost::filesystem::create_directory(
+                    boost::filesystem::path(recopath.c_str()));
+        std::ofstream myfile;
+        myfile.open(recopath + "/id");
+        myfile << "##$DATASET_KEY=1\n";
+        myfile << "##END=\n";
+        myfile.close();
+        myfile.open(recopath + "/visu_pars");
+        myfile << "##$VISU_param=( 60 )\n";
+        myfile << "<value_" << reconstruction << ">\n";
+        myfile << "##END=\n";
+        myfile.close();
+    }
+
+    dicomifier::bruker::Directory serial;
+    serial.load(directorypath);
+
+    dicomifier::bruker::Directory parallel;
+    parallel.set_workers(3);
+    BOOST_CHECK_EQUAL(parallel.get_workers(), 3);
+    parallel.load(directorypath);
+
+    for(std::string const reconstruction: {"10001", "10002", "10003", "10004"})
+    {
+        auto const & expected = serial.get_dataset(reconstruction);
+        auto const & dataset = parallel.get_dataset(reconstruction);
+        BOOST_CHECK(dataset.get_used_files() == expected.get_used_files());
+        BOOST_REQUIRE_EQUAL(
+            std::distance(dataset.begin(), dataset.end()),
+            std::distance(expected.begin(), expected.end()));
+        for(auto const & item: expected)
+        {
+            BOOST_CHECK(
+                dataset.get_field(item.first).value == item.second.value);
+        }
+    }
+
+    parallel.set_workers(0);
+    BOOST_CHECK(parallel.get_workers() >= 1);
+}
+
+/******************************* TEST Error ************************************/
+/**
+ * Error test case: invalid file in parallel load
+ */
+BOOST_FIXTURE_TEST_CASE(ParallelLoadError, TestDataOK01)
+{
+    std::ofstream myfile;
+    myfile.open(directorypath + "/1/method");
+    myfile << "Not a Bruker file\n";
+    myfile.close();
+
+    dicomifier::bruker::Directory directory;
+    directory.set_workers(4);
+    BOOST_REQUIRE_THROW(directory.load(directorypath),
+                        dicomifier::DicomifierException);
+}
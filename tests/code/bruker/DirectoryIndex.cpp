@@ -0,0 +1,137 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include <fstream>
+#include <string>
+#include <vector>
+
+#define BOOST_TEST_MODULE ModuleDirectoryIndex
+#include <boost/test/unit_test.hpp>
+
+#include <boost/filesystem.hpp>
+
+#include "bruker/Directory.h"
+#include "bruker/DirectoryIndex.h"
+
+/**
+ * Two subjects: a PV5-like subject at the root and a PV6-like subject in
+ * a study directory, each with one series and two reconstructions.
+ */
+struct Fixture
+{
+    boost::filesystem::path root;
+
+    Fixture()
+    : root(boost::filesystem::absolute("./test_ModuleDirectoryIndex"))
+    {
+        for(auto const & subject: {root/"subject_1", root/"study"/"subject_2"})
+        {
+            boost::filesystem::create_directories(subject/"3"/"pdata"/"1");
+            boost::filesystem::create_directories(subject/"3"/"pdata"/"2");
+
+            this->write(subject/"subject", "##$SUBJECT_id=( 60 )\n<Rat>\n");
+            this->write(subject/"3"/"acqp", "##$ACQP_param=1\n");
+            this->write(subject/"3"/"method", "##$Method=<FLASH>\n");
+            this->write(subject/"3"/"unknown", "##$Unknown=1\n");
+            for(auto const & reconstruction: {"1", "2"})
+            {
+                auto const path = subject/"3"/"pdata"/reconstruction;
+                this->write(path/"id", "##$DATASET_KEY=1\n");
+                this->write(path/"visu_pars", "##$VISU_param=1\n");
+                this->write(path/"2dseq", "");
+            }
+        }
+    }
+
+    ~Fixture()
+    {
+        boost::filesystem::remove_all(root);
+    }
+
+    void write(
+        boost::filesystem::path const & path, std::string const & content)
+    {
+        std::ofstream stream(path.string());
+        stream << content << "##END=\n";
+    }
+};
+
+BOOST_FIXTURE_TEST_CASE(Subjects, Fixture)
+{
+    dicomifier::bruker::DirectoryIndex const index(root.string());
+    BOOST_CHECK(index.get_root() == boost::filesystem::canonical(root));
+
+    std::vector<boost::filesystem::path> const expected{
+        boost::filesystem::canonical(root/"study"/"subject_2"),
+        boost::filesystem::canonical(root/"subject_1")};
+    BOOST_CHECK(index.get_subjects() == expected);
+}
+
+BOOST_FIXTURE_TEST_CASE(SeriesAndReconstructions, Fixture)
+{
+    dicomifier::bruker::DirectoryIndex const index(root.string());
+
+    auto const series_and_reco = 
+        index.get_series_and_reco(root/"study"/"subject_2");
+    BOOST_REQUIRE_EQUAL(series_and_reco.size(), 1);
+    BOOST_CHECK(
+        series_and_reco.at("3") == std::vector<std::string>({"1", "2"}));
+
+    BOOST_CHECK_EQUAL(index.get_reconstructions(root).size(), 4);
+    BOOST_CHECK_EQUAL(
+        index.get_reconstructions(root/"subject_1"/"3"/"pdata"/"2").size(), 1);
+}
+
+BOOST_FIXTURE_TEST_CASE(Files, Fixture)
+{
+    dicomifier::bruker::DirectoryIndex const index(root.string());
+
+    auto const & files = index.get_files(root/"subject_1"/"3");
+    BOOST_REQUIRE_EQUAL(files.size(), 2);
+    BOOST_CHECK(
+        files.at("acqp") == 
+            boost::filesystem::canonical(root/"subject_1"/"3"/"acqp"));
+    BOOST_CHECK(files.find("unknown") == files.end());
+
+    BOOST_CHECK(index.get_files(root/"subject_1"/"3"/"pdata").empty());
+}
+
+BOOST_FIXTURE_TEST_CASE(IsBelow, Fixture)
+{
+    typedef dicomifier::bruker::DirectoryIndex::Path Path;
+    BOOST_CHECK(dicomifier::bruker::DirectoryIndex::is_below(
+        Path("/a/b/c"), Path("/a/b")));
+    BOOST_CHECK(dicomifier::bruker::DirectoryIndex::is_below(
+        Path("/a/b"), Path("/a/b")));
+    BOOST_CHECK(!dicomifier::bruker::DirectoryIndex::is_below(
+        Path("/a/bc"), Path("/a/b")));
+    BOOST_CHECK(!dicomifier::bruker::DirectoryIndex::is_below(
+        Path("/a"), Path("/a/b")));
+}
+
+BOOST_FIXTURE_TEST_CASE(LoadDirectory, Fixture)
+{
+    dicomifier::bruker::DirectoryIndex const index(root.string());
+
+    // Subject files are not shared between subjects
+    dicomifier::bruker::Directory directory;
+    directory.load(index, (root/"study"/"subject_2").string());
+    BOOST_CHECK(directory.has_dataset("30001"));
+    BOOST_CHECK(directory.has_dataset("30002"));
+
+    auto const & dataset = directory.get_dataset("30002");
+    BOOST_CHECK(dataset.has_field("SUBJECT_id"));
+    BOOST_CHECK(dataset.has_field("Method"));
+    BOOST_CHECK(dataset.has_field("VISU_param"));
+    BOOST_CHECK(!dataset.has_field("Unknown"));
+    BOOST_CHECK_EQUAL(dataset.get_used_files().size(), 4);
+    BOOST_CHECK_EQUAL(
+        dataset.get_field("PIXELDATA").get_string(0),
+        boost::filesystem::canonical(
+            root/"study"/"subject_2"/"3"/"pdata"/"2"/"2dseq").string());
+}
@@ -0,0 +1,203 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#include <fstream>
+#include <memory>
+#include <string>
+#include <thread>
+#include <vector>
+
+#define BOOST_TEST_MODULE ModuleHeaderCache
+#include <boost/test/unit_test.hpp>
+
+#include <boost/filesystem.hpp>
+
+#include "bruker/Dataset.h"
+#include "bruker/Field.h"
+#include "bruker/HeaderCache.h"
+#include "bruker/parser.h"
+#include "core/DicomifierException.h"
+
+struct Fixture
+{
+    std::string file;
+    std::string cache;
+
+    Fixture()
+    : file("./test_ModuleHeaderCache_visu_pars"), 
+      cache("./test_ModuleHeaderCache.cache")
+    {
+        this->write(
+            "##$VisuCoreSize=( 2 )\n64 32\n"
+            "##$VisuCoreExtent=( 2 )\n20.5 -1e-3\n"
+            "##$VisuFGOrderDesc=( 1 )\n(19, <FG_SLICE>, <>, 0, 2)\n"
+            "##$VisuSubjectName=( 65 )\n<Rat>\n"
+            "##END=\n");
+    }
+
+    ~Fixture()
+    {
+        boost::filesystem::remove(this->file);
+        boost::filesystem::remove(this->cache);
+    }
+
+    void write(std::string const & content)
+    {
+        std::ofstream stream(this->file);
+        stream << content;
+    }
+};
+
+BOOST_FIXTURE_TEST_CASE(Memory, Fixture)
+{
+    dicomifier::bruker::HeaderCache cache;
+    auto const fields = cache.get_fields(file);
+    BOOST_CHECK_EQUAL(cache.get_hits(), 0);
+    BOOST_CHECK_EQUAL(cache.get_misses(), 1);
+
+    BOOST_CHECK_EQUAL(cache.get_fields(file).get(), fields.get());
+    BOOST_CHECK_EQUAL(cache.get_hits(), 1);
+    BOOST_CHECK_EQUAL(cache.get_misses(), 1);
+}
+
+BOOST_FIXTURE_TEST_CASE(Persistent, Fixture)
+{
+    {
+        dicomifier::bruker::HeaderCache cache(this->cache);
+        cache.get_fields(file);
+        cache.save();
+    }
+
+    dicomifier::bruker::HeaderCache cache(this->cache);
+    auto const & fields = *cache.get_fields(file);
+    BOOST_CHECK_EQUAL(cache.get_hits(), 1);
+    BOOST_CHECK_EQUAL(cache.get_misses(), 0);
+
+    auto const expected = dicomifier::bruker::parse(
+        std::string(
+            "##$VisuCoreSize=( 2 )\n64 32\n"
+            "##$VisuCoreExtent=( 2 )\n20.5 -1e-3\n"
+            "##$VisuFGOrderDesc=( 1 )\n(19, <FG_SLICE>, <>, 0, 2)\n"
+            "##$VisuSubjectName=( 65 )\n<Rat>\n"
+            "##END=\n"));
+    BOOST_REQUIRE_EQUAL(fields.size(), expected.size());
+    for(std::size_t i=0; i<fields.size(); ++i)
+    {
+        BOOST_CHECK_EQUAL(fields[i].name, expected[i].name);
+        BOOST_CHECK(fields[i].shape == expected[i].shape);
+        BOOST_CHECK(fields[i].value == expected[i].value);
+    }
+}
+
+BOOST_FIXTURE_TEST_CASE(Modified, Fixture)
+{
+    dicomifier::bruker::HeaderCache cache;
+    auto const previous = cache.get_fields(file);
+
+    this->write("##$VisuSubjectName=( 65 )\n<Mouse>\n##END=\n");
+    auto const & fields = *cache.get_fields(file);
+    BOOST_CHECK_EQUAL(cache.get_hits(), 0);
+    BOOST_CHECK_EQUAL(cache.get_misses(), 2);
+    BOOST_REQUIRE_EQUAL(fields.size(), 2);
+    BOOST_CHECK(
+        fields[0].value == dicomifier::bruker::Field::Value({"Mouse"}));
+
+    // The fields of the previous version remain valid
+    BOOST_CHECK_EQUAL(previous->size(), 5);
+}
+
+BOOST_FIXTURE_TEST_CASE(Concurrent, Fixture)
+{
+    dicomifier::bruker::HeaderCache cache;
+
+    std::vector<std::shared_ptr<std::vector<dicomifier::bruker::Field> const>>
+        fields(8);
+    std::vector<std::thread> threads;
+    for(auto & item: fields)
+    {
+        threads.emplace_back([&]() { item = cache.get_fields(file); });
+    }
+    for(auto & thread: threads)
+    {
+        thread.join();
+    }
+
+    // All threads get the same fields, even when they parse the file 
+    // concurrently.
+    auto const cached = cache.get_fields(file);
+    for(auto const & item: fields)
+    {
+        BOOST_CHECK_EQUAL(item.get(), cached.get());
+    }
+    BOOST_CHECK_EQUAL(cache.get_hits()+cache.get_misses(), 9);
+}
+
+BOOST_FIXTURE_TEST_CASE(Corrupted, Fixture)
+{
+    {
+        std::ofstream stream(this->cache);
+        stream << "Not a cache";
+    }
+
+    dicomifier::bruker::HeaderCache cache(this->cache);
+    cache.get_fields(file);
+    BOOST_CHECK_EQUAL(cache.get_misses(), 1);
+}
+
+BOOST_FIXTURE_TEST_CASE(Dataset, Fixture)
+{
+    dicomifier::bruker::HeaderCache cache;
+    dicomifier::bruker::Dataset dataset;
+    dataset.load(file, cache);
+
+    BOOST_CHECK(dataset.has_field("VisuSubjectName"));
+    BOOST_CHECK_EQUAL(dataset.get_used_files().size(), 1);
+}
+
+BOOST_FIXTURE_TEST_CASE(MissingFile, Fixture)
+{
+    dicomifier::bruker::HeaderCache cache;
+    BOOST_REQUIRE_THROW(
+        cache.get_fields("./test_ModuleHeaderCache_missing"),
+        dicomifier::DicomifierException);
+}
+
+BOOST_FIXTURE_TEST_CASE(Evicted, Fixture)
+{
+    std::string const other("./test_ModuleHeaderCache_other");
+    {
+        std::ofstream stream(other);
+        stream << "##$VisuSubjectName=( 65 )\n<Mouse>\n##END=\n";
+    }
+
+    {
+        dicomifier::bruker::HeaderCache cache(this->cache);
+        cache.get_fields(file);
+        cache.get_fields(other);
+        cache.save();
+    }
+    auto const full_size = boost::filesystem::file_size(this->cache);
+
+    // Entries of existing files are kept even if they are not requested
+    {
+        dicomifier::bruker::HeaderCache cache(this->cache);
+        cache.save();
+    }
+    BOOST_CHECK_EQUAL(boost::filesystem::file_size(this->cache), full_size);
+
+    boost::filesystem::remove(other);
+    {
+        dicomifier::bruker::HeaderCache cache(this->cache);
+        cache.save();
+    }
+    BOOST_CHECK_LT(boost::filesystem::file_size(this->cache), full_size);
+
+    dicomifier::bruker::HeaderCache cache(this->cache);
+    cache.get_fields(file);
+    BOOST_CHECK_EQUAL(cache.get_hits(), 1);
+}
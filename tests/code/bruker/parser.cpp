@@ -0,0 +1,190 @@
+/*************************************************************************
+ * Dicomifier - Copyright (C) Universite de Strasbourg
+ * Distributed under the terms of the CeCILL-B license, as published by
+ * the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+ * http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+ * for details.
+ ************************************************************************/
+
+#define BOOST_TEST_MODULE parser
+#include <boost/test/unit_test.hpp>
+
+#include <cmath>
+#include <string>
+
+#include "bruker/parser.h"
+#include "bruker/Field.h"
+#include "core/DicomifierException.h"
+
+BOOST_AUTO_TEST_CASE(Comment)
+{
+    auto const fields = dicomifier::bruker::parse("$$Comment\n");
+    BOOST_REQUIRE(fields.empty());
+}
+
+BOOST_AUTO_TEST_CASE(UnquotedString)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=A few words\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE_EQUAL(fields[0].name, "FieldName");
+    BOOST_REQUIRE(fields[0].shape.empty());
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({"A few words"}));
+}
+
+BOOST_AUTO_TEST_CASE(QuotedStrings)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 3, 5 )\n<foo> <bar>\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE_EQUAL(fields[0].name, "FieldName");
+    BOOST_REQUIRE(fields[0].shape == dicomifier::bruker::Field::Shape({3, 5}));
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({"foo", "bar"}));
+}
+
+BOOST_AUTO_TEST_CASE(EscapedString)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=<a\\>b\\\\c\\d>\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({"a>b\\c\\d"}));
+}
+
+BOOST_AUTO_TEST_CASE(Reals)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 5 )\n1.23 -4.56 1e5 .5 5.\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(fields[0].shape == dicomifier::bruker::Field::Shape({5}));
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value(
+            {1.23f, -4.56f, 1e5f, 0.5f, 5.f}));
+}
+
+BOOST_AUTO_TEST_CASE(SpecialReals)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 3 )\nnan inf -inf\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE_EQUAL(fields[0].value.size(), 3);
+    BOOST_REQUIRE(std::isnan(fields[0].get_float(0)));
+    BOOST_REQUIRE(std::isinf(fields[0].get_float(1)));
+    BOOST_REQUIRE(fields[0].get_float(1) > 0);
+    BOOST_REQUIRE(std::isinf(fields[0].get_float(2)));
+    BOOST_REQUIRE(fields[0].get_float(2) < 0);
+}
+
+BOOST_AUTO_TEST_CASE(Integers)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 3 )\n123 -456 +7\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(fields[0].shape == dicomifier::bruker::Field::Shape({3}));
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value(
+            {123L, -456L, 7L}));
+}
+
+BOOST_AUTO_TEST_CASE(Atoms)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 3 )\nYes Info 99999999999999999999\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value(
+            {"Yes", "Info", "99999999999999999999"}));
+}
+
+BOOST_AUTO_TEST_CASE(Structure)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##FieldName=( 1 )\n(3, <Foo>, (1.5, <>))\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(fields[0].shape == dicomifier::bruker::Field::Shape({1}));
+
+    // Nested structures are flattened
+    dicomifier::bruker::Field::Value const item({3L, "Foo", 1.5f, ""});
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({{item}}));
+}
+
+BOOST_AUTO_TEST_CASE(StructureWithoutShape)
+{
+    auto const fields = dicomifier::bruker::parse("##FieldName=(60)\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(fields[0].shape.empty());
+    dicomifier::bruker::Field::Value const item({60L});
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({{item}}));
+}
+
+BOOST_AUTO_TEST_CASE(ShapeWithoutValue)
+{
+    auto const fields = dicomifier::bruker::parse("##FieldName=( 60 )\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 1);
+    BOOST_REQUIRE(fields[0].shape == dicomifier::bruker::Field::Shape({60}));
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value({"( 60 )"}));
+}
+
+BOOST_AUTO_TEST_CASE(ContinuationLines)
+{
+    auto const fields = dicomifier::bruker::parse(
+        "##TITLE=Parameter List\r\n"
+        "$$ A comment\r\n"
+        "##$Numbers=( 4 )\n"
+        "1 2 \n"
+        "3 4\n"
+        "##$String=( 65 )\n"
+        "<A long \\\n"
+        "string>\n"
+        "##END=\n");
+
+    BOOST_REQUIRE_EQUAL(fields.size(), 4);
+    BOOST_REQUIRE_EQUAL(fields[0].name, "TITLE");
+    BOOST_REQUIRE(
+        fields[0].value == dicomifier::bruker::Field::Value(
+            {"Parameter List"}));
+    BOOST_REQUIRE_EQUAL(fields[1].name, "$Numbers");
+    BOOST_REQUIRE(
+        fields[1].value == dicomifier::bruker::Field::Value(
+            {1L, 2L, 3L, 4L}));
+    BOOST_REQUIRE_EQUAL(fields[2].name, "$String");
+    BOOST_REQUIRE(
+        fields[2].value == dicomifier::bruker::Field::Value(
+            {"A long string"}));
+    BOOST_REQUIRE_EQUAL(fields[3].name, "END");
+    BOOST_REQUIRE(fields[3].value == dicomifier::bruker::Field::Value({""}));
+}
+
+BOOST_AUTO_TEST_CASE(Incomplete)
+{
+    BOOST_REQUIRE_THROW(
+        dicomifier::bruker::parse("##FieldName=( 3 )\n1 2 x\n"),
+        dicomifier::DicomifierException);
+}
+
+BOOST_AUTO_TEST_CASE(NoField)
+{
+    BOOST_REQUIRE_THROW(
+        dicomifier::bruker::parse(""), dicomifier::DicomifierException);
+    BOOST_REQUIRE_THROW(
+        dicomifier::bruker::parse("Foo\n##FieldName=Bar\n"),
+        dicomifier::DicomifierException);
+    BOOST_REQUIRE_THROW(
+        dicomifier::bruker::parse("##FieldName\n"),
+        dicomifier::DicomifierException);
+}
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import dicomifier
+
+class TestDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self._write(os.path.join(self.root, "subject"), "##$SUBJECT_id=<Rat>\n")
+        for reconstruction in range(1, 9):
+            path = os.path.join(self.root, "1", "pdata", str(reconstruction))
+            os.makedirs(path)
+            self._write(os.path.join(path, "id"), "##$DATASET_KEY=1\n")
+            self._write(
+                os.path.join(path, "visu_pars"),
+                "##$VisuCoreSize=( 1 )\n{}\n".format(reconstruction))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_concurrent_lazy_load(self):
+        directory = dicomifier.bruker.Directory()
+        directory.load(self.root, lazy=True)
+
+        results = {}
+        def worker(reconstruction):
+            data_set = directory.get_dataset(
+                "1{:04d}".format(reconstruction))
+            results[reconstruction] = data_set.get_field("VisuCoreSize").get_int(0)
+        threads = [
+            threading.Thread(target=worker, args=(x,)) for x in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {x: x for x in range(1, 9)})
+
+    def test_parallel_load(self):
+        directory = dicomifier.bruker.Directory()
+        directory.set_workers(4)
+        self.assertEqual(directory.get_workers(), 4)
+        directory.load(self.root)
+        for reconstruction in range(1, 9):
+            data_set = directory.get_dataset("1{:04d}".format(reconstruction))
+            self.assertEqual(
+                data_set.get_field("SUBJECT_id").get_string(0), "Rat")
+
+    def _write(self, path, content):
+        with open(path, "w") as fd:
+            fd.write(content+"##END=\n")
+
+if __name__ == "__main__":
+    unittest.main()
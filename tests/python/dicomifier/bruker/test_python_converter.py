@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import dicomifier
+
+class TestPythonConverter(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        with open(self.path, "w") as fd:
+            fd.write(
+                "##TITLE=Parameter List\n"
+                "##$VisuCorePosition=( 2, 3 )\n"
+                "1.5 2 3 4 5 6\n"
+                "##$VisuCoreSize=( 2 )\n"
+                "128 64\n"
+                "##$VisuSubjectName=( 60 )\n"
+                "<Mouse^Mickey>\n"
+                "##$VisuFGOrderDesc=( 1 )\n"
+                "(19, <FG_SLICE>, <>, 0, 2)\n"
+                "##END=\n")
+        self.data_set = dicomifier.bruker.Dataset()
+        self.data_set.load(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_as_dict(self):
+        data_set = dicomifier.bruker.as_dict(self.data_set)
+        self.assertEqual(data_set["VisuCorePosition"], [1.5, 2, 3, 4, 5, 6])
+        self.assertEqual(data_set["VisuCoreSize"], [128, 64])
+        self.assertEqual(data_set["VisuSubjectName"], ["Mouse^Mickey"])
+        self.assertEqual(
+            data_set["VisuFGOrderDesc"], [[19, "FG_SLICE", "", 0, 2]])
+
+    def test_as_dict_numpy(self):
+        data_set = dicomifier.bruker.as_dict(self.data_set, use_numpy=True)
+        self.assertEqual(data_set["VisuCorePosition"].shape, (2, 3))
+        self.assertEqual(data_set["VisuCorePosition"].dtype, numpy.float64)
+        self.assertEqual(
+            data_set["VisuCorePosition"].tolist(), [[1.5, 2, 3], [4, 5, 6]])
+        self.assertEqual(data_set["VisuCoreSize"].dtype.kind, "i")
+        self.assertEqual(data_set["VisuCoreSize"].tolist(), [128, 64])
+        self.assertEqual(data_set["VisuSubjectName"], ["Mouse^Mickey"])
+
+    def test_as_python(self):
+        field = self.data_set.get_field("VisuCoreSize")
+        self.assertEqual(dicomifier.bruker.as_python(field), [128, 64])
+
+if __name__ == "__main__":
+    unittest.main()
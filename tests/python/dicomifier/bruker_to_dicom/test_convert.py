@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 import numpy
@@ -5,6 +8,16 @@ import numpy
 import dicomifier
 import odil
 
+class _Directory(object):
+    """ Bruker directory with a single, empty, reconstruction.
+    """
+
+    def get_dataset(self, name):
+        return dicomifier.bruker.Dataset()
+
+    def get_used_files(self, name):
+        return []
+
 class TestConvert(unittest.TestCase):
     #The only function we can test is the to_iso_9660() one,
     #the others require real data_sets, and frame_iterator..
@@ -137,5 +150,138 @@ class TestConvert(unittest.TestCase):
         dicom_val = list(dicom_data_set.as_real("ImagePositionPatient"))
         self.assertEqual([-20., -20., -2.], dicom_val)
 
+    def test_conversion_plan(self):
+        bruker_data_set = {
+            "VisuFGOrderDesc" : [[2, "FG_SLICE", "", 0, 1]],
+            "VisuGroupDepVals" : [["VisuAcqEchoTime", 0]],
+            "VisuAcqEchoTime" : [10., 20.],
+            "VisuSubjectName" : ["Mouse^Mickey"],
+            "VisuCoreWordType" : ["_16BIT_SGN_INT"],
+        }
+        generator = dicomifier.bruker_to_dicom.FrameIndexGenerator(bruker_data_set)
+        helper = odil.DataSet()
+        vr_finder_object = odil.VRFinder()
+        vr_finder_function = lambda tag: vr_finder_object(tag, helper, odil.registry.ImplicitVRLittleEndian)
+
+        plan = dicomifier.bruker_to_dicom.convert.ConversionPlan(
+            [
+                ("VisuSubjectName", "PatientName", 1, None, None),
+                ("VisuAcqEchoTime", "EchoTime", 1, None, None),
+                (
+                    "VisuCoreWordType", "PixelRepresentation", 1, None, 
+                    {"_16BIT_SGN_INT": 1}
+                ),
+            ],
+            generator, vr_finder_function, helper)
+
+        for frame_index, echo_time in zip(generator, [10., 20.]):
+            dicom_data_set = plan(
+                bruker_data_set, odil.DataSet(), frame_index)
+            self.assertEqual(
+                ["Mouse^Mickey"], list(dicom_data_set.as_string("PatientName")))
+            self.assertEqual(
+                [echo_time], list(dicom_data_set.as_real("EchoTime")))
+
+        self.assertEqual(
+            [1], list(helper.as_int(odil.registry.PixelRepresentation)))
+
+    def test_conversion_plan_split(self):
+        bruker_data_set = {
+            "VisuFGOrderDesc" : [[2, "FG_SLICE", "", 0, 1]],
+            "VisuGroupDepVals" : [["VisuAcqEchoTime", 0]],
+            "VisuAcqEchoTime" : [10., 20.],
+            "VisuSubjectName" : ["Mouse^Mickey"],
+        }
+        generator = dicomifier.bruker_to_dicom.FrameIndexGenerator(bruker_data_set)
+        vr_finder_object = odil.VRFinder()
+        vr_finder_function = lambda tag: vr_finder_object(tag, odil.DataSet(), odil.registry.ImplicitVRLittleEndian)
+
+        plan = dicomifier.bruker_to_dicom.convert.ConversionPlan(
+            [
+                ("VisuSubjectName", "PatientName", 1, None, None),
+                ("VisuAcqEchoTime", "EchoTime", 1, None, None),
+                (None, "InstanceNumber", 1, lambda d,g,i: [1+i[0]], None),
+                (None, "Modality", 1, lambda d,g,i: ["MR"], None),
+                (None, "SOPInstanceUID", 1, lambda d,g,i: [odil.generate_uid()], None),
+            ],
+            generator, vr_finder_function)
+        invariant, per_frame = plan.split(["SOPInstanceUID"])
+        self.assertEqual(
+            ["PatientName", "Modality"], 
+            [x.dicom_name for x in invariant.elements])
+        self.assertEqual(
+            ["EchoTime", "InstanceNumber", "SOPInstanceUID"], 
+            [x.dicom_name for x in per_frame.elements])
+
+        template = invariant.template(bruker_data_set, next(iter(generator)))
+        for frame_index, echo_time in zip(generator, [10., 20.]):
+            dicom_data_set = odil.DataSet()
+            for arguments in template:
+                dicom_data_set.add(*arguments)
+            per_frame(bruker_data_set, dicom_data_set, frame_index)
+            self.assertEqual(
+                ["Mouse^Mickey"], list(dicom_data_set.as_string("PatientName")))
+            self.assertEqual(
+                [echo_time], list(dicom_data_set.as_real("EchoTime")))
+
+    def _data_set(self, index):
+        data_set = odil.DataSet()
+        data_set.add("PatientID", ["Mickey"])
+        data_set.add("StudyID", ["1"])
+        data_set.add("SeriesNumber", [1])
+        data_set.add("SOPInstanceUID", [odil.generate_uid()])
+        data_set.add("InstanceNumber", [index])
+        return data_set
+
+    def test_convert_reconstruction_lazy(self):
+        events = []
+
+        def iod_converter(bruker_data_set, transfer_syntax):
+            for index in range(3):
+                events.append(("generate", index))
+                yield self._data_set(index)
+
+        def archive_converter(bruker_data_set, transfer_syntax):
+            events.append(("generate", 3))
+            yield self._data_set(3)
+
+        class Writer(dicomifier.bruker_to_dicom.Writer):
+            def write(self, data_set, path):
+                events.append(("write", data_set.as_int("InstanceNumber")[0]))
+                dicomifier.bruker_to_dicom.Writer.write(self, data_set, path)
+
+        directory = tempfile.mkdtemp()
+        original_writer = dicomifier.bruker_to_dicom.convert.Writer
+        dicomifier.bruker_to_dicom.convert.Writer = Writer
+        try:
+            files = dicomifier.bruker_to_dicom.convert_reconstruction(
+                _Directory(), "1", "1", iod_converter,
+                odil.registry.ExplicitVRLittleEndian, directory, True, 0,
+                archive_converter)
+        finally:
+            dicomifier.bruker_to_dicom.convert.Writer = original_writer
+            shutil.rmtree(directory)
+
+        # Each data set is written before the next one is generated
+        self.assertEqual(
+            events, 
+            [
+                (event, index) 
+                for index in range(4) for event in ["generate", "write"]])
+        # The names of the chained instances follow each other
+        self.assertEqual(
+            [os.path.basename(x) for x in files],
+            ["IM{:06d}".format(1+x) for x in range(4)])
+        self.assertEqual(
+            set(os.path.dirname(x) for x in files), 
+            set([os.path.join(directory, "MICKEY", "1", "1", "1")]))
+
+    def test_mr_image_storage_lazy(self):
+        # Nothing is converted before the first data set is requested
+        data_sets = dicomifier.bruker_to_dicom.mr_image_storage(
+            None, odil.registry.ExplicitVRLittleEndian)
+        with self.assertRaises(Exception):
+            next(data_sets)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
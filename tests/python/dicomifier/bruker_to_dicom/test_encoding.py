@@ -0,0 +1,102 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy
+
+import dicomifier
+
+class TestEncoding(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _decode_rle_segment(self, segment, size):
+        segment = bytearray(segment)
+        decoded = bytearray()
+        index = 0
+        while len(decoded) < size:
+            header = segment[index]
+            index += 1
+            if header < 128:
+                decoded += segment[index:index+header+1]
+                index += header+1
+            elif header > 128:
+                decoded += bytearray([segment[index]])*(257-header)
+                index += 1
+        return numpy.frombuffer(bytes(decoded), numpy.uint8)
+
+    def _decode_rle_frame(self, fragment, shape, dtype):
+        count = struct.unpack("<I", fragment[:4])[0]
+        offsets = list(struct.unpack("<15I", fragment[4:64]))[:count]
+        offsets.append(len(fragment))
+        segments = [
+            self._decode_rle_segment(
+                fragment[begin:end], shape[0]*shape[1])
+            for begin, end in zip(offsets[:-1], offsets[1:])]
+        return numpy.dstack(segments[::-1]).copy().view(dtype).reshape(shape)
+
+    def test_encode_rle_frame(self):
+        random = numpy.random.RandomState(42)
+        for dtype in [numpy.uint8, "<u2", "<u4"]:
+            frame = numpy.zeros((16, 300), dtype)
+            frame[4:12, 10:290] = random.randint(0, 4, (8, 280))
+            frame[6, :] = 1000
+            fragment = dicomifier.bruker_to_dicom.encoding.encode_rle_frame(
+                frame)
+            self.assertEqual(len(fragment)%2, 0)
+            self.assertEqual(
+                struct.unpack("<I", fragment[:4])[0],
+                numpy.dtype(dtype).itemsize)
+            decoded = self._decode_rle_frame(
+                fragment, frame.shape, numpy.dtype(dtype))
+            numpy.testing.assert_array_equal(decoded, frame)
+
+    def test_encode_rle_frame_background(self):
+        frame = numpy.zeros((256, 256), "<u2")
+        fragment = dicomifier.bruker_to_dicom.encoding.encode_rle_frame(frame)
+        # Two segments of 256 rows, each row being 2 replicate runs
+        self.assertEqual(len(fragment), 64+2*256*2*2)
+
+    def test_deflate(self):
+        def element(element, vr, value):
+            return struct.pack("<HH2sH", 0x0002, element, vr, len(value))+value
+
+        meta_information = (
+            element(0x0010, b"UI", b"1.2.840.10008.1.2.1\0")
+            + element(0x0012, b"UI", b"1.2.3.4\0"))
+        data_set = struct.pack("<HH2sH", 0x0010, 0x0010, b"PN", 4)+b"Doe^"
+
+        path = os.path.join(self.directory, "file.dcm")
+        with open(path, "wb") as fd:
+            fd.write(b"\0"*128+b"DICM")
+            fd.write(element(
+                0x0000, b"UL", struct.pack("<I", len(meta_information))))
+            fd.write(meta_information)
+            fd.write(data_set)
+
+        dicomifier.bruker_to_dicom.encoding.deflate(path)
+
+        with open(path, "rb") as fd:
+            content = fd.read()
+        self.assertEqual(content[128:132], b"DICM")
+
+        meta_information = (
+            element(0x0010, b"UI", b"1.2.840.10008.1.2.1.99")
+            + element(0x0012, b"UI", b"1.2.3.4\0"))
+        expected = (
+            element(0x0000, b"UL", struct.pack("<I", len(meta_information)))
+            + meta_information)
+        self.assertEqual(content[132:132+len(expected)], expected)
+        self.assertEqual(
+            zlib.decompress(content[132+len(expected):], -zlib.MAX_WBITS),
+            data_set)
+
+if __name__ == "__main__":
+    unittest.main()
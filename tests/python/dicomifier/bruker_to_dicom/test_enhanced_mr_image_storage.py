@@ -1,52 +1,86 @@
 import unittest
 
 import numpy
+import odil
 
-from dicomifier.bruker_to_dicom.enhanced_mr_image_storage import regroup_shared_data
 import dicomifier
-import odil
+from dicomifier.bruker_to_dicom.enhanced_mr_image_storage import (
+    get_framegroups_plans, get_functional_groups)
 
 class TestEnhancedMrImageStorage(unittest.TestCase):
 
-    def test_regroup_shared_data(self):
-        data_set = odil.DataSet()
-        data_set.add("NumberOfFrames", [2])
-
-        shared = odil.DataSet()
-        orientation = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
-
-        firstFrame = odil.DataSet()
-        firstPositionSequence = odil.DataSet()
-        firstPositionSequence.add("ImagePositionPatient", [0.0, 0.0, 1.0])
-        firstOrientationSequence = odil.DataSet()
-        firstOrientationSequence.add("ImageOrientationPatient", orientation)
-        firstFrame.add("PlanePositionSequence", [firstPositionSequence])
-        firstFrame.add("PlaneOrientationSequence", [firstOrientationSequence])
-
-        secondFrame = odil.DataSet()
-        secondPositionSequence = odil.DataSet()
-        secondPositionSequence.add("ImagePositionPatient", [0.0, 0.0, 2.0])
-        secondOrientationSequence = odil.DataSet()
-        secondOrientationSequence.add("ImageOrientationPatient", orientation)
-        secondFrame.add("PlanePositionSequence", [secondPositionSequence])
-        secondFrame.add("PlaneOrientationSequence", [secondOrientationSequence])
-
-        data_set.add("PerFrameFunctionalGroupsSequence", [firstFrame, secondFrame])
-        data_set.add("SharedFunctionalGroupsSequence",[shared])
-
-        fg = [
-            dicomifier.bruker_to_dicom.frame_groups.PlanePosition,
-            dicomifier.bruker_to_dicom.frame_groups.PlaneOrientation
+    def setUp(self):
+        self.bruker_data_set = {
+            "VisuFGOrderDesc" : [[3, "FG_SLICE", "", 0, 1]],
+            "VisuGroupDepVals" : [["VisuCorePosition", 0]],
+            "VisuCorePosition" : [0., 0., 1., 0., 0., 2., 0., 0., 3.],
+        }
+        generator = dicomifier.bruker_to_dicom.FrameIndexGenerator(
+            self.bruker_data_set)
+        vr_finder_object = odil.VRFinder()
+        vr_finder_function = lambda tag: vr_finder_object(
+            tag, odil.DataSet(), odil.registry.ExplicitVRLittleEndian)
+
+        framegroups = [
+            # Does not depend on the frame
+            {("PlaneOrientationSequence", False): [
+                (
+                    None, "ImageOrientationPatient", 1,
+                    lambda d,g,i: [1., 0., 0., 0., 1., 0.], None)]},
+            # Varies with the frame
+            {("PlanePositionSequence", False): [
+                (
+                    "VisuCorePosition", "ImagePositionPatient", 1,
+                    lambda d,g,i: numpy.reshape(d["VisuCorePosition"], (-1, 3)),
+                    lambda x: x[0].tolist())]},
+            # Depends on the frame, equal for the first two frames
+            {("MREchoSequence", False): [
+                (
+                    None, "EffectiveEchoTime", 1,
+                    lambda d,g,i: [10. if i[0] < 2 else 20.], None)]},
+            # Always per-frame
+            {("FrameContentSequence", True): [
+                (None, "FrameAcquisitionNumber", 1, lambda d,g,i: [1], None)]},
         ]
-        regroup_shared_data(data_set, fg)
-        for frame_idx in range (2):
-            currentFrame = data_set.as_data_set("PerFrameFunctionalGroupsSequence")[frame_idx]
-            self.assertFalse(currentFrame.has("PlaneOrientationSequence"))
-            self.assertTrue(currentFrame.has("PlanePositionSequence"))
-        shared = data_set.as_data_set("SharedFunctionalGroupsSequence")[0]
-        self.assertTrue(shared.has("PlaneOrientationSequence"))
-        sharedOrientationSeq = shared.as_data_set("PlaneOrientationSequence")[0]
-        self.assertEqual(list(sharedOrientationSeq.as_real("ImageOrientationPatient")), orientation)
+        self.plans = get_framegroups_plans(
+            framegroups, generator, vr_finder_function)
+        self.frame_indices = list(generator)
+
+    def test_get_framegroups_plans(self):
+        self.assertEqual(
+            [x[:3] for x in self.plans],
+            [
+                ("PlaneOrientationSequence", False, False),
+                ("PlanePositionSequence", False, True),
+                ("MREchoSequence", False, True),
+                ("FrameContentSequence", True, False)])
+
+    def _get_functional_groups(self, frame_indices):
+        shared, per_frame = get_functional_groups(
+            self.bruker_data_set, self.plans, frame_indices)
+        self.assertEqual(len(per_frame), len(frame_indices))
+        return (
+            [x for x, _, _, _ in self.plans if shared.has(x)],
+            [[x for x, _, _, _ in self.plans if y.has(x)] for y in per_frame])
+
+    def test_get_functional_groups(self):
+        shared, per_frame = self._get_functional_groups(self.frame_indices)
+        self.assertEqual(shared, ["PlaneOrientationSequence"])
+        self.assertEqual(
+            per_frame,
+            3*[[
+                "PlanePositionSequence", "MREchoSequence",
+                "FrameContentSequence"]])
+
+    def test_get_functional_groups_part(self):
+        # Equal in all frames of the part: shared
+        shared, per_frame = self._get_functional_groups(
+            self.frame_indices[:2])
+        self.assertEqual(
+            shared, ["PlaneOrientationSequence", "MREchoSequence"])
+        self.assertEqual(
+            per_frame,
+            2*[["PlanePositionSequence", "FrameContentSequence"]])
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
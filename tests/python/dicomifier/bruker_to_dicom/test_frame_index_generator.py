@@ -22,6 +22,21 @@ class TestFrameIndexGenerator(unittest.TestCase):
     def test_get_linear_index(self):
         self.assertEqual(self.fg.get_linear_index([1,2]), 7)
 
+    def test_get_indices(self):
+        indices = self.fg.indices
+        self.assertEqual(indices.shape, (65, 2))
+        self.assertEqual([tuple(x) for x in indices], list(self.fg))
+
+    def test_get_linear_indices(self):
+        self.assertEqual(
+            list(self.fg.linear_indices), 
+            [self.fg.get_linear_index(x) for x in self.fg])
+
+    def test_all_frames_getter(self):
+        getter = dicomifier.bruker_to_dicom.frame_index_generator.AllFramesGetter(
+            lambda d,g: 1+g.linear_indices[:, None])
+        self.assertEqual(getter(None, self.fg, [1,2]), [8])
+
     def test_get_frames_count(self):
         self.assertEqual(self.fg._get_frames_count(), 65)
 
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import dicomifier
+
+class TestImage(unittest.TestCase):
+
+    def setUp(self):
+        bruker_data_set = {
+            "VisuFGOrderDesc" : [[3, "FG_SLICE", "", 0, 0]],
+            "VisuGroupDepVals" : []
+        }
+        self.generator = dicomifier.bruker_to_dicom.FrameIndexGenerator(bruker_data_set)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _get_data_set(self, data, word_type, byte_order):
+        data.tofile(self.path)
+        return {
+            "PIXELDATA": [self.path],
+            "VisuCoreWordType": [word_type], "VisuCoreByteOrder": [byte_order],
+            "VisuCoreSize": [2, 2], "VisuCoreFrameCount": [3],
+            "VisuCoreDataOffs": [0., 0., 0.], "VisuCoreDataSlope": [1., 1., 1.]
+        }
+
+    def test_get_pixel_data(self):
+        data = numpy.arange(12, dtype="<i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "littleEndian")
+        frame = dicomifier.bruker_to_dicom.image._get_pixel_data(
+            data_set, self.generator, [1])
+        self.assertTrue(isinstance(data_set["PIXELDATA"], numpy.memmap))
+        self.assertEqual(
+            numpy.frombuffer(frame[0], "<i2").tolist(), [4, 5, 6, 7])
+
+    def test_get_pixel_data_big_endian(self):
+        data = numpy.arange(12, dtype=">i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "bigEndian")
+        frame = dicomifier.bruker_to_dicom.image._get_pixel_data(
+            data_set, self.generator, [2])
+        self.assertEqual(
+            numpy.frombuffer(frame[0], "<i2").tolist(), [8, 9, 10, 11])
+
+    def test_get_pixel_data_reverse_slice_order(self):
+        data = numpy.arange(12, dtype="<i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "littleEndian")
+        data_set["VisuCoreDiskSliceOrder"] = ["disk_reverse_slice_order"]
+        frame = dicomifier.bruker_to_dicom.image._get_pixel_data(
+            data_set, self.generator, [0])
+        self.assertEqual(
+            numpy.frombuffer(frame[0], "<i2").tolist(), [8, 9, 10, 11])
+
+    def test_get_frames_pixel_data(self):
+        data = numpy.arange(12, dtype=">i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "bigEndian")
+        frames = dicomifier.bruker_to_dicom.image._get_frames_pixel_data(
+            data_set, self.generator)
+        self.assertEqual(
+            numpy.frombuffer(frames, "<i2").tolist(), list(range(12)))
+
+    def test_get_frames_pixel_data_reverse_slice_order(self):
+        data = numpy.arange(12, dtype="<i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "littleEndian")
+        data_set["VisuCoreDiskSliceOrder"] = ["disk_reverse_slice_order"]
+        frames = dicomifier.bruker_to_dicom.image._get_frames_pixel_data(
+            data_set, self.generator)
+        self.assertEqual(
+            frames, 
+            b"".join(
+                dicomifier.bruker_to_dicom.image._get_pixel_data(
+                    data_set, self.generator, index)[0]
+                for index in self.generator))
+        self.assertEqual(
+            numpy.frombuffer(frames, "<i2").tolist(), 
+            [8, 9, 10, 11, 4, 5, 6, 7, 0, 1, 2, 3])
+
+    def test_get_frames_pixel_data_part(self):
+        data = numpy.arange(12, dtype="<i2")
+        data_set = self._get_data_set(data, "_16BIT_SGN_INT", "littleEndian")
+        data_set["VisuCoreDiskSliceOrder"] = ["disk_reverse_slice_order"]
+        frames = dicomifier.bruker_to_dicom.image._get_frames_pixel_data(
+            data_set, self.generator, frames=slice(1, 3))
+        self.assertEqual(
+            numpy.frombuffer(frames, "<i2").tolist(),
+            [4, 5, 6, 7, 0, 1, 2, 3])
+
+    def test_get_pixel_data_float(self):
+        data = numpy.linspace(-1, 1, 12).astype("<f4")
+        data_set = self._get_data_set(data, "_32BIT_FLOAT", "littleEndian")
+        frame = dicomifier.bruker_to_dicom.image._get_pixel_data(
+            data_set, self.generator, [0])
+        frame = numpy.frombuffer(frame[0], "<u4")
+        self.assertEqual(frame[0], 0)
+        self.assertEqual(data_set["VisuCoreDataOffs"], [-1., -1., -1.])
+        numpy.testing.assert_almost_equal(
+            frame*data_set["VisuCoreDataSlope"][0]+data_set["VisuCoreDataOffs"][0],
+            data[:4])
+
+    def test_get_frames_pixel_data_float(self):
+        data = numpy.linspace(-1, 1, 12).astype(">f4")
+        data_set = self._get_data_set(data, "_32BIT_FLOAT", "bigEndian")
+        frames = dicomifier.bruker_to_dicom.image._get_frames_pixel_data(
+            data_set, self.generator, False)
+        self.assertEqual(
+            numpy.frombuffer(frames, "<f4").tolist(), data.tolist())
+        self.assertFalse("PIXELDATA_SCALING" in data_set)
+        self.assertEqual(data_set["VisuCoreDataOffs"], [0., 0., 0.])
+        self.assertEqual(data_set["VisuCoreDataSlope"], [1., 1., 1.])
+
+    def test_get_diffusion_table(self):
+        b_matrices = [
+            numpy.zeros((3,3)),
+            1000*numpy.diag([0.01, 0.98, 0.01]),
+            2000*numpy.diag([0.99, 0.005, 0.005])]
+        data_set = {
+            "PVM_DwBMat": numpy.ravel(b_matrices).tolist(),
+            "PVM_DwBvalEach": [1000, 2000],
+            "PVM_DwDir": [1., 0., 0., 0., 1., 0.]
+        }
+        table = dicomifier.bruker_to_dicom.image._get_diffusion_table(data_set)
+        self.assertEqual(table["b_value"].tolist(), [0., 1000., 2000.])
+        self.assertEqual(
+            numpy.abs(table["direction"][1:]).tolist(), 
+            [[0., 1., 0.], [1., 0., 0.]])
+        numpy.testing.assert_array_equal(table["b_matrix"], b_matrices)
+
+        # The table is cached in the data set
+        self.assertTrue(
+            dicomifier.bruker_to_dicom.image._get_diffusion_table(data_set) 
+            is table)
+
+if __name__ == "__main__":
+    unittest.main()
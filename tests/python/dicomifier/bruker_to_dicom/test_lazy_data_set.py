@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import dicomifier
+
+class TestLazyDataSet(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        with open(self.path, "w") as fd:
+            fd.write(
+                "##$VisuCoreSize=( 2 )\n"
+                "128 64\n"
+                "##$VisuSubjectName=( 60 )\n"
+                "<Mouse^Mickey>\n"
+                "##END=\n")
+        bruker_data_set = dicomifier.bruker.Dataset()
+        bruker_data_set.load(self.path)
+        self.data_set = dicomifier.bruker_to_dicom.LazyDataSet(bruker_data_set)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_get(self):
+        self.assertEqual(self.data_set["VisuCoreSize"], [128, 64])
+        self.assertEqual(self.data_set.get("VisuSubjectName"), ["Mouse^Mickey"])
+        self.assertEqual(self.data_set.get("VisuSubjectId"), None)
+        with self.assertRaises(KeyError):
+            self.data_set["VisuSubjectId"]
+
+    def test_cache(self):
+        self.assertTrue(self.data_set["VisuCoreSize"] is self.data_set["VisuCoreSize"])
+
+    def test_contains(self):
+        self.assertTrue("VisuCoreSize" in self.data_set)
+        self.assertFalse("VisuSubjectId" in self.data_set)
+
+    def test_keys(self):
+        self.assertEqual(
+            set(self.data_set.keys()), set(["VisuCoreSize", "VisuSubjectName", "END"]))
+        self.assertEqual(len(self.data_set), 3)
+
+    def test_set(self):
+        self.data_set["VisuCoreSize"] = [256, 256]
+        self.data_set["reco_files"] = ["visu_pars"]
+        self.assertEqual(self.data_set["VisuCoreSize"], [256, 256])
+        self.assertEqual(self.data_set["reco_files"], ["visu_pars"])
+        self.assertTrue("reco_files" in self.data_set.keys())
+
+    def test_delete(self):
+        del self.data_set["VisuCoreSize"]
+        self.assertFalse("VisuCoreSize" in self.data_set)
+        self.assertFalse("VisuCoreSize" in self.data_set.keys())
+        with self.assertRaises(KeyError):
+            del self.data_set["VisuCoreSize"]
+
+if __name__ == "__main__":
+    unittest.main()
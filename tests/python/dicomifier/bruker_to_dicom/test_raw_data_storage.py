@@ -0,0 +1,72 @@
+import cStringIO
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from dicomifier.bruker_to_dicom.image import _get_parameter_archive_reference
+from dicomifier.bruker_to_dicom.raw_data_storage import (
+    get_parameter_archive, read_file)
+
+class TestRawDataStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = [
+            os.path.join(self.directory, "1", "acqp"),
+            os.path.join(self.directory, "1", "pdata", "1", "visu_pars"),
+        ]
+        for path in self.paths:
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as fd:
+                fd.write("##$NAME={}\n".format(os.path.basename(path))*100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_file(self):
+        path = self.paths[0]
+        cache = {}
+        content = read_file(path, cache)
+        os.remove(path)
+        # The file is not read again during the same run
+        self.assertEqual(read_file(path, cache), content)
+
+    def test_read_file_new_run(self):
+        path = self.paths[0]
+        read_file(path, {})
+        with open(path, "wb") as fd:
+            fd.write("##$NAME=edited\n")
+        # Another run reads the edited file
+        self.assertEqual(read_file(path, {}), "##$NAME=edited\n")
+        self.assertEqual(read_file(path), "##$NAME=edited\n")
+
+    def test_get_parameter_archive(self):
+        archive = zipfile.ZipFile(
+            cStringIO.StringIO(get_parameter_archive(self.paths)))
+
+        self.assertEqual(
+            sorted(archive.namelist()), ["acqp", "pdata/1/visu_pars"])
+        self.assertEqual(archive.read("acqp"), "##$NAME=acqp\n"*100)
+        self.assertTrue(
+            all(x.compress_type == zipfile.ZIP_DEFLATED
+                for x in archive.infolist()))
+
+    def test_get_parameter_archive_reference(self):
+        self.assertEqual(_get_parameter_archive_reference({}, None, None), None)
+
+        reference = _get_parameter_archive_reference(
+            {"PARAMETER_ARCHIVE": ["1.2.3"]}, None, None)
+        self.assertEqual(len(reference), 1)
+        self.assertEqual(
+            list(reference[0].as_string("ReferencedSOPInstanceUID")), 
+            ["1.2.3"])
+        # Purpose of Reference Code Sequence is required in each item
+        purpose = reference[0].as_data_set("PurposeOfReferenceCodeSequence")
+        self.assertEqual(len(purpose), 1)
+        for name in ["CodeValue", "CodingSchemeDesignator", "CodeMeaning"]:
+            self.assertEqual(len(purpose[0].as_string(name)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import imp
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import odil
+
+import dicomifier
+
+benchmarks = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "..", "..", "..", "benchmarks")
+sys.path.insert(0, benchmarks)
+import synthetic_bruker
+benchmark = imp.load_source(
+    "benchmark_bruker_to_dicom", os.path.join(benchmarks, "bruker_to_dicom.py"))
+
+class TestSyntheticBruker(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.study = synthetic_bruker.generate(
+            os.path.join(self.directory, "bruker"), matrix=(8, 6),
+            frame_groups=[("FG_SLICE", 3), ("FG_ECHO", 2)], series=2)
+        self.destination = os.path.join(self.directory, "dicom")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _load(self):
+        directory = dicomifier.bruker.Directory()
+        directory.load(self.study)
+        return directory
+
+    def test_load(self):
+        directory = self._load()
+        self.assertEqual(
+            dicomifier.bruker.Directory.get_series_and_reco(self.study),
+            {"1": ["1"], "2": ["1"]})
+
+        data_set = dicomifier.bruker_to_dicom.LazyDataSet(
+            directory.get_dataset("10001"))
+        self.assertEqual(data_set["VisuCoreSize"], [8, 6])
+        self.assertEqual(data_set["VisuCoreFrameCount"], [6])
+        self.assertEqual(data_set["VisuAcqEchoTime"], [10., 20.])
+        self.assertEqual(len(data_set["VisuCoreDataSlope"]), 6)
+        self.assertEqual(
+            [x[1] for x in data_set["VisuFGOrderDesc"]],
+            ["FG_SLICE", "FG_ECHO"])
+
+    def test_convert(self):
+        directory = self._load()
+        for converter, count in [
+                (dicomifier.bruker_to_dicom.mr_image_storage, 6),
+                (dicomifier.bruker_to_dicom.enhanced_mr_image_storage, 1)]:
+            files = dicomifier.bruker_to_dicom.convert_reconstruction(
+                directory, "1", "1", converter,
+                odil.registry.ExplicitVRLittleEndian, self.destination, True)
+            self.assertEqual(len(files), count)
+            _, data_set = odil.read(files[0])
+            self.assertEqual(list(data_set.as_int("Rows")), [6])
+            self.assertEqual(list(data_set.as_int("Columns")), [8])
+            shutil.rmtree(self.destination)
+
+    def test_concatenation(self):
+        directory = self._load()
+        data_set = dicomifier.bruker_to_dicom.LazyDataSet(
+            directory.get_dataset("10001"))
+        data_set["reco_files"] = list(directory.get_used_files("10001"))
+
+        # 6 frames: parts of 4 and 2 frames
+        parts = list(dicomifier.bruker_to_dicom.enhanced_mr_image_storage(
+            data_set, odil.registry.ExplicitVRLittleEndian,
+            max_frames_per_instance=4))
+        self.assertEqual(len(parts), 2)
+
+        self.assertEqual(
+            [list(x.as_int("NumberOfFrames")) for x in parts], [[4], [2]])
+        self.assertEqual(
+            [len(x.as_data_set("PerFrameFunctionalGroupsSequence")) 
+                for x in parts], 
+            [4, 2])
+        self.assertEqual(
+            [list(x.as_int("ConcatenationFrameOffsetNumber")) for x in parts],
+            [[0], [4]])
+        self.assertEqual(
+            [list(x.as_int("InConcatenationNumber")) for x in parts], 
+            [[1], [2]])
+        self.assertEqual(
+            [list(x.as_int("InConcatenationTotalNumber")) for x in parts], 
+            [[2], [2]])
+
+        for name in ["ConcatenationUID", "SOPInstanceUIDOfConcatenationSource"]:
+            self.assertEqual(
+                list(parts[0].as_string(name)), list(parts[1].as_string(name)))
+        self.assertNotEqual(
+            list(parts[0].as_string("SOPInstanceUID")),
+            list(parts[1].as_string("SOPInstanceUID")))
+
+        self.assertTrue(parts[0].has(odil.registry.EncapsulatedDocument))
+        self.assertFalse(parts[1].has(odil.registry.EncapsulatedDocument))
+
+        with self.assertRaises(Exception):
+            list(dicomifier.bruker_to_dicom.enhanced_mr_image_storage(
+                data_set, odil.registry.ExplicitVRLittleEndian,
+                max_frames_per_instance=0))
+
+    def test_benchmark(self):
+        results = list(
+            benchmark.run_benchmarks(self.study, self.destination, 1))
+        self.assertEqual(
+            [x[0] for x in results],
+            [
+                "Directory.load", "mr_image_storage",
+                "enhanced_mr_image_storage", "convert_reconstruction",
+                "convert_reconstruction (2 writers)",
+                "convert_reconstruction (4 writers)"])
+        self.assertTrue(all(len(x[1]) == 1 for x in results))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import odil
+
+import dicomifier
+
+class TestWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _data_set(self, index):
+        data_set = odil.DataSet()
+        data_set.add("SOPClassUID", [odil.registry.MRImageStorage])
+        data_set.add("SOPInstanceUID", [odil.generate_uid()])
+        data_set.add("InstanceNumber", [index])
+        return data_set
+
+    def _test_write(self, workers):
+        paths = [
+            os.path.join(self.directory, str(x%3), "IM{:06d}".format(x))
+            for x in range(20)]
+
+        with dicomifier.bruker_to_dicom.Writer(
+                odil.registry.ExplicitVRLittleEndian, workers) as writer:
+            for index, path in enumerate(paths):
+                writer.write(self._data_set(index), path)
+            files = writer.close()
+
+        self.assertEqual(files, paths)
+        for index, path in enumerate(paths):
+            _, data_set = odil.read(path)
+            self.assertEqual(list(data_set.as_int("InstanceNumber")), [index])
+
+    def test_write_synchronous(self):
+        self._test_write(0)
+
+    def test_write_threads(self):
+        self._test_write(4)
+
+    def test_write_deflated(self):
+        path = os.path.join(self.directory, "IM000001")
+        with dicomifier.bruker_to_dicom.Writer(
+                odil.registry.DeflatedExplicitVRLittleEndian) as writer:
+            writer.write(self._data_set(1), path)
+
+        header, data_set = odil.read(path)
+        self.assertEqual(
+            header.as_string("TransferSyntaxUID")[0],
+            odil.registry.DeflatedExplicitVRLittleEndian)
+        self.assertEqual(list(data_set.as_int("InstanceNumber")), [1])
+
+    def test_error(self):
+        # A directory prevents the file from being written
+        path = os.path.join(self.directory, "foo", "bar")
+        os.makedirs(path)
+
+        writer = dicomifier.bruker_to_dicom.Writer(
+            odil.registry.ExplicitVRLittleEndian, 2)
+        writer.write(self._data_set(1), path)
+        with self.assertRaises(Exception):
+            writer.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import imp
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import odil
+
+import dicomifier
+
+root = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")
+
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+import synthetic_bruker
+
+# The script has no extension: load it without writing a compiled file next
+# to it. It must be in sys.modules so that the jobs can be sent to the
+# worker processes.
+bruker2dicom = imp.new_module("bruker2dicom")
+bruker2dicom.__file__ = os.path.join(root, "src", "cli", "bruker2dicom")
+sys.modules["bruker2dicom"] = bruker2dicom
+execfile(bruker2dicom.__file__, bruker2dicom.__dict__)
+
+class Handler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+class TestBruker2DICOM(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.study = synthetic_bruker.generate(
+            os.path.join(self.directory, "bruker"), matrix=(8, 6),
+            frame_groups=[("FG_SLICE", 2)], series=3)
+
+        # Truncated pixel data: the conversion of 2:1 fails
+        path = os.path.join(self.study, "2", "pdata", "1", "2dseq")
+        with open(path, "r+b") as fd:
+            fd.truncate(10)
+
+        self.handler = Handler()
+        logging.getLogger().addHandler(self.handler)
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+        shutil.rmtree(self.directory)
+
+    def _convert(
+            self, name, jobs, series_and_reconstructions=None, cache=None):
+        destination = os.path.join(self.directory, name)
+        files = bruker2dicom.convert(
+            self.study, destination, series_and_reconstructions,
+            odil.registry.ExplicitVRLittleEndian, False, False, False, None,
+            False, cache, 0, jobs, 1)
+        return [os.path.relpath(x, destination) for x in files]
+
+    def _errors(self):
+        prefix = "Could not convert "
+        return [
+            x[len(prefix):].split()[0] 
+            for x in self.handler.messages if x.startswith(prefix)]
+
+    def test_jobs(self):
+        files = self._convert("sequential", 1)
+        self.assertEqual(len(files), 4)
+        self.assertEqual(len(set(os.path.dirname(x) for x in files)), 2)
+        self.assertEqual(self._errors(), ["2:1"])
+
+        del self.handler.messages[:]
+        # The failure of a job does not affect the others, and the files are
+        # listed in the order of the reconstructions
+        self.assertEqual(self._convert("parallel", 2), files)
+        self.assertEqual(self._errors(), ["2:1"])
+
+    def test_jobs_cache(self):
+        cache = os.path.join(self.directory, "cache")
+        self._convert("parallel", 2, ["1:1", "3:1"], cache)
+
+        # The files parsed for the jobs are stored in the cache
+        header_cache = dicomifier.bruker.HeaderCache(cache)
+        directory = dicomifier.bruker.Directory()
+        directory.set_header_cache(header_cache)
+        directory.load(self.study, True)
+        directory.get_dataset("10001")
+        directory.get_dataset("30001")
+        self.assertEqual(header_cache.get_misses(), 0)
+        self.assertTrue(header_cache.get_hits() > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+
+import dicomifier
+
+@dicomifier.profiler.timed("function", len)
+def function(size):
+    return size*"x"
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self):
+        dicomifier.profiler.disable()
+
+    def test_disabled(self):
+        self.assertEqual(function(3), "xxx")
+        with dicomifier.profiler.Stage("stage") as stage:
+            self.assertFalse(stage.active)
+        self.assertTrue(dicomifier.profiler.get_profiler() is None)
+
+    def test_timed(self):
+        profiler = dicomifier.profiler.enable()
+        function(3)
+        function(4)
+        self.assertEqual(profiler.stages["function"]["count"], 2)
+        self.assertEqual(profiler.stages["function"]["bytes"], 7)
+
+    def test_stage(self):
+        profiler = dicomifier.profiler.enable()
+        with dicomifier.profiler.Stage("stage") as stage:
+            self.assertTrue(stage.active)
+            stage.size = 10
+        self.assertEqual(profiler.stages["stage"]["count"], 1)
+        self.assertEqual(profiler.stages["stage"]["bytes"], 10)
+        self.assertTrue(profiler.stages["stage"]["time"] >= 0)
+
+    def test_merge(self):
+        profiler = dicomifier.profiler.Profiler()
+        profiler.add("stage", 1., 10)
+        profiler.merge({
+            "stage": {"time": 2., "count": 3, "bytes": 5},
+            "other": {"time": 1., "count": 1, "bytes": 0}})
+        self.assertEqual(
+            profiler.stages["stage"], {"time": 3., "count": 4, "bytes": 15})
+        self.assertEqual(
+            profiler.stages["other"], {"time": 1., "count": 1, "bytes": 0})
+
+    def test_report(self):
+        profiler = dicomifier.profiler.Profiler()
+        profiler.add("short", 1., 2**20)
+        profiler.add("long", 2.)
+        lines = profiler.report().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[2].startswith("long"))
+        self.assertTrue(lines[3].startswith("short"))
+        self.assertTrue(lines[3].endswith("1.0"))
+
+    def test_dump(self):
+        profiler = dicomifier.profiler.Profiler()
+        profiler.add("stage", 1., 10)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            profiler.dump(path)
+            with open(path) as fd:
+                self.assertEqual(json.load(fd), profiler.stages)
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    unittest.main()